@@ -2,10 +2,22 @@ import logging.config
 import re
 import warnings
 from logging import Filter, LogRecord
-from typing import Any, Callable, Coroutine, Literal, Optional, Type, TypeVar
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Literal,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
 
 from aidial_sdk._errors import (
     dial_exception_handler,
@@ -13,28 +25,61 @@ from aidial_sdk._errors import (
     pydantic_validation_exception_handler,
 )
 from aidial_sdk.chat_completion.base import ChatCompletion
+from aidial_sdk.chat_completion.buffering import BufferConfig
+from aidial_sdk.chat_completion.cache import (
+    ResponseCache,
+    cache_key,
+    cache_stream,
+    get_cached_response,
+    replay_stream,
+    store_response,
+)
+from aidial_sdk.chat_completion.coalescing import CoalescingConfig
 from aidial_sdk.chat_completion.request import Request as ChatCompletionRequest
 from aidial_sdk.chat_completion.response import (
     Response as ChatCompletionResponse,
 )
-from aidial_sdk.deployment.from_request_mixin import FromRequestMixin
+from aidial_sdk.deployment.from_request_mixin import (
+    FromRequestDeploymentMixin,
+    FromRequestMixin,
+)
 from aidial_sdk.deployment.rate import RateRequest
 from aidial_sdk.deployment.tokenize import TokenizeRequest
 from aidial_sdk.deployment.truncate_prompt import TruncatePromptRequest
 from aidial_sdk.embeddings.base import Embeddings
+from aidial_sdk.embeddings.batching import BatchConfig, EmbeddingsBatcher
+from aidial_sdk.embeddings.cache import EmbeddingsCache, cached_embeddings
 from aidial_sdk.embeddings.request import Request as EmbeddingsRequest
+from aidial_sdk.embeddings.request import TokenArrayRequest
+from aidial_sdk.embeddings.response import Response as EmbeddingsResponse
+from aidial_sdk.embeddings.response import encode_response
 from aidial_sdk.exceptions import HTTPException as DIALException
 from aidial_sdk.header_propagator import HeaderPropagator
+from aidial_sdk.limits.base import Limiter, Permit
 from aidial_sdk.pydantic_v1 import ValidationError
+from aidial_sdk.telemetry.loop_monitor import LoopMonitor
 from aidial_sdk.telemetry.types import TelemetryConfig
+from aidial_sdk.utils._channel import MemoryBudget
 from aidial_sdk.utils._reflection import get_method_implementation
-from aidial_sdk.utils.log_config import LogConfig
+from aidial_sdk.utils._single_flight import SingleFlight, request_key
+from aidial_sdk.utils._stream_metrics import StreamMetrics
+from aidial_sdk.utils.json import (
+    JSONCodec,
+    JSONCodecName,
+    create_json_codec,
+    set_json_codec,
+)
+from aidial_sdk.utils.log_config import DIAL_SDK_LOG_QUEUE_SIZE, LogConfig
+from aidial_sdk.utils.log_queue import enable_log_queue
 from aidial_sdk.utils.logging import log_debug, set_log_deployment
-from aidial_sdk.utils.streaming import merge_chunks
 
 logging.config.dictConfig(LogConfig().dict())
 
+if DIAL_SDK_LOG_QUEUE_SIZE > 0:
+    enable_log_queue(DIAL_SDK_LOG_QUEUE_SIZE)
+
 RequestType = TypeVar("RequestType", bound=FromRequestMixin)
+T = TypeVar("T")
 
 
 class PathFilter(Filter):
@@ -49,6 +94,11 @@ class PathFilter(Filter):
 
 
 class DIALApp(FastAPI):
+    json_codec: JSONCodec
+    memory_budget: Optional[MemoryBudget]
+    keep_alive_interval: Optional[float]
+    loop_monitor: Optional[LoopMonitor]
+    single_flight: Optional[SingleFlight]
 
     def __init__(
         self,
@@ -56,6 +106,12 @@ class DIALApp(FastAPI):
         propagate_auth_headers: bool = False,
         telemetry_config: Optional[TelemetryConfig] = None,
         add_healthcheck: bool = False,
+        json_codec: Union[JSONCodecName, JSONCodec] = "stdlib",
+        max_buffered_bytes: Optional[int] = None,
+        keep_alive_interval: Optional[float] = None,
+        log_queue_size: Optional[int] = None,
+        loop_monitor: Optional[LoopMonitor] = None,
+        single_flight: bool = False,
         **kwargs,
     ):
         if "propagation_auth_headers" in kwargs:
@@ -69,6 +125,33 @@ class DIALApp(FastAPI):
 
         super().__init__(**kwargs)
 
+        if log_queue_size is not None:
+            enable_log_queue(log_queue_size)
+
+        self.json_codec = (
+            create_json_codec(json_codec)
+            if isinstance(json_codec, str)
+            else json_codec
+        )
+
+        # The limit is shared by all the chat completion deployments of the app
+        self.memory_budget = (
+            MemoryBudget(max_buffered_bytes)
+            if max_buffered_bytes is not None
+            else None
+        )
+
+        # Interval (in seconds) of idleness of a stream
+        # after which an SSE comment is sent to keep the connection alive
+        self.keep_alive_interval = keep_alive_interval
+
+        # Started on the first request, since it requires the running loop
+        self.loop_monitor = loop_monitor
+
+        # Concurrent identical non-streaming requests of the same client
+        # share a single execution of the deployment
+        self.single_flight = SingleFlight() if single_flight else None
+
         if telemetry_config is not None:
             self.configure_telemetry(telemetry_config)
 
@@ -105,23 +188,64 @@ class DIALApp(FastAPI):
         init_telemetry(app=self, config=config)
 
     def add_embeddings(
-        self, deployment_name: str, impl: Embeddings
+        self,
+        deployment_name: str,
+        impl: Embeddings,
+        limiter: Optional[Limiter] = None,
+        batch: Optional[BatchConfig] = None,
+        cache: Optional[EmbeddingsCache] = None,
+        token_arrays: bool = False,
     ) -> "DIALApp":
+        batcher = None
+        if batch is not None:
+            batch_impl = get_method_implementation(impl, "embeddings_batch")
+            if batch_impl is None:
+                raise ValueError(
+                    "Batching requires the implementation of embeddings_batch"
+                )
+            batcher = EmbeddingsBatcher(batch, batch_impl)
+
         self.add_api_route(
             f"/openai/deployments/{deployment_name}/embeddings",
-            self._embeddings(deployment_name, impl),
+            self._embeddings(
+                deployment_name,
+                impl,
+                limiter,
+                batcher,
+                cache,
+                TokenArrayRequest if token_arrays else EmbeddingsRequest,
+            ),
             methods=["POST"],
         )
 
         return self
 
     def add_chat_completion(
-        self, deployment_name: str, impl: ChatCompletion
+        self,
+        deployment_name: str,
+        impl: ChatCompletion,
+        coalescing: Optional[CoalescingConfig] = None,
+        buffer: Optional[BufferConfig] = None,
+        keep_alive_interval: Optional[float] = None,
+        limiter: Optional[Limiter] = None,
+        cache: Optional[ResponseCache] = None,
     ) -> "DIALApp":
+        if keep_alive_interval is None:
+            keep_alive_interval = self.keep_alive_interval
+        if keep_alive_interval is not None and keep_alive_interval <= 0:
+            raise ValueError("keep_alive_interval must be positive")
 
         self.add_api_route(
             f"/openai/deployments/{deployment_name}/chat/completions",
-            self._chat_completion(deployment_name, impl),
+            self._chat_completion(
+                deployment_name,
+                impl,
+                coalescing,
+                buffer,
+                keep_alive_interval,
+                limiter,
+                cache,
+            ),
             methods=["POST"],
         )
 
@@ -162,22 +286,27 @@ class DIALApp(FastAPI):
         request_type: Type["RequestType"],
     ):
         async def _handler(original_request: Request) -> Response:
-            set_log_deployment(deployment_id)
+            self._set_request_context(deployment_id)
 
             request = await request_type.from_request(
                 original_request, deployment_id
             )
-            response = await endpoint_impl(request)
 
-            response_json = response.dict()
-            log_debug(f"response [{endpoint}]: {response_json}")
-            return JSONResponse(content=response_json)
+            async def _execute() -> Any:
+                response = await endpoint_impl(request)
+                return response.dict()
+
+            response_json = await self._run_single_flight(
+                request, endpoint, _execute
+            )
+            log_debug("response [%s]: %s", endpoint, response_json)
+            return self._json_response(response_json)
 
         return _handler
 
     def _rate_response(self, deployment_id: str, impl: ChatCompletion):
         async def _handler(original_request: Request):
-            set_log_deployment(deployment_id)
+            self._set_request_context(deployment_id)
 
             request = await RateRequest.from_request(
                 original_request, deployment_id
@@ -188,46 +317,231 @@ class DIALApp(FastAPI):
 
         return _handler
 
-    def _chat_completion(self, deployment_id: str, impl: ChatCompletion):
+    def _chat_completion(
+        self,
+        deployment_id: str,
+        impl: ChatCompletion,
+        coalescing: Optional[CoalescingConfig],
+        buffer: Optional[BufferConfig],
+        keep_alive_interval: Optional[float],
+        limiter: Optional[Limiter],
+        cache: Optional[ResponseCache],
+    ):
         async def _handler(original_request: Request):
-            set_log_deployment(deployment_id)
+            self._set_request_context(deployment_id)
+            stream_metrics = StreamMetrics(deployment_id)
 
-            request = await ChatCompletionRequest.from_request(
-                original_request, deployment_id
+            permit = (
+                await limiter.acquire(original_request)
+                if limiter is not None
+                else None
             )
+            try:
+                request = await ChatCompletionRequest.from_request(
+                    original_request, deployment_id
+                )
+                stream_metrics.request_parsed(request.stream)
+
+                key = cache_key(request) if cache is not None else None
+                if cache is not None and key is not None:
+                    cached = await get_cached_response(
+                        cache, key, {"deployment": deployment_id}
+                    )
+                    if cached is not None:
+                        stream_metrics.finish()
+                        return self._cached_response(request, cached)
+
+                def _create_response() -> ChatCompletionResponse:
+                    return ChatCompletionResponse(
+                        request,
+                        coalescing=coalescing,
+                        buffer=buffer,
+                        memory_budget=self.memory_budget,
+                        stream_metrics=stream_metrics,
+                        keep_alive_interval=keep_alive_interval,
+                        on_first_chunk=(
+                            permit.first_chunk if permit is not None else None
+                        ),
+                    )
+
+                if request.stream:
+                    response = _create_response()
+                    try:
+                        first_chunk = await response._generator(
+                            impl.chat_completion, request
+                        )
+                    except BaseException:
+                        # The stream isn't started, so it won't be closed
+                        response._close_stream()
+                        raise
+
+                    stream = response._generate_stream(first_chunk)
+                    if cache is not None and key is not None:
+                        stream = cache_stream(
+                            stream, response, cache, key, self.json_codec
+                        )
+                    # The permit is held until the stream is finished
+                    streaming_response = _ChatCompletionStreamingResponse(
+                        stream, response, permit
+                    )
+                    permit = None
+                    return streaming_response
+
+                async def _execute() -> Any:
+                    response = _create_response()
+                    first_chunk = await response._generator(
+                        impl.chat_completion, request
+                    )
+
+                    response_json = await response._merge_stream(first_chunk)
+                    if permit is not None:
+                        permit.tokens = response._total_tokens()
+                    return response_json
+
+                try:
+                    response_json = await self._run_single_flight(
+                        request, "chat/completions", _execute
+                    )
+
+                    log_debug("response: %s", response_json)
+                    json_response = self._json_response(response_json)
+                    stream_metrics.add_size(len(json_response.body))
+                    if cache is not None and key is not None:
+                        await store_response(cache, key, json_response.body)
+                    return json_response
+                finally:
+                    stream_metrics.finish()
+            finally:
+                if permit is not None:
+                    permit.release()
 
-            response = ChatCompletionResponse(request)
-            first_chunk = await response._generator(
-                impl.chat_completion, request
-            )
+        return _handler
 
-            if request.stream:
-                return StreamingResponse(
-                    response._generate_stream(first_chunk),
-                    media_type="text/event-stream",
-                )
-            else:
-                response_json = await merge_chunks(
-                    response._generate_stream(first_chunk)
+    def _embeddings(
+        self,
+        deployment_id: str,
+        impl: Embeddings,
+        limiter: Optional[Limiter],
+        batcher: Optional[EmbeddingsBatcher],
+        cache: Optional[EmbeddingsCache],
+        request_type: Type[EmbeddingsRequest],
+    ):
+        async def _handler(original_request: Request):
+            self._set_request_context(deployment_id)
+
+            permit = (
+                await limiter.acquire(original_request)
+                if limiter is not None
+                else None
+            )
+            try:
+                request = await request_type.from_request(
+                    original_request, deployment_id
                 )
 
-                log_debug(f"response: {response_json}")
-                return JSONResponse(content=response_json)
+                async def _embeddings(
+                    request: EmbeddingsRequest,
+                ) -> EmbeddingsResponse:
+                    if batcher is not None and batcher.is_batchable(request):
+                        return await batcher.embeddings(request)
+                    return await impl.embeddings(request)
+
+                async def _execute() -> Any:
+                    if cache is not None:
+                        response = await cached_embeddings(
+                            cache, deployment_id, request, _embeddings
+                        )
+                    else:
+                        response = await _embeddings(request)
+                    if permit is not None:
+                        permit.tokens = response.usage.total_tokens
+                    return encode_response(
+                        response, request.encoding_format, self.json_codec
+                    )
+
+                content = await self._run_single_flight(
+                    request, "embeddings", _execute
+                )
+                return Response(content=content, media_type="application/json")
+            finally:
+                if permit is not None:
+                    permit.release()
 
         return _handler
 
-    def _embeddings(self, deployment_id: str, impl: Embeddings):
-        async def _handler(original_request: Request):
-            set_log_deployment(deployment_id)
-            request = await EmbeddingsRequest.from_request(
-                original_request, deployment_id
+    async def _run_single_flight(
+        self,
+        request: FromRequestDeploymentMixin,
+        endpoint: str,
+        execute: Callable[[], Awaitable[T]],
+    ) -> T:
+        if self.single_flight is None:
+            return await execute()
+        return await self.single_flight.run(
+            request_key(request, endpoint), execute
+        )
+
+    def _set_request_context(self, deployment_id: str) -> None:
+        set_log_deployment(deployment_id)
+        set_json_codec(self.json_codec)
+        if self.loop_monitor is not None:
+            self.loop_monitor.ensure_started()
+
+    def _cached_response(
+        self, request: ChatCompletionRequest, content: bytes
+    ) -> Response:
+        if request.stream:
+            return StreamingResponse(
+                replay_stream(self.json_codec.loads(content), self.json_codec),
+                media_type="text/event-stream",
             )
-            response = await impl.embeddings(request)
-            response_json = response.dict()
-            return JSONResponse(content=response_json)
+        return Response(content=content, media_type="application/json")
 
-        return _handler
+    def _json_response(self, content: Any) -> Response:
+        return Response(
+            content=self.json_codec.encode(content),
+            media_type="application/json",
+        )
 
     @staticmethod
     async def _healthcheck() -> JSONResponse:
         return JSONResponse(content={"status": "ok"})
+
+
+class _ChatCompletionStreamingResponse(StreamingResponse):
+    """
+    Stream of a chat completion response, which is finalized once
+    the response is sent or sending it has failed: the generation
+    is stopped and the permit is released.
+
+    It doesn't rely on the iteration of the stream, since the server
+    may fail to send the response start (e.g. when the client
+    has disconnected) before the stream is iterated.
+    """
+
+    _stream: AsyncGenerator[str, None]
+    _response: ChatCompletionResponse
+    _permit: Optional[Permit]
+
+    def __init__(
+        self,
+        stream: AsyncGenerator[str, None],
+        response: ChatCompletionResponse,
+        permit: Optional[Permit],
+    ):
+        super().__init__(stream, media_type="text/event-stream")
+        self._stream = stream
+        self._response = response
+        self._permit = permit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self._stream.aclose()
+            finally:
+                self._response._close_stream()
+                if self._permit is not None:
+                    self._permit.tokens = self._response._total_tokens()
+                    self._permit.release()
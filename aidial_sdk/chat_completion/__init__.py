@@ -1,5 +1,12 @@
 from aidial_sdk.chat_completion.base import ChatCompletion
+from aidial_sdk.chat_completion.buffering import BufferConfig
+from aidial_sdk.chat_completion.cache import (
+    MemoryResponseCache,
+    ResponseCache,
+    SqliteResponseCache,
+)
 from aidial_sdk.chat_completion.choice import Choice
+from aidial_sdk.chat_completion.coalescing import CoalescingConfig
 from aidial_sdk.chat_completion.enums import FinishReason, Status
 from aidial_sdk.chat_completion.request import (
     Addon,
@@ -0,0 +1,62 @@
+from typing import Optional
+
+from aidial_sdk.chat_completion.chunks import (
+    BaseAttachmentChunk,
+    ContentChunk,
+    ContentStageChunk,
+    FunctionCallChunk,
+    FunctionToolCallChunk,
+    NameStageChunk,
+    StartStageChunk,
+)
+from aidial_sdk.pydantic_v1 import BaseModel, PositiveInt
+
+
+class BufferConfig(BaseModel):
+    """
+    Bounds of the buffer of chunks generated, but not yet sent to the client.
+
+    The awaitable methods of choices and stages (aappend_content,
+    aadd_attachment, etc.) suspend the application while the buffer is full.
+    The synchronous methods don't wait and may exceed the bounds.
+    """
+
+    """Maximum number of buffered chunks"""
+    max_chunks: Optional[PositiveInt] = None
+
+    """Maximum total size (in UTF-8 bytes) of the text and attachment
+    data of buffered chunks"""
+    max_bytes: Optional[PositiveInt] = None
+
+
+def utf8_len(value: Optional[str]) -> int:
+    """Size of the UTF-8 encoding of the string"""
+
+    if value is None:
+        return 0
+    # isascii is O(1) for str, so the common case doesn't encode
+    if value.isascii():
+        return len(value)
+    return len(value.encode("utf-8"))
+
+
+def chunk_size(chunk: object) -> int:
+    """
+    Approximate size of the payload of the chunk,
+    i.e. the size in UTF-8 bytes of its text fields and attachment data.
+    """
+
+    if isinstance(chunk, (ContentChunk, ContentStageChunk)):
+        return utf8_len(chunk.content)
+    if isinstance(chunk, (FunctionToolCallChunk, FunctionCallChunk)):
+        return utf8_len(chunk.name) + utf8_len(chunk.arguments)
+    if isinstance(chunk, (NameStageChunk, StartStageChunk)):
+        return utf8_len(chunk.name)
+    if isinstance(chunk, BaseAttachmentChunk):
+        return (
+            utf8_len(chunk.data)
+            + utf8_len(chunk.url)
+            + utf8_len(chunk.title)
+            + utf8_len(chunk.reference_url)
+        )
+    return 0
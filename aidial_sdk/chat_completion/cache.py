@@ -0,0 +1,437 @@
+"""
+Cache of the responses of the deterministic chat completion requests,
+i.e. the requests with zero temperature or a fixed seed.
+
+The cache stores the final merged (non-streaming) response and serves it
+to both non-streaming requests and streaming ones, for the latter
+the response is replayed as a synthesized stream.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from time import monotonic, time
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from aidial_sdk.chat_completion.request import ChatCompletionRequest, Request
+from aidial_sdk.chat_completion.response import (
+    Response as ChatCompletionResponse,
+)
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils._single_flight import client_scope
+from aidial_sdk.utils.json import JSONCodec
+from aidial_sdk.utils.logging import log_exception
+from aidial_sdk.utils.streaming import DONE_MARKER, to_event
+
+T = TypeVar("T")
+
+_hits = metrics.counter(
+    "aidial_sdk.chat_completion.cache.hits",
+    description="Number of the chat completion requests served from the cache",
+)
+_misses = metrics.counter(
+    "aidial_sdk.chat_completion.cache.misses",
+    description="Number of the cacheable chat completion requests "
+    "not found in the cache",
+)
+_evictions = metrics.counter(
+    "aidial_sdk.chat_completion.cache.evictions",
+    description="Number of the responses evicted from the cache",
+)
+
+# The fields which don't affect the response
+_IGNORED_FIELDS = {"stream"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('clock', 0);
+"""
+
+
+class ResponseCache(ABC):
+    """
+    Storage of the cached responses.
+
+    The responses are evicted in the least recently used order
+    once their total size exceeds max_bytes and expire after ttl seconds.
+    """
+
+    max_bytes: int
+    ttl: Optional[float]
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Returns the response or None if it isn't cached or has expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes) -> None:
+        """Stores the response evicting the least recently used ones"""
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-memory cache of a single worker"""
+
+    _entries: "OrderedDict[str, Tuple[bytes, float]]"
+    _size: int
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        super().__init__(max_bytes, ttl)
+        self._entries = OrderedDict()
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached keys and responses"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at <= monotonic():
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = (
+            monotonic() + self.ttl if self.ttl is not None else float("inf")
+        )
+        self._entries[key] = (value, expires_at)
+        self._size += size
+
+        while self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            _evictions.add()
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._size -= len(key) + len(value)
+
+
+class SqliteResponseCache(ResponseCache):
+    """
+    Cache in a local SQLite database, which is shared by the workers
+    on the same host and survives restarts.
+
+    The total size and the access clock of the LRU order are kept
+    in the database and updated in the transactions of the workers,
+    so that the limit holds for the workers together.
+
+    The database is accessed from a dedicated thread,
+    so that the disk I/O doesn't block the event loop.
+    """
+
+    _connection: sqlite3.Connection
+    _executor: ThreadPoolExecutor
+
+    def __init__(self, path: str, max_bytes: int, ttl: Optional[float] = None):
+        super().__init__(max_bytes, ttl)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="aidial_sdk_response_cache"
+        )
+        self._connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._connection.executescript(_SCHEMA)
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached keys and responses"""
+        return self._total()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self._run(self._set, key, value)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        self._connection.close()
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def _total(self) -> int:
+        return self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def _tick(self) -> int:
+        self._connection.execute(
+            "UPDATE meta SET value = value + 1 WHERE name = 'clock'"
+        )
+        return self._connection.execute(
+            "SELECT value FROM meta WHERE name = 'clock'"
+        ).fetchone()[0]
+
+    def _get(self, key: str) -> Optional[bytes]:
+        with self._transaction():
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time():
+                self._connection.execute(
+                    "DELETE FROM responses WHERE key = ?", (key,)
+                )
+                return None
+
+            self._connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                (self._tick(), key),
+            )
+            return value
+
+    def _set(self, key: str, value: bytes) -> None:
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time() + self.ttl if self.ttl is not None else None
+
+        with self._transaction():
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, value, size, expires_at, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires_at, self._tick()),
+            )
+
+            total = self._total()
+            while total > self.max_bytes:
+                row = self._connection.execute(
+                    "SELECT key, size FROM responses"
+                    " ORDER BY accessed LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    break
+
+                oldest_key, oldest_size = row
+                self._connection.execute(
+                    "DELETE FROM responses WHERE key = ?", (oldest_key,)
+                )
+                total -= oldest_size
+                _evictions.add()
+
+
+def cache_key(request: Request) -> Optional[str]:
+    """
+    Hash of the fields of the request affecting the response
+    or None if the response isn't deterministic.
+
+    The responses are cached per client: the key includes
+    the credentials and the forwarded headers of the request.
+    """
+
+    if request.temperature != 0 and request.seed is None:
+        return None
+
+    fields = set(ChatCompletionRequest.__fields__) - _IGNORED_FIELDS
+    data = json.dumps(
+        [
+            request.deployment_id,
+            *client_scope(request),
+            request.dict(include=fields),
+        ],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+async def get_cached_response(
+    cache: ResponseCache, key: str, attributes: Dict[str, str]
+) -> Optional[bytes]:
+    try:
+        value = await cache.get(key)
+    except Exception:
+        log_exception("Failed to read the response cache")
+        value = None
+
+    (_hits if value is not None else _misses).add(attributes=attributes)
+    return value
+
+
+async def store_response(cache: ResponseCache, key: str, value: bytes) -> None:
+    try:
+        await cache.set(key, value)
+    except Exception:
+        log_exception("Failed to write the response cache")
+
+
+async def replay_stream(
+    response: Dict[str, Any], codec: JSONCodec
+) -> AsyncIterator[str]:
+    """
+    Synthesizes a stream of a cached response:
+    a chunk per choice with the whole message followed by
+    the usage and statistics in the last chunk.
+    """
+
+    header = {
+        key: response[key]
+        for key in ("id", "model", "created")
+        if key in response
+    }
+    header["object"] = "chat.completion.chunk"
+
+    chunks: List[Dict[str, Any]] = [
+        {
+            **header,
+            "choices": [
+                {
+                    "index": choice["index"],
+                    "delta": _restore_indices(choice.get("message", {})),
+                    "finish_reason": choice.get("finish_reason"),
+                }
+            ],
+        }
+        for choice in response.get("choices", [])
+    ]
+
+    last_chunk = chunks[-1] if chunks else {**header, "choices": []}
+    for key in ("usage", "statistics"):
+        if response.get(key) is not None:
+            last_chunk[key] = response[key]
+    if not chunks:
+        chunks.append(last_chunk)
+
+    for chunk in chunks:
+        yield to_event(chunk, codec)
+    yield to_event(DONE_MARKER, codec)
+
+
+async def cache_stream(
+    stream: AsyncGenerator[str, None],
+    response: ChatCompletionResponse,
+    cache: ResponseCache,
+    key: str,
+    codec: JSONCodec,
+) -> AsyncGenerator[str, None]:
+    """
+    Passes the SSE events of the stream through and stores
+    the merged response once the stream completes successfully.
+
+    The response is accumulated from the chunks of the stream
+    as they are emitted, so the events aren't parsed back.
+    """
+
+    response._accumulate()
+    async for event in stream:
+        yield event
+
+    merged = response._accumulated()
+    if merged is None or "choices" not in merged:
+        return
+
+    merged["object"] = "chat.completion"
+    await store_response(cache, key, codec.encode(merged))
+
+
+def _restore_indices(message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Puts back the indices of the elements of the indexed lists
+    of a message, which are removed from the merged response,
+    since the stream clients merge the deltas by the indices.
+    """
+
+    message = dict(message)
+    if message.get("tool_calls"):
+        message["tool_calls"] = _indexed(message["tool_calls"])
+
+    custom_content = message.get("custom_content")
+    if custom_content:
+        custom_content = dict(custom_content)
+        if custom_content.get("attachments"):
+            custom_content["attachments"] = _indexed(
+                custom_content["attachments"]
+            )
+        if custom_content.get("stages"):
+            custom_content["stages"] = _indexed(
+                [
+                    (
+                        {**stage, "attachments": _indexed(stage["attachments"])}
+                        if stage.get("attachments")
+                        else stage
+                    )
+                    for stage in custom_content["stages"]
+                ]
+            )
+        message["custom_content"] = custom_content
+
+    return message
+
+
+def _indexed(elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {"index": index, **element} for index, element in enumerate(elements)
+    ]
@@ -1,5 +1,3 @@
-import json
-from asyncio import Queue
 from types import TracebackType
 from typing import Any, Optional, Type, overload
 
@@ -17,15 +15,16 @@ from aidial_sdk.chat_completion.function_call import FunctionCall
 from aidial_sdk.chat_completion.function_tool_call import FunctionToolCall
 from aidial_sdk.chat_completion.request import Attachment
 from aidial_sdk.chat_completion.stage import Stage
-from aidial_sdk.pydantic_v1 import ValidationError
-from aidial_sdk.utils._attachment import create_attachment
+from aidial_sdk.utils._attachment import create_response_attachment
+from aidial_sdk.utils._channel import Channel
 from aidial_sdk.utils._content_stream import ContentStream
 from aidial_sdk.utils.errors import runtime_error
-from aidial_sdk.utils.logging import log_debug
+from aidial_sdk.utils.json import get_json_codec
+from aidial_sdk.utils.logging import is_debug_enabled, log_debug
 
 
 class Choice(ChoiceBase):
-    _queue: Queue
+    _queue: Channel
     _index: int
     _last_attachment_index: int
     _last_stage_index: int
@@ -36,7 +35,7 @@ class Choice(ChoiceBase):
     _state_submitted: bool
     _last_finish_reason: Optional[FinishReason]
 
-    def __init__(self, queue: Queue, choice_index: int):
+    def __init__(self, queue: Channel, choice_index: int):
         self._queue = queue
         self._index = choice_index
         self._last_attachment_index = 0
@@ -62,9 +61,15 @@ class Choice(ChoiceBase):
         return False
 
     def send_chunk(self, chunk: BaseChunk) -> None:
-        log_debug("chunk: " + json.dumps(chunk.to_dict()))
+        if is_debug_enabled():
+            log_debug("chunk: %s", get_json_codec().dumps(chunk.to_dict()))
         self._queue.put_nowait(chunk)
 
+    async def asend_chunk(self, chunk: BaseChunk) -> None:
+        if is_debug_enabled():
+            log_debug("chunk: %s", get_json_codec().dumps(chunk.to_dict()))
+        await self._queue.put(chunk)
+
     @property
     def index(self) -> int:
         return self._index
@@ -82,6 +87,14 @@ class Choice(ChoiceBase):
         return self._has_function_call
 
     def append_content(self, content: str) -> None:
+        self.send_chunk(self._content_chunk(content))
+        self._last_finish_reason = FinishReason.STOP
+
+    async def aappend_content(self, content: str) -> None:
+        await self.asend_chunk(self._content_chunk(content))
+        self._last_finish_reason = FinishReason.STOP
+
+    def _content_chunk(self, content: str) -> ContentChunk:
         if not self._opened:
             raise runtime_error(
                 "Trying to append content to an unopened choice"
@@ -89,8 +102,7 @@ class Choice(ChoiceBase):
         if self._closed:
             raise runtime_error("Trying to append content to a closed choice")
 
-        self.send_chunk(ContentChunk(content, self._index))
-        self._last_finish_reason = FinishReason.STOP
+        return ContentChunk(content, self._index)
 
     @property
     def content_stream(self) -> ContentStream:
@@ -129,6 +141,28 @@ class Choice(ChoiceBase):
     ) -> None: ...
 
     def add_attachment(self, *args, **kwargs) -> None:
+        self.send_chunk(self._attachment_chunk(*args, **kwargs))
+        self._last_attachment_index += 1
+
+    @overload
+    async def aadd_attachment(self, attachment: Attachment) -> None: ...
+
+    @overload
+    async def aadd_attachment(
+        self,
+        type: Optional[str] = None,
+        title: Optional[str] = None,
+        data: Optional[str] = None,
+        url: Optional[str] = None,
+        reference_url: Optional[str] = None,
+        reference_type: Optional[str] = None,
+    ) -> None: ...
+
+    async def aadd_attachment(self, *args, **kwargs) -> None:
+        await self.asend_chunk(self._attachment_chunk(*args, **kwargs))
+        self._last_attachment_index += 1
+
+    def _attachment_chunk(self, *args, **kwargs) -> AttachmentChunk:
         if not self._opened:
             raise runtime_error(
                 "Trying to add attachment to an unopened choice"
@@ -136,18 +170,11 @@ class Choice(ChoiceBase):
         if self._closed:
             raise runtime_error("Trying to add attachment to a closed choice")
 
-        attachment_chunk = None
-        try:
-            attachment_chunk = AttachmentChunk(
-                choice_index=self._index,
-                attachment_index=self._last_attachment_index,
-                **create_attachment(*args, **kwargs).dict(),
-            )
-        except ValidationError as e:
-            raise runtime_error(e.errors()[0]["msg"])
-
-        self.send_chunk(attachment_chunk)
-        self._last_attachment_index += 1
+        return AttachmentChunk(
+            choice_index=self._index,
+            attachment_index=self._last_attachment_index,
+            **create_response_attachment(*args, **kwargs).dict(),
+        )
 
     def set_state(self, state: Any) -> None:
         if self._state_submitted:
@@ -27,3 +27,7 @@ class ChoiceBase(ABC):
     @abstractmethod
     def send_chunk(self, chunk: BaseChunk) -> None:
         pass
+
+    @abstractmethod
+    async def asend_chunk(self, chunk: BaseChunk) -> None:
+        pass
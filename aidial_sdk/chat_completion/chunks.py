@@ -1,12 +1,14 @@
+import warnings
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional
 
 from aidial_sdk.chat_completion.enums import FinishReason, Status
-from aidial_sdk.pydantic_v1 import BaseModel, root_validator
 from aidial_sdk.utils.json import remove_nones
 
 
 class BaseChunk(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def to_dict(self) -> Dict[str, Any]:
         pass
@@ -15,6 +17,8 @@ class BaseChunk(ABC):
 class StartChoiceChunk(BaseChunk):
     choice_index: int
 
+    __slots__ = ("choice_index",)
+
     def __init__(self, choice_index: int):
         self.choice_index = choice_index
 
@@ -35,6 +39,8 @@ class EndChoiceChunk(BaseChunk):
     finish_reason: FinishReason
     choice_index: int
 
+    __slots__ = ("finish_reason", "choice_index")
+
     def __init__(self, finish_reason: FinishReason, choice_index: int):
         self.finish_reason = finish_reason
         self.choice_index = choice_index
@@ -56,6 +62,8 @@ class ContentChunk(BaseChunk):
     content: str
     choice_index: int
 
+    __slots__ = ("content", "choice_index")
+
     def __init__(self, content: str, choice_index: int):
         self.content = content
         self.choice_index = choice_index
@@ -80,6 +88,8 @@ class FunctionToolCallChunk(BaseChunk):
     name: Optional[str]
     arguments: Optional[str]
 
+    __slots__ = ("choice_index", "call_index", "id", "name", "arguments")
+
     def __init__(
         self,
         choice_index: int,
@@ -128,6 +138,8 @@ class FunctionCallChunk(BaseChunk):
     name: Optional[str]
     arguments: Optional[str]
 
+    __slots__ = ("choice_index", "name", "arguments")
+
     def __init__(
         self,
         choice_index: int,
@@ -163,6 +175,8 @@ class StartStageChunk(BaseChunk):
     stage_index: int
     name: Optional[str]
 
+    __slots__ = ("choice_index", "stage_index", "name")
+
     def __init__(
         self, choice_index: int, stage_index: int, name: Optional[str]
     ):
@@ -198,6 +212,8 @@ class FinishStageChunk(BaseChunk):
     stage_index: int
     status: Status
 
+    __slots__ = ("choice_index", "stage_index", "status")
+
     def __init__(self, choice_index: int, stage_index: int, status: Status):
         self.choice_index = choice_index
         self.stage_index = stage_index
@@ -230,6 +246,8 @@ class ContentStageChunk(BaseChunk):
     stage_index: int
     content: str
 
+    __slots__ = ("choice_index", "stage_index", "content")
+
     def __init__(self, choice_index: int, stage_index: int, content: str):
         self.choice_index = choice_index
         self.stage_index = stage_index
@@ -263,6 +281,8 @@ class NameStageChunk(BaseChunk):
     stage_index: int
     name: str
 
+    __slots__ = ("choice_index", "stage_index", "name")
+
     def __init__(self, choice_index: int, stage_index: int, name: str):
         self.choice_index = choice_index
         self.stage_index = stage_index
@@ -291,7 +311,12 @@ class NameStageChunk(BaseChunk):
         }
 
 
-class Attachment(BaseModel):
+class BaseAttachmentChunk(BaseChunk):
+    """
+    The attachment fields are expected to be validated
+    by the public methods which create the chunks (add_attachment).
+    """
+
     choice_index: int
     attachment_index: int
 
@@ -302,16 +327,36 @@ class Attachment(BaseModel):
     reference_url: Optional[str]
     reference_type: Optional[str]
 
-    @root_validator
-    def check_data_or_url(cls, values):
-        data, url = values.get("data"), values.get("url")
-
-        if data is None and url is None:
-            raise ValueError("Trying to add attachment without data and url")
-        if data is not None and url is not None:
-            raise ValueError("Trying to add attachment with data and url")
+    __slots__ = (
+        "choice_index",
+        "attachment_index",
+        "type",
+        "title",
+        "data",
+        "url",
+        "reference_url",
+        "reference_type",
+    )
 
-        return values
+    def __init__(
+        self,
+        choice_index: int,
+        attachment_index: int,
+        type: Optional[str] = None,
+        title: Optional[str] = None,
+        data: Optional[str] = None,
+        url: Optional[str] = None,
+        reference_url: Optional[str] = None,
+        reference_type: Optional[str] = None,
+    ):
+        self.choice_index = choice_index
+        self.attachment_index = attachment_index
+        self.type = type
+        self.title = title
+        self.data = data
+        self.url = url
+        self.reference_url = reference_url
+        self.reference_type = reference_type
 
     def attachment_dict(self, index: int):
         attachment: Dict[str, Any] = {"index": index}
@@ -332,7 +377,9 @@ class Attachment(BaseModel):
         return attachment
 
 
-class AttachmentChunk(Attachment, BaseChunk):
+class AttachmentChunk(BaseAttachmentChunk):
+    __slots__ = ()
+
     def to_dict(self):
         return {
             "choices": [
@@ -352,9 +399,35 @@ class AttachmentChunk(Attachment, BaseChunk):
         }
 
 
-class AttachmentStageChunk(Attachment, BaseChunk):
+class AttachmentStageChunk(BaseAttachmentChunk):
     stage_index: int
 
+    __slots__ = ("stage_index",)
+
+    def __init__(
+        self,
+        choice_index: int,
+        stage_index: int,
+        attachment_index: int,
+        type: Optional[str] = None,
+        title: Optional[str] = None,
+        data: Optional[str] = None,
+        url: Optional[str] = None,
+        reference_url: Optional[str] = None,
+        reference_type: Optional[str] = None,
+    ):
+        super().__init__(
+            choice_index,
+            attachment_index,
+            type=type,
+            title=title,
+            data=data,
+            url=url,
+            reference_url=reference_url,
+            reference_type=reference_type,
+        )
+        self.stage_index = stage_index
+
     def to_dict(self):
         return {
             "choices": [
@@ -386,6 +459,8 @@ class StateChunk(BaseChunk):
     choice_index: int
     state: Any
 
+    __slots__ = ("choice_index", "state")
+
     def __init__(self, choice_index: int, state: Any):
         self.state = state
         self.choice_index = choice_index
@@ -407,6 +482,8 @@ class UsageChunk(BaseChunk):
     prompt_tokens: int
     completion_tokens: int
 
+    __slots__ = ("prompt_tokens", "completion_tokens")
+
     def __init__(self, prompt_tokens: int, completion_tokens: int):
         self.prompt_tokens = prompt_tokens
         self.completion_tokens = completion_tokens
@@ -427,6 +504,8 @@ class UsagePerModelChunk(BaseChunk):
     prompt_tokens: int
     completion_tokens: int
 
+    __slots__ = ("index", "model", "prompt_tokens", "completion_tokens")
+
     def __init__(
         self,
         index: int,
@@ -459,6 +538,8 @@ class UsagePerModelChunk(BaseChunk):
 class DiscardedMessagesChunk(BaseChunk):
     discarded_messages: List[int]
 
+    __slots__ = ("discarded_messages",)
+
     def __init__(self, discarded_messages: List[int]):
         self.discarded_messages = discarded_messages
 
@@ -473,5 +554,20 @@ class DiscardedMessagesChunk(BaseChunk):
 class EndChunk:
     exc: Optional[Exception]
 
+    __slots__ = ("exc",)
+
     def __init__(self, exc: Optional[Exception] = None):
         self.exc = exc
+
+
+def __getattr__(name: str) -> Any:
+    # Attachment was the pydantic base model of the attachment chunks
+    if name == "Attachment":
+        warnings.warn(
+            "The 'Attachment' chunk base class is deprecated. "
+            "Use 'BaseAttachmentChunk' instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return BaseAttachmentChunk
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
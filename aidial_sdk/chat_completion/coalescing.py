@@ -0,0 +1,95 @@
+from typing import List
+
+from aidial_sdk.chat_completion.chunks import (
+    BaseChunk,
+    ContentChunk,
+    ContentStageChunk,
+    FunctionToolCallChunk,
+)
+from aidial_sdk.pydantic_v1 import BaseModel, PositiveFloat, PositiveInt
+
+
+class CoalescingConfig(BaseModel):
+    """Merging of consecutive content chunks into a single SSE event"""
+
+    """Maximum time (in seconds) a content chunk may be held back
+    waiting for the following chunks of the same choice"""
+    max_delay: PositiveFloat = 0.02
+
+    """Maximum size (in UTF-8 bytes) of the content merged
+    into a single event"""
+    max_bytes: PositiveInt = 4096
+
+
+def is_coalescable(chunk: object) -> bool:
+    return isinstance(
+        chunk, (ContentChunk, ContentStageChunk, FunctionToolCallChunk)
+    )
+
+
+def can_coalesce(target: BaseChunk, source: object) -> bool:
+    """
+    Checks if the source chunk could be appended to the target chunk
+    without changing the meaning of the stream.
+    """
+
+    if isinstance(target, ContentChunk):
+        return (
+            isinstance(source, ContentChunk)
+            and source.choice_index == target.choice_index
+        )
+
+    if isinstance(target, ContentStageChunk):
+        return (
+            isinstance(source, ContentStageChunk)
+            and source.choice_index == target.choice_index
+            and source.stage_index == target.stage_index
+        )
+
+    if isinstance(target, FunctionToolCallChunk):
+        return (
+            isinstance(source, FunctionToolCallChunk)
+            and source.choice_index == target.choice_index
+            and source.call_index == target.call_index
+            and source.id is None
+            and source.name is None
+        )
+
+    return False
+
+
+def get_text(chunk: BaseChunk) -> str:
+    if isinstance(chunk, (ContentChunk, ContentStageChunk)):
+        return chunk.content
+    if isinstance(chunk, FunctionToolCallChunk):
+        return chunk.arguments or ""
+    raise TypeError(f"Chunk '{type(chunk).__name__}' has no text")
+
+
+def coalesce(target: BaseChunk, parts: List[str]) -> BaseChunk:
+    """
+    Builds a chunk equal to the target chunk with the text parts
+    of the coalesced chunks appended.
+    """
+
+    if len(parts) == 1:
+        return target
+
+    text = "".join(parts)
+
+    if isinstance(target, ContentChunk):
+        return ContentChunk(text, target.choice_index)
+
+    if isinstance(target, ContentStageChunk):
+        return ContentStageChunk(target.choice_index, target.stage_index, text)
+
+    if isinstance(target, FunctionToolCallChunk):
+        return FunctionToolCallChunk(
+            target.choice_index,
+            target.call_index,
+            id=target.id,
+            name=target.name,
+            arguments=text,
+        )
+
+    raise TypeError(f"Chunk '{type(target).__name__}' can't be coalesced")
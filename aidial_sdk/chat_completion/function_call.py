@@ -20,9 +20,21 @@ class FunctionCall:
     def append_arguments(self, arguments: str) -> "FunctionCall":
         return self._send_function_call(name=None, arguments=arguments)
 
+    async def aappend_arguments(self, arguments: str) -> "FunctionCall":
+        await self._choice.asend_chunk(
+            self._function_call_chunk(name=None, arguments=arguments)
+        )
+        return self
+
     def _send_function_call(
         self, name: Optional[str], arguments: Optional[str]
     ) -> "FunctionCall":
+        self._choice.send_chunk(self._function_call_chunk(name, arguments))
+        return self
+
+    def _function_call_chunk(
+        self, name: Optional[str], arguments: Optional[str]
+    ) -> FunctionCallChunk:
         if not self._choice.opened:
             raise runtime_error(
                 "Trying to add function call to an unopened choice"
@@ -36,10 +48,6 @@ class FunctionCall:
                 "Trying to add function call to a choice which already has a function call"
             )
 
-        self._choice.send_chunk(
-            FunctionCallChunk(
-                self._choice.index, name=name, arguments=arguments
-            )
+        return FunctionCallChunk(
+            self._choice.index, name=name, arguments=arguments
         )
-
-        return self
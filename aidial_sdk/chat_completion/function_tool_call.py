@@ -29,22 +29,30 @@ class FunctionToolCall:
     def append_arguments(self, arguments: str) -> "FunctionToolCall":
         return self._send_tool_call(id=None, name=None, arguments=arguments)
 
+    async def aappend_arguments(self, arguments: str) -> "FunctionToolCall":
+        await self._choice.asend_chunk(
+            self._tool_call_chunk(id=None, name=None, arguments=arguments)
+        )
+        return self
+
     def _send_tool_call(
         self, id: Optional[str], name: Optional[str], arguments: Optional[str]
     ) -> "FunctionToolCall":
+        self._choice.send_chunk(self._tool_call_chunk(id, name, arguments))
+        return self
+
+    def _tool_call_chunk(
+        self, id: Optional[str], name: Optional[str], arguments: Optional[str]
+    ) -> FunctionToolCallChunk:
         if not self._choice.opened:
             raise runtime_error("Trying to add tool call to an unopened choice")
         if self._choice.closed:
             raise runtime_error("Trying to add tool call to a closed choice")
 
-        self._choice.send_chunk(
-            FunctionToolCallChunk(
-                self._choice.index,
-                self._index,
-                id=id,
-                name=name,
-                arguments=arguments,
-            )
+        return FunctionToolCallChunk(
+            self._choice.index,
+            self._index,
+            id=id,
+            name=name,
+            arguments=arguments,
         )
-
-        return self
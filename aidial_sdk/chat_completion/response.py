@@ -3,52 +3,130 @@ from time import time
 from typing import (
     Any,
     AsyncGenerator,
+    Awaitable,
     Callable,
     Coroutine,
     Dict,
     List,
     Optional,
+    Tuple,
 )
 from uuid import uuid4
 
+from aidial_sdk.chat_completion.buffering import (
+    BufferConfig,
+    chunk_size,
+    utf8_len,
+)
 from aidial_sdk.chat_completion.choice import Choice
 from aidial_sdk.chat_completion.chunks import (
     BaseChunk,
+    ContentChunk,
     DiscardedMessagesChunk,
     EndChoiceChunk,
     EndChunk,
     UsageChunk,
     UsagePerModelChunk,
 )
+from aidial_sdk.chat_completion.coalescing import (
+    CoalescingConfig,
+    can_coalesce,
+    coalesce,
+    get_text,
+    is_coalescable,
+)
 from aidial_sdk.chat_completion.request import Request
 from aidial_sdk.exceptions import HTTPException as DIALException
 from aidial_sdk.exceptions import RequestValidationError, RuntimeServerError
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils._accumulator import ResponseAccumulator
+from aidial_sdk.utils._channel import Channel, MemoryBudget, interleave
+from aidial_sdk.utils._serializer import ChunkSerializer
+from aidial_sdk.utils._stream_metrics import StreamMetrics
 from aidial_sdk.utils.errors import RUNTIME_ERROR_MESSAGE, runtime_error
+from aidial_sdk.utils.json import JSONCodec, get_json_codec
 from aidial_sdk.utils.logging import log_error, log_exception
 from aidial_sdk.utils.merge_chunks import merge
-from aidial_sdk.utils.streaming import DONE_MARKER, format_chunk
+from aidial_sdk.utils.streaming import (
+    DONE_MARKER,
+    KEEP_ALIVE_COMMENT,
+    format_chunk,
+)
+
+_cancelled_requests = metrics.counter(
+    "aidial_sdk.chat_completion.cancelled",
+    description="Number of chat completions cancelled "
+    "because the client has disconnected before the end of the stream",
+)
 
 
 class Response:
     request: Request
 
-    _queue: asyncio.Queue
+    _queue: Channel[Any]
+    _buffer: Optional[BufferConfig]
+    _memory_budget: Optional[MemoryBudget]
     _last_choice_index: int
     _last_usage_per_model_index: int
     _generation_started: bool
     _discarded_messages_generated: bool
     _usage_generated: bool
+    _usage_tokens: Optional[int]
+    _usage_per_model_tokens: int
     _response_id: str
     _model: Optional[str]
     _created: int
-
-    def __init__(self, request: Request):
-        self._queue = asyncio.Queue()
+    _coalescing: Optional[CoalescingConfig]
+    _pending_item: Optional[Any]
+    _keep_alive_interval: Optional[float]
+    _on_first_chunk: Optional[Callable[[], None]]
+    _first_chunk_received: bool
+    _user_task_finished: bool
+    _aborted: bool
+    _completed: bool
+    _accumulator: Optional[ResponseAccumulator]
+    _json_codec: JSONCodec
+    _serializer: ChunkSerializer
+    _stream_metrics: StreamMetrics
+
+    def __init__(
+        self,
+        request: Request,
+        coalescing: Optional[CoalescingConfig] = None,
+        buffer: Optional[BufferConfig] = None,
+        memory_budget: Optional[MemoryBudget] = None,
+        stream_metrics: Optional[StreamMetrics] = None,
+        keep_alive_interval: Optional[float] = None,
+        on_first_chunk: Optional[Callable[[], None]] = None,
+    ):
+        self._buffer = buffer
+        self._memory_budget = memory_budget
+        self._queue = _create_channel(buffer, memory_budget)
+        self._stream_metrics = stream_metrics or StreamMetrics(
+            request.deployment_id
+        )
+        self._coalescing = coalescing
+        self._pending_item = None
+        self._keep_alive_interval = (
+            keep_alive_interval if request.stream else None
+        )
+        self._on_first_chunk = on_first_chunk
+        self._first_chunk_received = False
+        self._user_task_finished = False
+        self._aborted = False
+        self._completed = False
+        self._accumulator = None
+        self._json_codec = get_json_codec()
+        self._serializer = ChunkSerializer(
+            self._add_default_fields, self._json_codec
+        )
         self._last_choice_index = 0
         self._last_usage_per_model_index = 0
         self._generation_started = False
         self._discarded_messages_generated = False
         self._usage_generated = False
+        self._usage_tokens = None
+        self._usage_per_model_tokens = 0
 
         self.request = request
         self._response_id = str(uuid4())
@@ -67,159 +145,437 @@ class Response:
         )
 
     async def _generate_stream(
-        self, first_chunk: BaseChunk
+        self, first_chunk: Optional[BaseChunk]
     ) -> AsyncGenerator[Any, None]:
-        chunk = first_chunk.to_dict()
-
-        # NOTE: add default fields only to the first chunk in a non-streaming mode and to all chunks in a streaming mode
-        self._add_default_fields(chunk)
+        """
+        Yields SSE events in a streaming mode and chunks
+        to be accumulated by _merge_stream in a non-streaming mode.
+        The stream starts with keep-alive comments
+        if the first chunk hasn't been generated yet.
+        """
+
+        disconnect_watcher = (
+            asyncio.create_task(self._watch_disconnect())
+            if self.request.stream
+            else None
+        )
 
-        if self.request.stream:
-            formatted_chunk = format_chunk(chunk)
-            yield formatted_chunk
-        else:
-            yield chunk
+        try:
+            if first_chunk is not None:
+                yield self._emit(first_chunk)
 
-        self._queue.task_done()
+                self._queue.task_done()
 
-        user_task_finished = False
+            last_end_choice_chunk: Optional[EndChoiceChunk] = None
+            usage_chunks: List[BaseChunk] = []
+            while True:
+                item = await self._next_item(self._keep_alive_interval)
+                if item is None:
+                    yield KEEP_ALIVE_COMMENT
+                    continue
 
-        last_end_choice_chunk = None
-        usage_chunk = {}
-        while True:
-            get_task = asyncio.create_task(self._queue.get())
-            done = (
-                await asyncio.wait(
-                    [get_task, self.user_task],
-                    return_when=asyncio.FIRST_COMPLETED,
-                )
-            )[0]
-            if self.user_task in done:
-                if not user_task_finished:
-                    end_chunk_generated = False
-                    try:
-                        self.user_task.result()
-                    except DIALException as e:
+                self._first_chunk()
+
+                merged_items = 0
+                if (
+                    self._coalescing is not None
+                    and self.request.stream
+                    and is_coalescable(item)
+                ):
+                    item, merged_items = await self._coalesce(item)
+
+                if isinstance(item, EndChoiceChunk):
+                    if item.choice_index == (self.request.n or 1) - 1:
+                        last_end_choice_chunk = item
+                        self._queue.task_done()
+                        continue
+
+                if isinstance(
+                    item,
+                    (UsageChunk, UsagePerModelChunk, DiscardedMessagesChunk),
+                ):
+                    usage_chunks.append(item)
+                elif isinstance(item, BaseChunk):
+                    yield self._emit(item, merged_items)
+
+                    if merged_items:
+                        self._queue.task_done(merged_items)
+                elif isinstance(item, EndChunk):
+                    if self._aborted:
+                        return
+                    if last_end_choice_chunk:
                         if self.request.stream:
-                            self._queue.put_nowait(EndChunk(e))
-                            end_chunk_generated = True
+                            self._accumulate_chunk(last_end_choice_chunk)
+                            for chunk in usage_chunks:
+                                self._accumulate_chunk(chunk)
+
+                            chunk = merge(
+                                last_end_choice_chunk.to_dict(),
+                                *(chunk.to_dict() for chunk in usage_chunks),
+                            )
+                            self._add_default_fields(chunk)
+                            yield self._emit_event(
+                                format_chunk(chunk, self._json_codec)
+                            )
                         else:
-                            raise e.to_fastapi_exception()
-                    except Exception as e:
-                        log_exception(RUNTIME_ERROR_MESSAGE)
-
-                        if self.request.stream:
-                            self._queue.put_nowait(EndChunk(e))
-                            end_chunk_generated = True
+                            yield self._emit(last_end_choice_chunk)
+                            for chunk in usage_chunks:
+                                yield self._emit(chunk)
+
+                    if item.exc:
+                        self._accumulator = None
+                        if isinstance(item.exc, DIALException):
+                            formatted_chunk = format_chunk(
+                                item.exc.json_error(), self._json_codec
+                            )
                         else:
-                            raise RuntimeServerError(
-                                RUNTIME_ERROR_MESSAGE
-                            ).to_fastapi_exception()
-
-                    if not end_chunk_generated:
-                        self._queue.put_nowait(EndChunk())
-                    user_task_finished = True
-            item = get_task.result() if get_task in done else await get_task
-
-            if isinstance(item, EndChoiceChunk):
-                if item.choice_index == (self.request.n or 1) - 1:
-                    last_end_choice_chunk = item.to_dict()
-                    self._queue.task_done()
-                    continue
+                            formatted_chunk = format_chunk(
+                                RuntimeServerError(
+                                    RUNTIME_ERROR_MESSAGE
+                                ).json_error(),
+                                self._json_codec,
+                            )
+                        yield self._emit_event(formatted_chunk)
+                    else:
+                        if self._last_choice_index != (self.request.n or 1):
+                            log_error("Not all choices were generated")
 
-            if isinstance(
-                item,
-                (UsageChunk, UsagePerModelChunk, DiscardedMessagesChunk),
-            ):
-                usage_chunk = merge(usage_chunk, item.to_dict())
-            elif isinstance(item, BaseChunk):
-                chunk = item.to_dict()
-
-                if self.request.stream:
-                    self._add_default_fields(chunk)
-                    formatted_chunk = format_chunk(chunk)
-                    yield formatted_chunk
-                else:
-                    yield chunk
-            elif isinstance(item, EndChunk):
-                if last_end_choice_chunk:
-                    chunk = merge(last_end_choice_chunk, usage_chunk)
+                            error = RuntimeServerError(RUNTIME_ERROR_MESSAGE)
+                            self._accumulator = None
 
-                    if self.request.stream:
-                        self._add_default_fields(chunk)
-                        formatted_chunk = format_chunk(chunk)
-                        yield formatted_chunk
-                    else:
-                        yield chunk
+                            if self.request.stream:
+                                yield self._emit_event(
+                                    format_chunk(
+                                        error.json_error(), self._json_codec
+                                    )
+                                )
+                            else:
+                                raise error.to_fastapi_exception()
 
-                if item.exc:
-                    if isinstance(item.exc, DIALException):
-                        formatted_chunk = format_chunk(item.exc.json_error())
-                    else:
-                        formatted_chunk = format_chunk(
-                            RuntimeServerError(
-                                RUNTIME_ERROR_MESSAGE
-                            ).json_error()
-                        )
-                    yield formatted_chunk
-                else:
-                    if self._last_choice_index != (self.request.n or 1):
-                        log_error("Not all choices were generated")
-
-                        error = RuntimeServerError(RUNTIME_ERROR_MESSAGE)
+                    if self.request.stream:
+                        self._completed = True
+                        yield self._emit_event(format_chunk(DONE_MARKER))
 
-                        if self.request.stream:
-                            formatted_chunk = format_chunk(error.json_error())
-                            yield formatted_chunk
-                        else:
-                            raise error.to_fastapi_exception()
+                    self._queue.task_done()
 
-                if self.request.stream:
-                    yield format_chunk(DONE_MARKER)
+                    return
 
                 self._queue.task_done()
+        finally:
+            if disconnect_watcher is not None:
+                disconnect_watcher.cancel()
+
+            self._close_stream()
+
+    def _close_stream(self) -> None:
+        """
+        Stops the generation if the stream is closed before its end,
+        e.g. when the client has disconnected, and drops the buffered chunks.
+        """
+
+        self._abort()
+        self._queue.clear()
+
+        if self.request.stream:
+            self._stream_metrics.finish()
 
-                return
+    def _emit(self, chunk: BaseChunk, merged_items: int = 0) -> Any:
+        content_chunks = (
+            merged_items + 1 if isinstance(chunk, ContentChunk) else 0
+        )
 
-            self._queue.task_done()
+        if self.request.stream:
+            self._accumulate_chunk(chunk)
+            event = self._serializer.format(chunk)
+            self._stream_metrics.chunk(len(event), content_chunks)
+            return event
+
+        self._stream_metrics.chunk(0, content_chunks)
+        return chunk
+
+    def _emit_event(self, event: str) -> str:
+        self._stream_metrics.chunk(len(event))
+        return event
+
+    def _accumulate(self) -> None:
+        """
+        Accumulates the chunks of the stream as they are emitted,
+        so that the complete response is available once the stream ends.
+        """
+        self._accumulator = ResponseAccumulator(self._add_default_fields)
+
+    def _accumulate_chunk(self, chunk: BaseChunk) -> None:
+        if self._accumulator is not None:
+            self._accumulator.add(chunk)
+
+    def _accumulated(self) -> Optional[Dict[str, Any]]:
+        """
+        The response accumulated from the stream
+        or None if the stream has failed or hasn't been completed.
+        """
+        if not self._completed or self._accumulator is None:
+            return None
+        return self._accumulator.finish()
+
+    async def _merge_stream(
+        self, first_chunk: Optional[BaseChunk]
+    ) -> Dict[str, Any]:
+        # NOTE: default fields are added only to the first chunk in a non-streaming mode
+        accumulator = ResponseAccumulator(self._add_default_fields)
+        async for chunk in self._generate_stream(first_chunk):
+            accumulator.add(chunk)
+        return accumulator.finish()
+
+    async def _next_item(
+        self, timeout: Optional[float] = None
+    ) -> Optional[Any]:
+        """
+        Returns the next item of the queue or None if the timeout expires.
+        Puts the EndChunk to the queue once the user task is finished.
+        """
+
+        if self._pending_item is not None:
+            item, self._pending_item = self._pending_item, None
+            return item
+
+        while True:
+            if not self._queue.empty():
+                return self._queue.get_nowait()
+
+            if self.user_task.done() and not self._user_task_finished:
+                self._user_task_finished = True
+                self._queue.put_nowait(self._end_chunk())
+                continue
+
+            if not await self._queue.wait(timeout):
+                return None
+
+    def _end_chunk(self) -> EndChunk:
+        try:
+            self.user_task.result()
+        except asyncio.CancelledError:
+            if not self._aborted:
+                raise
+        except DIALException as e:
+            if self.request.stream:
+                return EndChunk(e)
+            else:
+                raise e.to_fastapi_exception()
+        except Exception as e:
+            log_exception(RUNTIME_ERROR_MESSAGE)
+
+            if self.request.stream:
+                return EndChunk(e)
+            else:
+                raise RuntimeServerError(
+                    RUNTIME_ERROR_MESSAGE
+                ).to_fastapi_exception()
+
+        return EndChunk()
+
+    async def _watch_disconnect(self) -> None:
+        receive = self.request.original_request.receive
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The receive channel isn't available
+            return
+
+        self._abort()
+
+    def _abort(self) -> None:
+        """
+        Cancels the user task if it's still running,
+        so that the application could stop the generation.
+        """
+
+        if self._aborted:
+            return
+
+        self._aborted = True
+        if not self.user_task.done():
+            self.user_task.cancel()
+            _cancelled_requests.add(
+                attributes={"deployment": self.request.deployment_id}
+            )
+
+    async def _coalesce(self, item: BaseChunk) -> Tuple[BaseChunk, int]:
+        """
+        Merges the chunks following the given one into a single chunk
+        within the time and size budget of the coalescing config.
+        Returns the merged chunk and the number of the merged queue items.
+        """
+
+        assert self._coalescing is not None
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._coalescing.max_delay
+
+        parts = [get_text(item)]
+        size = utf8_len(parts[0])
+        merged_items = 0
+
+        while size < self._coalescing.max_bytes:
+            if self._pending_item is None and not self._queue.empty():
+                next_item = self._queue.get_nowait()
+            else:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                next_item = await self._next_item(timeout)
+                if next_item is None:
+                    break
+
+            if not can_coalesce(item, next_item):
+                self._pending_item = next_item
+                break
+
+            text = get_text(next_item)
+            parts.append(text)
+            size += utf8_len(text)
+            merged_items += 1
+
+        return coalesce(item, parts), merged_items
 
     async def _generator(
         self,
         producer: Callable[[Request, "Response"], Coroutine[Any, Any, Any]],
         request: Request,
-    ) -> BaseChunk:
+    ) -> Optional[BaseChunk]:
+        """
+        Starts the generation and waits for the first chunk, so that
+        the errors raised before it are reported with the HTTP status.
+        In a streaming mode with keep-alive the wait is bounded
+        by the keep-alive interval: returns None if the first chunk
+        hasn't been generated by then and the stream is started
+        with keep-alive comments instead.
+        """
+
         self.user_task = asyncio.create_task(producer(request, self))
+        self.user_task.add_done_callback(lambda _: self._queue.close())
 
-        get_task = asyncio.create_task(self._queue.get())
-        done = (
-            await asyncio.wait(
-                [get_task, self.user_task], return_when=asyncio.FIRST_COMPLETED
-            )
-        )[0]
-        if self.user_task in done:
+        if not await self._queue.wait(self._keep_alive_interval):
+            return None
+
+        if self.user_task.done():
             try:
                 self.user_task.result()
             except DIALException as e:
+                self._queue.clear()
                 raise e.to_fastapi_exception()
             except Exception:
+                self._queue.clear()
                 log_exception(RUNTIME_ERROR_MESSAGE)
                 raise RuntimeServerError(
                     RUNTIME_ERROR_MESSAGE
                 ).to_fastapi_exception()
 
-        return get_task.result() if get_task in done else await get_task
+            if self._queue.empty():
+                log_error("Not all choices were generated")
+                raise RuntimeServerError(
+                    RUNTIME_ERROR_MESSAGE
+                ).to_fastapi_exception()
+
+        self._first_chunk()
+        return self._queue.get_nowait()
+
+    def _first_chunk(self) -> None:
+        if self._first_chunk_received:
+            return
+        self._first_chunk_received = True
+
+        self._stream_metrics.first_chunk()
+        if self._on_first_chunk is not None:
+            self._on_first_chunk()
 
     def create_choice(self) -> Choice:
         self._generation_started = True
+        return self._create_choice(self._queue)
 
+    def _create_choice(self, queue: Channel[Any]) -> Choice:
         if self._last_choice_index >= (self.request.n or 1):
             raise runtime_error("Trying to generate more chunks than requested")
 
-        choice = Choice(self._queue, self._last_choice_index)
+        choice = Choice(queue, self._last_choice_index)
         self._last_choice_index += 1
 
         return choice
 
+    async def generate_choices(
+        self,
+        n: int,
+        fn: Callable[[Choice], Awaitable[None]],
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        """
+        Generates n choices running fn for each of them concurrently,
+        at most max_concurrency at a time.
+        The choice is opened before fn is called and closed after it returns.
+
+        The chunks of the choices are interleaved in the stream fairly:
+        a single chunk of each choice in turn, so that a choice generating
+        chunks in bursts doesn't delay the other choices.
+
+        If fn fails for any choice, the rest are cancelled
+        and the exception is propagated.
+        """
+
+        if max_concurrency is not None and max_concurrency < 1:
+            raise runtime_error("max_concurrency must be positive")
+
+        self._generation_started = True
+
+        if self._last_choice_index + n > (self.request.n or 1):
+            raise runtime_error("Trying to generate more chunks than requested")
+
+        ready = asyncio.Event()
+        queues = [
+            _create_channel(self._buffer, self._memory_budget, ready.set)
+            for _ in range(n)
+        ]
+        choices = [self._create_choice(queue) for queue in queues]
+        semaphore = asyncio.Semaphore(max_concurrency or n)
+
+        async def _produce(choice: Choice, queue: Channel[Any]) -> None:
+            try:
+                async with semaphore:
+                    with choice:
+                        await fn(choice)
+            finally:
+                queue.close()
+
+        producers = [
+            asyncio.create_task(_produce(choice, queue))
+            for choice, queue in zip(choices, queues)
+        ]
+        merger = asyncio.create_task(interleave(queues, self._queue, ready))
+
+        try:
+            try:
+                await asyncio.gather(*producers)
+            except Exception:
+                for producer in producers:
+                    producer.cancel()
+                await asyncio.gather(*producers, return_exceptions=True)
+
+                # Forward the chunks generated so far,
+                # including the closing chunks of the choices
+                await merger
+                raise
+
+            await merger
+        finally:
+            # On an early exit (e.g. cancellation) the chunks left
+            # in the choice queues would stay charged to the memory budget
+            merger.cancel()
+            for queue in queues:
+                queue.clear()
+
     def create_single_choice(self) -> Choice:
         if self._last_choice_index > 0:
             raise runtime_error(
@@ -251,6 +607,7 @@ class Response:
             )
         )
         self._last_usage_per_model_index += 1
+        self._usage_per_model_tokens += prompt_tokens + completion_tokens
 
     def set_discarded_messages(self, discarded_messages: List[int]):
         self._generation_started = True
@@ -276,8 +633,19 @@ class Response:
             )
 
         self._usage_generated = True
+        self._usage_tokens = prompt_tokens + completion_tokens
         self._queue.put_nowait(UsageChunk(prompt_tokens, completion_tokens))
 
+    def _total_tokens(self) -> int:
+        """
+        Total tokens reported by the usage of the response
+        or by the usage per model if the former isn't set.
+        """
+
+        if self._usage_tokens is not None:
+            return self._usage_tokens
+        return self._usage_per_model_tokens
+
     async def aflush(self):
         await self._queue.join()
 
@@ -304,3 +672,21 @@ class Response:
             )
 
         self._response_id = response_id
+
+
+def _create_channel(
+    buffer: Optional[BufferConfig],
+    memory_budget: Optional[MemoryBudget],
+    notify: Optional[Callable[[], None]] = None,
+) -> Channel[Any]:
+    if buffer is None:
+        buffer = BufferConfig()
+
+    sized = buffer.max_bytes is not None or memory_budget is not None
+    return Channel(
+        max_items=buffer.max_chunks,
+        max_bytes=buffer.max_bytes,
+        size=chunk_size if sized else None,
+        budget=memory_budget,
+        notify=notify,
+    )
@@ -1,4 +1,3 @@
-from asyncio import Queue
 from types import TracebackType
 from typing import Optional, Type, overload
 
@@ -11,14 +10,14 @@ from aidial_sdk.chat_completion.chunks import (
 )
 from aidial_sdk.chat_completion.enums import Status
 from aidial_sdk.chat_completion.request import Attachment
-from aidial_sdk.pydantic_v1 import ValidationError
-from aidial_sdk.utils._attachment import create_attachment
+from aidial_sdk.utils._attachment import create_response_attachment
+from aidial_sdk.utils._channel import Channel
 from aidial_sdk.utils._content_stream import ContentStream
 from aidial_sdk.utils.errors import runtime_error
 
 
 class Stage:
-    _queue: Queue
+    _queue: Channel
     _choice_index: int
     _stage_index: int
     _name: Optional[str]
@@ -28,7 +27,7 @@ class Stage:
 
     def __init__(
         self,
-        queue: Queue,
+        queue: Channel,
         choice_index: int,
         stage_index: int,
         name: Optional[str] = None,
@@ -60,14 +59,18 @@ class Stage:
         return False
 
     def append_content(self, content: str):
+        self._queue.put_nowait(self._content_chunk(content))
+
+    async def aappend_content(self, content: str):
+        await self._queue.put(self._content_chunk(content))
+
+    def _content_chunk(self, content: str) -> ContentStageChunk:
         if not self._opened:
             raise runtime_error("Trying to append content to an unopened stage")
         if self._closed:
             raise runtime_error("Trying to append content to a closed stage")
 
-        self._queue.put_nowait(
-            ContentStageChunk(self._choice_index, self._stage_index, content)
-        )
+        return ContentStageChunk(self._choice_index, self._stage_index, content)
 
     @property
     def content_stream(self) -> ContentStream:
@@ -98,24 +101,39 @@ class Stage:
     ) -> None: ...
 
     def add_attachment(self, *args, **kwargs) -> None:
+        self._queue.put_nowait(self._attachment_chunk(*args, **kwargs))
+        self._last_attachment_index += 1
+
+    @overload
+    async def aadd_attachment(self, attachment: Attachment) -> None: ...
+
+    @overload
+    async def aadd_attachment(
+        self,
+        type: Optional[str] = None,
+        title: Optional[str] = None,
+        data: Optional[str] = None,
+        url: Optional[str] = None,
+        reference_url: Optional[str] = None,
+        reference_type: Optional[str] = None,
+    ) -> None: ...
+
+    async def aadd_attachment(self, *args, **kwargs) -> None:
+        await self._queue.put(self._attachment_chunk(*args, **kwargs))
+        self._last_attachment_index += 1
+
+    def _attachment_chunk(self, *args, **kwargs) -> AttachmentStageChunk:
         if not self._opened:
             raise runtime_error("Trying to add attachment to an unopened stage")
         if self._closed:
             raise runtime_error("Trying to add attachment to a closed stage")
 
-        attachment_stage_chunk = None
-        try:
-            attachment_stage_chunk = AttachmentStageChunk(
-                choice_index=self._choice_index,
-                stage_index=self._stage_index,
-                attachment_index=self._last_attachment_index,
-                **create_attachment(*args, **kwargs).dict(),
-            )
-        except ValidationError as e:
-            raise runtime_error(e.errors()[0]["msg"])
-
-        self._queue.put_nowait(attachment_stage_chunk)
-        self._last_attachment_index += 1
+        return AttachmentStageChunk(
+            choice_index=self._choice_index,
+            stage_index=self._stage_index,
+            attachment_index=self._last_attachment_index,
+            **create_response_attachment(*args, **kwargs).dict(),
+        )
 
     def open(self):
         if self._opened:
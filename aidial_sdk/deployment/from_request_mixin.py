@@ -7,6 +7,7 @@ from pydantic import Field
 
 from aidial_sdk.exceptions import HTTPException as DIALException
 from aidial_sdk.pydantic_v1 import SecretStr, StrictStr, root_validator
+from aidial_sdk.utils.json import get_json_codec
 from aidial_sdk.utils.logging import log_debug
 from aidial_sdk.utils.pydantic import ExtraForbidModel
 
@@ -96,8 +97,8 @@ class FromRequestDeploymentMixin(FromRequestMixin):
 
 async def _get_request_body(request: fastapi.Request) -> Any:
     try:
-        body = await request.json()
-        log_debug(f"request: {body}")
+        body = get_json_codec().loads(await request.body())
+        log_debug("request: %s", body)
         return body
     except JSONDecodeError as e:
         raise DIALException(
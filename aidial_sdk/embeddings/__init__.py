@@ -1,8 +1,22 @@
 from aidial_sdk.embeddings.base import Embeddings
+from aidial_sdk.embeddings.batching import (
+    BatchConfig,
+    BatchInput,
+    BatchResult,
+    estimate_tokens,
+)
+from aidial_sdk.embeddings.cache import EmbeddingsCache
 from aidial_sdk.embeddings.request import (
     Attachment,
     EmbeddingsMultiModalInput,
     EmbeddingsRequestCustomFields,
     Request,
+    TokenArray,
 )
 from aidial_sdk.embeddings.response import Embedding, Response, Usage
+from aidial_sdk.embeddings.sub_batching import (
+    SubBatchConfig,
+    embed_in_sub_batches,
+    is_transient_error,
+)
+from aidial_sdk.embeddings.vector import Float32Vector
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
+from typing import List
 
+from aidial_sdk.embeddings.batching import BatchInput, BatchResult
 from aidial_sdk.embeddings.request import Request
 from aidial_sdk.embeddings.response import Response
 
@@ -8,3 +10,14 @@ class Embeddings(ABC):
     @abstractmethod
     async def embeddings(self, request: Request) -> Response:
         """Implement embeddings logic"""
+
+    async def embeddings_batch(
+        self, request: Request, inputs: List[BatchInput]
+    ) -> BatchResult:
+        """
+        Implement embeddings logic for a batch of the inputs
+        of the concurrent requests (see DIALApp.add_embeddings(batch=...)).
+        The request is the first request of the batch and carries
+        the parameters shared by all the requests of the batch.
+        """
+        raise NotImplementedError()
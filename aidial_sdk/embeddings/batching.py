@@ -0,0 +1,292 @@
+"""
+Micro-batching of the concurrent embeddings requests.
+
+The inputs of the requests arriving within a short window are gathered
+into a single call of Embeddings.embeddings_batch and the results are
+scattered back to the requests.
+"""
+
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Union
+
+from aidial_sdk.embeddings.request import Request, TokenArray
+from aidial_sdk.embeddings.response import Embedding, Response, Usage
+from aidial_sdk.embeddings.vector import EmbeddingVector
+from aidial_sdk.pydantic_v1 import BaseModel, PositiveFloat, PositiveInt
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils._single_flight import client_scope
+from aidial_sdk.utils.logging import deployment_id
+from aidial_sdk.utils.pydantic import ExtraForbidModel
+
+_batch_size = metrics.histogram(
+    "aidial_sdk.embeddings.batch_size",
+    description="Number of inputs in a batch of the embeddings requests",
+)
+_batch_requests = metrics.histogram(
+    "aidial_sdk.embeddings.batch_requests",
+    description="Number of requests in a batch of the embeddings requests",
+)
+
+# A text or token ids: a list or TokenArray
+BatchInput = Union[str, List[int], TokenArray]
+
+
+class BatchConfig(BaseModel):
+    """
+    Bounds of a batch of the inputs of the concurrent embeddings requests.
+
+    A batch is sent once it reaches any of the bounds or once
+    the oldest request in it has waited for max_wait seconds.
+    The inputs of a single request are never split between batches,
+    so a request exceeding the bounds is sent in a batch of its own.
+    """
+
+    """Maximum number of inputs in a batch"""
+    max_batch_size: PositiveInt = 64
+
+    """Maximum number of tokens in a batch. The length of a token array
+    input is exact, the tokens of a text input are estimated
+    as its length in UTF-8 bytes divided by 4."""
+    max_batch_tokens: Optional[PositiveInt] = None
+
+    """Maximum time (in seconds) a request waits for the other requests
+    to join its batch"""
+    max_wait: PositiveFloat = 0.005
+
+
+class BatchResult(ExtraForbidModel):
+    """Result of Embeddings.embeddings_batch"""
+
+    """Embeddings of the inputs in the order of the inputs"""
+    embeddings: List[EmbeddingVector]
+
+    """Number of the prompt tokens of every input"""
+    prompt_tokens: List[int]
+
+    model: str
+
+
+class _Waiter:
+    __slots__ = ("future", "start", "count")
+
+    future: "asyncio.Future[Response]"
+    start: int
+    count: int
+
+    def __init__(
+        self, future: "asyncio.Future[Response]", start: int, count: int
+    ) -> None:
+        self.future = future
+        self.start = start
+        self.count = count
+
+
+class _Batch:
+    __slots__ = ("request", "inputs", "tokens", "waiters", "timer")
+
+    request: Request
+    inputs: List[BatchInput]
+    tokens: int
+    waiters: List[_Waiter]
+    timer: Optional[asyncio.TimerHandle]
+
+    def __init__(self, request: Request) -> None:
+        self.request = request
+        self.inputs = []
+        self.tokens = 0
+        self.waiters = []
+        self.timer = None
+
+
+BatchFunction = Callable[[Request, List[BatchInput]], Awaitable[BatchResult]]
+
+
+class EmbeddingsBatcher:
+    """
+    Gathers the inputs of the concurrent requests into batches.
+
+    Only the requests of the same client (the same credentials
+    and forwarded headers) with the same parameters (model, encoding_format, dimensions and custom_fields)
+    share a batch. The first request of the batch is passed
+    to the batch function as the representative of them.
+    The requests with custom_input aren't batched.
+    """
+
+    _config: BatchConfig
+    _fn: BatchFunction
+    _pending: Dict[str, _Batch]
+    _tasks: Set["asyncio.Task[None]"]
+
+    def __init__(self, config: BatchConfig, fn: BatchFunction):
+        self._config = config
+        self._fn = fn
+        self._pending = {}
+        self._tasks = set()
+
+    @staticmethod
+    def is_batchable(request: Request) -> bool:
+        return request.custom_input is None
+
+    async def embeddings(self, request: Request) -> Response:
+        inputs = batch_inputs(request)
+        tokens = sum(estimate_tokens(value) for value in inputs)
+        key = _batch_key(request)
+        loop = asyncio.get_running_loop()
+
+        batch = self._pending.get(key)
+        if batch is not None and self._exceeds(batch, len(inputs), tokens):
+            self._flush(key, batch)
+            batch = None
+
+        if batch is None:
+            batch = self._pending[key] = _Batch(request)
+            batch.timer = loop.call_later(
+                self._config.max_wait, self._flush, key, batch
+            )
+
+        future: "asyncio.Future[Response]" = loop.create_future()
+        batch.waiters.append(_Waiter(future, len(batch.inputs), len(inputs)))
+        batch.inputs.extend(inputs)
+        batch.tokens += tokens
+
+        if self._is_full(batch):
+            self._flush(key, batch)
+
+        return await future
+
+    def _exceeds(self, batch: _Batch, size: int, tokens: int) -> bool:
+        max_tokens = self._config.max_batch_tokens
+        return len(batch.inputs) + size > self._config.max_batch_size or (
+            max_tokens is not None and batch.tokens + tokens > max_tokens
+        )
+
+    def _is_full(self, batch: _Batch) -> bool:
+        max_tokens = self._config.max_batch_tokens
+        return len(batch.inputs) >= self._config.max_batch_size or (
+            max_tokens is not None and batch.tokens >= max_tokens
+        )
+
+    def _flush(self, key: str, batch: _Batch) -> None:
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+
+        if batch.timer is not None:
+            batch.timer.cancel()
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _Batch) -> None:
+        attributes = {"deployment": deployment_id.get() or ""}
+        _batch_size.record(len(batch.inputs), attributes)
+        _batch_requests.record(len(batch.waiters), attributes)
+
+        try:
+            result = await self._fn(batch.request, batch.inputs)
+            if len(result.embeddings) != len(batch.inputs) or len(
+                result.prompt_tokens
+            ) != len(batch.inputs):
+                raise ValueError(
+                    f"The batch of {len(batch.inputs)} inputs got "
+                    f"{len(result.embeddings)} embeddings and "
+                    f"{len(result.prompt_tokens)} token counts"
+                )
+        except Exception as e:
+            for waiter in batch.waiters:
+                if not waiter.future.done():
+                    waiter.future.set_exception(e)
+            return
+
+        for waiter in batch.waiters:
+            if not waiter.future.done():
+                waiter.future.set_result(_scatter(result, waiter))
+
+
+def batch_inputs(request: Request) -> List[BatchInput]:
+    """The inputs of the request as a list of texts and token arrays"""
+
+    value = request.input
+    if isinstance(value, (str, TokenArray)):
+        return [value]
+    if value and isinstance(value[0], int):
+        return [value]  # type: ignore
+    return list(value)  # type: ignore
+
+
+def select_inputs(request: Request, indices: List[int]) -> Request:
+    """
+    The request of the given inputs of the request,
+    where the inputs of custom_input follow the inputs of input.
+    """
+
+    inputs = batch_inputs(request)
+    custom_input = request.custom_input or []
+
+    return request.copy(
+        update={
+            "input": [inputs[i] for i in indices if i < len(inputs)],
+            "custom_input": (
+                [
+                    custom_input[i - len(inputs)]
+                    for i in indices
+                    if i >= len(inputs)
+                ]
+                if request.custom_input is not None
+                else None
+            ),
+        }
+    )
+
+
+def _scatter(result: BatchResult, waiter: _Waiter) -> Response:
+    end = waiter.start + waiter.count
+    prompt_tokens = sum(result.prompt_tokens[waiter.start : end])
+
+    # The result is already validated
+    return Response.construct(
+        data=[
+            Embedding.construct(
+                embedding=embedding, index=index, object="embedding"
+            )
+            for index, embedding in enumerate(
+                result.embeddings[waiter.start : end]
+            )
+        ],
+        model=result.model,
+        object="list",
+        usage=Usage.construct(
+            prompt_tokens=prompt_tokens, total_tokens=prompt_tokens
+        ),
+    )
+
+
+def estimate_tokens(value: BatchInput) -> int:
+    """
+    Number of tokens of an input: the length of token ids is exact,
+    the tokens of a text are estimated as its length in UTF-8 bytes
+    divided by 4.
+    """
+
+    if isinstance(value, str):
+        return len(value.encode()) // 4 + 1
+    return len(value)
+
+
+def _batch_key(request: Request) -> str:
+    return json.dumps(
+        [
+            *client_scope(request),
+            request.dict(
+                include={
+                    "model",
+                    "encoding_format",
+                    "dimensions",
+                    "custom_fields",
+                }
+            ),
+        ],
+        sort_keys=True,
+    )
@@ -0,0 +1,428 @@
+"""
+Content-addressed cache of the embeddings of the individual inputs.
+
+Every input of a request (a text, a token array or a custom_input item)
+is looked up by the hash of its content and the parameters affecting
+its embedding. Only the inputs missing in the cache are sent
+to the implementation.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from aidial_sdk.embeddings.batching import batch_inputs, select_inputs
+from aidial_sdk.embeddings.request import Request, TokenArray
+from aidial_sdk.embeddings.response import Embedding, Response, Usage
+from aidial_sdk.embeddings.vector import EmbeddingVector, Float32Vector
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.logging import log_exception
+
+T = TypeVar("T")
+
+_hits = metrics.counter(
+    "aidial_sdk.embeddings.cache.hits",
+    description="Number of the embeddings inputs served from the cache",
+)
+_misses = metrics.counter(
+    "aidial_sdk.embeddings.cache.misses",
+    description="Number of the embeddings inputs not found in the cache",
+)
+_evictions = metrics.counter(
+    "aidial_sdk.embeddings.cache.evictions",
+    description="Number of the vectors evicted from the cache",
+)
+
+# The vectors file grows in steps to reduce the number of remappings
+_GROWTH_STEP = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    key BLOB PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    accessed INTEGER NOT NULL,
+    model TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vectors_accessed ON vectors (accessed);
+CREATE TABLE IF NOT EXISTS free (
+    offset INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS free_size ON free (size);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('clock', 0), ('end', 0), ('total', 0);
+"""
+
+
+class EmbeddingsCache:
+    """
+    Cache of float32 vectors in a directory shared by the workers
+    of the host, which survives restarts.
+
+    The vectors are stored in a memory-mapped file, so the workers share
+    the pages of the file instead of keeping copies of the vectors.
+    The index (the location and the last access time of every vector)
+    is an SQLite database, which serializes the updates of the workers.
+    The least recently used vectors are evicted once the total size
+    of the vectors exceeds max_bytes and their space is reused.
+    Every vector is stored along with the model reported
+    by the implementation for it.
+
+    The files are accessed from a dedicated thread,
+    so that the disk I/O doesn't block the event loop.
+    """
+
+    max_bytes: int
+
+    _index: sqlite3.Connection
+    _fd: int
+    _map: Optional[mmap.mmap]
+    _executor: ThreadPoolExecutor
+
+    def __init__(self, path: str, max_bytes: int):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+
+        self.max_bytes = max_bytes
+
+        os.makedirs(path, exist_ok=True)
+        self._index = sqlite3.connect(
+            os.path.join(path, "index.sqlite"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._index.executescript(_SCHEMA)
+        self._fd = os.open(
+            os.path.join(path, "vectors.f32"), os.O_RDWR | os.O_CREAT, 0o644
+        )
+        self._map = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="aidial_sdk_embeddings_cache"
+        )
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached vectors"""
+        return self._meta("total")
+
+    async def get(
+        self, keys: List[bytes]
+    ) -> List[Optional[Tuple[Float32Vector, str]]]:
+        """The vectors of the keys along with their models"""
+        return await self._run(self._get, keys)
+
+    async def set(
+        self, items: List[Tuple[bytes, Float32Vector]], model: str
+    ) -> None:
+        await self._run(
+            self._set, [(key, vector.tobytes()) for key, vector in items], model
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        self._index.close()
+        if self._map is not None:
+            self._map.close()
+        os.close(self._fd)
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self._index.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._index.execute("ROLLBACK")
+            raise
+        self._index.execute("COMMIT")
+
+    def _meta(self, name: str) -> int:
+        return self._index.execute(
+            "SELECT value FROM meta WHERE name = ?", (name,)
+        ).fetchone()[0]
+
+    def _set_meta(self, name: str, value: int) -> None:
+        self._index.execute(
+            "UPDATE meta SET value = ? WHERE name = ?", (value, name)
+        )
+
+    def _tick(self) -> int:
+        clock = self._meta("clock") + 1
+        self._set_meta("clock", clock)
+        return clock
+
+    def _mapping(self, end: int) -> mmap.mmap:
+        """Mapping of the vectors file covering the given offset"""
+
+        if self._map is None or len(self._map) < end:
+            # The file may have been extended by another worker
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+        return self._map
+
+    def _get(
+        self, keys: List[bytes]
+    ) -> List[Optional[Tuple[Float32Vector, str]]]:
+        vectors: List[Optional[Tuple[Float32Vector, str]]] = []
+        with self._transaction():
+            clock = self._tick()
+            for key in keys:
+                row = self._index.execute(
+                    "SELECT offset, size, model FROM vectors WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is None:
+                    vectors.append(None)
+                    continue
+
+                offset, size, model = row
+                # The vector is copied rather than wrapped: any worker
+                # may evict it and reuse its space while the response
+                # is encoded, and a view exported from the mapping
+                # would prevent remapping the file once it grows
+                with memoryview(self._mapping(offset + size))[
+                    offset : offset + size
+                ] as data:
+                    vectors.append((Float32Vector.frombytes(data), model))
+                self._index.execute(
+                    "UPDATE vectors SET accessed = ? WHERE key = ?",
+                    (clock, key),
+                )
+        return vectors
+
+    def _set(self, items: List[Tuple[bytes, bytes]], model: str) -> None:
+        with self._transaction():
+            clock = self._tick()
+            total = self._meta("total")
+
+            for key, data in items:
+                size = len(data)
+                if size == 0 or size > self.max_bytes:
+                    continue
+
+                exists = self._index.execute(
+                    "UPDATE vectors SET accessed = ? WHERE key = ?",
+                    (clock, key),
+                ).rowcount
+                if exists:
+                    continue
+
+                while total + size > self.max_bytes:
+                    evicted = self._evict()
+                    if evicted is None:
+                        # The index is out of sync with the total
+                        total = 0
+                        break
+                    total -= evicted
+
+                offset = self._allocate(size)
+                self._mapping(offset + size)[offset : offset + size] = data
+                self._index.execute(
+                    "INSERT INTO vectors VALUES (?, ?, ?, ?, ?)",
+                    (key, offset, size, clock, model),
+                )
+                total += size
+
+            self._set_meta("total", total)
+
+    def _evict(self) -> Optional[int]:
+        """Evicts the least recently used vector returning its size"""
+
+        row = self._index.execute(
+            "SELECT key, offset, size FROM vectors ORDER BY accessed LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+
+        key, offset, size = row
+        self._index.execute("DELETE FROM vectors WHERE key = ?", (key,))
+        self._index.execute("INSERT INTO free VALUES (?, ?)", (offset, size))
+        _evictions.add()
+        return size
+
+    def _allocate(self, size: int) -> int:
+        """Offset of a free space of the given size in the vectors file"""
+
+        row = self._index.execute(
+            "SELECT offset, size FROM free WHERE size >= ?"
+            " ORDER BY size LIMIT 1",
+            (size,),
+        ).fetchone()
+        if row is not None:
+            offset, free_size = row
+            self._index.execute("DELETE FROM free WHERE offset = ?", (offset,))
+            if free_size > size:
+                self._index.execute(
+                    "INSERT INTO free VALUES (?, ?)",
+                    (offset + size, free_size - size),
+                )
+            return offset
+
+        offset = self._meta("end")
+        end = offset + size
+        if os.fstat(self._fd).st_size < end:
+            os.ftruncate(self._fd, -(-end // _GROWTH_STEP) * _GROWTH_STEP)
+        self._set_meta("end", end)
+        return offset
+
+
+def input_keys(deployment_id: str, request: Request) -> List[bytes]:
+    """
+    Keys of the inputs of the request:
+    the inputs of input followed by the ones of custom_input.
+    """
+
+    custom_fields = request.custom_fields
+    parameters = [
+        deployment_id,
+        request.model,
+        request.dimensions,
+        custom_fields.type if custom_fields is not None else None,
+        custom_fields.instruction if custom_fields is not None else None,
+    ]
+
+    return [
+        hashlib.sha256(
+            json.dumps(
+                [*parameters, value], sort_keys=True, separators=(",", ":")
+            ).encode()
+        ).digest()
+        for value in _input_values(request)
+    ]
+
+
+def _input_values(request: Request) -> List[Any]:
+    values: List[Any] = [
+        value.tolist() if isinstance(value, TokenArray) else value
+        for value in batch_inputs(request)
+    ]
+    for value in request.custom_input or []:
+        if isinstance(value, list):
+            values.append(
+                [
+                    (
+                        item
+                        if isinstance(item, str)
+                        else item.dict(exclude_none=True)
+                    )
+                    for item in value
+                ]
+            )
+        elif isinstance(value, str):
+            values.append(value)
+        else:
+            values.append(value.dict(exclude_none=True))
+    return values
+
+
+def _to_vector(embedding: EmbeddingVector) -> Float32Vector:
+    if isinstance(embedding, Float32Vector):
+        return embedding
+    if isinstance(embedding, str):
+        return Float32Vector.frombytes(base64.b64decode(embedding))
+    return Float32Vector(array("f", embedding))
+
+
+async def cached_embeddings(
+    cache: EmbeddingsCache,
+    deployment_id: str,
+    request: Request,
+    embeddings: Callable[[Request], Awaitable[Response]],
+) -> Response:
+    """
+    Serves the inputs of the request from the cache
+    and calls embeddings for the missing ones.
+
+    The usage of the response covers only the missing inputs.
+    If all the inputs are found in the cache, the response reports
+    the model the embeddings were computed by and zero usage.
+    It's assumed that the embeddings of custom_input follow
+    the embeddings of input in the response of the implementation.
+    """
+
+    keys = input_keys(deployment_id, request)
+    try:
+        vectors = await cache.get(keys)
+    except Exception:
+        log_exception("Failed to read the embeddings cache")
+        return await embeddings(request)
+
+    attributes = {"deployment": deployment_id}
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    _hits.add(len(keys) - len(missing), attributes)
+    _misses.add(len(missing), attributes)
+
+    result: List[Optional[EmbeddingVector]] = [
+        hit[0] if hit is not None else None for hit in vectors
+    ]
+    model = next(
+        (hit[1] for hit in vectors if hit is not None),
+        request.model or deployment_id,
+    )
+    usage = Usage.construct(prompt_tokens=0, total_tokens=0)
+
+    if missing:
+        response = await embeddings(
+            request
+            if len(missing) == len(keys)
+            else select_inputs(request, missing)
+        )
+        if len(response.data) != len(missing):
+            raise ValueError(
+                f"The request of {len(missing)} inputs "
+                f"got {len(response.data)} embeddings"
+            )
+
+        computed = sorted(response.data, key=lambda item: item.index)
+        for i, item in zip(missing, computed):
+            result[i] = item.embedding
+        model, usage = response.model, response.usage
+
+        try:
+            await cache.set(
+                [
+                    (keys[i], _to_vector(item.embedding))
+                    for i, item in zip(missing, computed)
+                ],
+                model,
+            )
+        except Exception:
+            log_exception("Failed to write the embeddings cache")
+
+    return Response.construct(
+        data=[
+            Embedding.construct(
+                embedding=embedding, index=index, object="embedding"
+            )
+            for index, embedding in enumerate(result)
+        ],
+        model=model,
+        object="list",
+        usage=usage,
+    )
@@ -1,20 +1,123 @@
-from typing import List, Literal, Optional, Union
+from array import array
+from typing import Any, Callable, Iterator, List, Literal, Optional, Union
 
 from aidial_sdk.chat_completion.request import Attachment
 from aidial_sdk.deployment.from_request_mixin import FromRequestDeploymentMixin
-from aidial_sdk.pydantic_v1 import StrictInt, StrictStr
+from aidial_sdk.pydantic_v1 import (
+    ErrorWrapper,
+    IntegerError,
+    ListError,
+    NoneIsNotAllowedError,
+    StrictInt,
+    StrictStr,
+    ValidationError,
+)
 from aidial_sdk.utils.pydantic import ExtraForbidModel
 
 
+class TokenArray(array):
+    """
+    Token ids of an input as a compact array of int32 values.
+
+    The array supports the buffer protocol, so it can be passed to a model
+    without copying, e.g. with numpy.frombuffer(tokens, dtype=numpy.int32).
+
+    The token ids are parsed into TokenArray instead of lists
+    for the deployments opting in with add_embeddings(token_arrays=True),
+    see TokenArrayRequest.
+    """
+
+    def __new__(cls, values: Any = ()) -> "TokenArray":
+        return super().__new__(cls, "i", values)  # type: ignore
+
+
+class _TokenIds:
+    """
+    Token ids of an input validated in bulk: the types of all the ids
+    are checked at once instead of validating the ids one by one.
+    The errors are the same as the ones of List[StrictInt].
+    """
+
+    @classmethod
+    def __get_validators__(cls) -> Iterator[Callable[[Any], Any]]:
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value: Any) -> List[int]:
+        if isinstance(value, TokenArray):
+            return value.tolist()
+
+        _check_token_ids(value)
+        return value
+
+
+class _TokenArray(_TokenIds):
+    """Token ids validated in bulk and parsed into TokenArray"""
+
+    @classmethod
+    def validate(cls, value: Any) -> TokenArray:  # type: ignore
+        if isinstance(value, TokenArray):
+            return value
+
+        _check_token_ids(value)
+        try:
+            return TokenArray(value)
+        except OverflowError:
+            raise ValidationError(
+                [
+                    ErrorWrapper(
+                        ValueError("token id is out of the int32 range"),
+                        loc=index,
+                    )
+                    for index, token_id in enumerate(value)
+                    if not _INT32_MIN <= token_id <= _INT32_MAX
+                ],
+                cls,  # type: ignore
+            )
+
+
+_INT32_MIN = -(2**31)
+_INT32_MAX = 2**31 - 1
+
+
+def _check_token_ids(value: Any) -> None:
+    if not isinstance(value, list):
+        raise ListError()
+
+    types = set(map(type, value))
+    if types <= {int} or all(
+        issubclass(t, int) and not issubclass(t, bool) for t in types
+    ):
+        return
+
+    raise ValidationError(
+        [
+            ErrorWrapper(
+                (
+                    NoneIsNotAllowedError()
+                    if token_id is None
+                    else IntegerError()
+                ),
+                loc=index,
+            )
+            for index, token_id in enumerate(value)
+            if not isinstance(token_id, int) or isinstance(token_id, bool)
+        ],
+        _TokenIds,  # type: ignore
+    )
+
+
 class AzureEmbeddingsRequest(ExtraForbidModel):
     model: Optional[StrictStr] = None
-    input: Union[
-        StrictStr, List[StrictStr], List[StrictInt], List[List[StrictInt]]
-    ]
+    input: Union[StrictStr, List[StrictStr], _TokenIds, List[_TokenIds]]
+
     encoding_format: Literal["float", "base64"] = "float"
     dimensions: Optional[StrictInt] = None
     user: Optional[StrictStr] = None
 
+    class Config:
+        json_encoders = {TokenArray: TokenArray.tolist}
+
 
 class EmbeddingsRequestCustomFields(ExtraForbidModel):
     type: Optional[StrictStr] = None
@@ -33,3 +136,9 @@ class EmbeddingsRequest(AzureEmbeddingsRequest):
 
 class Request(EmbeddingsRequest, FromRequestDeploymentMixin):
     pass
+
+
+class TokenArrayRequest(Request):
+    """Request with the token ids parsed into TokenArray"""
+
+    input: Union[StrictStr, List[StrictStr], _TokenArray, List[_TokenArray]]
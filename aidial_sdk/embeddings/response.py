@@ -1,13 +1,22 @@
-from typing import List, Literal, Union
-
+from typing import List, Literal
+
+from aidial_sdk.embeddings.vector import (
+    EmbeddingVector,
+    Float32Vector,
+    encode_embedding,
+)
+from aidial_sdk.utils.json import JSONCodec
 from aidial_sdk.utils.pydantic import ExtraForbidModel
 
 
 class Embedding(ExtraForbidModel):
-    embedding: Union[str, List[float]]
+    embedding: EmbeddingVector
     index: int
     object: Literal["embedding"] = "embedding"
 
+    class Config:
+        json_encoders = {Float32Vector: Float32Vector.tolist}
+
 
 class Usage(ExtraForbidModel):
     prompt_tokens: int
@@ -22,3 +31,28 @@ class EmbeddingResponse(ExtraForbidModel):
 
 
 Response = EmbeddingResponse
+
+
+def encode_response(
+    response: Response, encoding_format: str, codec: JSONCodec
+) -> bytes:
+    """
+    JSON of the response with the embeddings encoded in bulk
+    (see Float32Vector) and the rest encoded by the codec.
+    """
+
+    data = b",".join(
+        b'{"embedding":'
+        + encode_embedding(item.embedding, encoding_format, codec)
+        + b',"index":%d,"object":"embedding"}' % item.index
+        for item in response.data
+    )
+    return (
+        b'{"data":['
+        + data
+        + b'],"model":'
+        + codec.encode(response.model)
+        + b',"object":"list","usage":'
+        + codec.encode(response.usage.dict())
+        + b"}"
+    )
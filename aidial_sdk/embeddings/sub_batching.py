@@ -0,0 +1,308 @@
+"""
+Splitting of an embeddings request into the batches accepted
+by the upstream provider.
+
+The helper is meant for the Embeddings implementations calling
+a provider API limiting the number of inputs and tokens per call.
+"""
+
+import asyncio
+import random
+import sys
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+)
+
+import aiohttp
+import httpx
+
+from aidial_sdk.embeddings.batching import (
+    batch_inputs,
+    estimate_tokens,
+    select_inputs,
+)
+from aidial_sdk.embeddings.request import Request
+from aidial_sdk.embeddings.response import Embedding, Response, Usage
+from aidial_sdk.exceptions import HTTPException as DIALException
+from aidial_sdk.pydantic_v1 import (
+    BaseModel,
+    NonNegativeInt,
+    PositiveFloat,
+    PositiveInt,
+)
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.logging import deployment_id, log_warning
+
+_upstream_retries = metrics.counter(
+    "aidial_sdk.embeddings.upstream_retries",
+    description="Number of the retried upstream calls of the embeddings sub-batches",
+)
+
+# Status codes of the failures which may succeed on retry
+_TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Timeouts and connection errors of the upstream clients
+_TRANSIENT_ERRORS: Tuple[Type[Exception], ...] = (
+    asyncio.TimeoutError,
+    TimeoutError,
+    ConnectionError,
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    httpx.RemoteProtocolError,
+    aiohttp.ClientConnectionError,
+)
+
+
+class SubBatchConfig(BaseModel):
+    """
+    Limits of the upstream calls of embed_in_sub_batches.
+    """
+
+    """Maximum number of inputs per upstream call"""
+    max_inputs: PositiveInt = 2048
+
+    """Maximum number of tokens per upstream call. The length of a token
+    array input is exact, the tokens of a text input are estimated
+    as its length in UTF-8 bytes divided by 4."""
+    max_tokens: Optional[PositiveInt] = None
+
+    """Maximum number of concurrent upstream calls of a request"""
+    max_concurrency: PositiveInt = 4
+
+    """Maximum number of retries of a failed upstream call"""
+    max_retries: NonNegativeInt = 2
+
+    """Delay (in seconds) before the first retry.
+    It's doubled on every next retry and randomized by a half.
+    A longer Retry-After of the failed response takes precedence."""
+    retry_delay: PositiveFloat = 0.5
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Default check of the failures worth retrying:
+    1. the timeouts and the connection errors: the builtin ones and
+       the ones of httpx, aiohttp and openai (if used by the application),
+    2. the HTTP errors with the status codes of the overloaded
+       or temporarily unavailable upstream: DIAL errors,
+       httpx.HTTPStatusError, aiohttp.ClientResponseError
+       and openai.APIStatusError.
+
+    The upstream clients raising other errors require a custom check
+    passed to embed_in_sub_batches.
+    """
+
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return True
+
+    openai = _openai()
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True
+
+    return _status_code(error) in _TRANSIENT_STATUS_CODES
+
+
+def _openai() -> Any:
+    """
+    The openai module if it has been imported by the application.
+    An openai error can't be raised otherwise, so the module
+    isn't imported here.
+    """
+    return sys.modules.get("openai")
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    if isinstance(error, DIALException):
+        return error.status_code
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status
+
+    openai = _openai()
+    if openai is not None and isinstance(error, openai.APIStatusError):
+        return error.status_code
+    return None
+
+
+def _headers(error: Exception) -> Optional[Mapping[str, str]]:
+    if isinstance(error, DIALException):
+        return error.headers
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.headers
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.headers
+
+    openai = _openai()
+    if openai is not None and isinstance(error, openai.APIStatusError):
+        return error.response.headers
+    return None
+
+
+async def embed_in_sub_batches(
+    request: Request,
+    embeddings: Callable[[Request], Awaitable[Response]],
+    config: SubBatchConfig = SubBatchConfig(),
+    is_transient: Callable[[Exception], bool] = is_transient_error,
+) -> Response:
+    """
+    Splits the inputs of the request (input followed by custom_input)
+    into the batches within the limits of the config, calls embeddings
+    for the batches concurrently retrying the transient failures
+    and reassembles the response in the order of the inputs
+    with the usage summed over the batches.
+
+    The failures are retried if is_transient returns True for them,
+    see is_transient_error for the errors retried by default.
+    If any batch fails, the other batches are cancelled
+    and the error is raised.
+    """
+
+    batches = _split(request, config)
+    if len(batches) == 1:
+        return await _call(request, embeddings, config, is_transient)
+
+    semaphore = asyncio.Semaphore(config.max_concurrency)
+
+    async def _run(indices: List[int]) -> Response:
+        async with semaphore:
+            try:
+                return await _call(
+                    select_inputs(request, indices),
+                    embeddings,
+                    config,
+                    is_transient,
+                )
+            except Exception:
+                # The other batches are cancelled before the semaphore
+                # is released, so the ones waiting for their turn
+                # aren't started
+                current = asyncio.current_task()
+                for task in tasks:
+                    if task is not current:
+                        task.cancel()
+                raise
+
+    tasks = [asyncio.ensure_future(_run(indices)) for indices in batches]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()  # type: ignore
+
+    responses = [task.result() for task in tasks]
+
+    data: List[Embedding] = []
+    prompt_tokens = total_tokens = 0
+    for indices, response in zip(batches, responses):
+        if len(response.data) != len(indices):
+            raise ValueError(
+                f"The batch of {len(indices)} inputs "
+                f"got {len(response.data)} embeddings"
+            )
+
+        for item in sorted(response.data, key=lambda item: item.index):
+            data.append(
+                Embedding.construct(
+                    embedding=item.embedding,
+                    index=len(data),
+                    object="embedding",
+                )
+            )
+        prompt_tokens += response.usage.prompt_tokens
+        total_tokens += response.usage.total_tokens
+
+    return Response.construct(
+        data=data,
+        model=responses[0].model,
+        object="list",
+        usage=Usage.construct(
+            prompt_tokens=prompt_tokens, total_tokens=total_tokens
+        ),
+    )
+
+
+def _split(request: Request, config: SubBatchConfig) -> List[List[int]]:
+    """Indices of the inputs of every batch"""
+
+    sizes = [estimate_tokens(value) for value in batch_inputs(request)]
+    for value in request.custom_input or []:
+        items = value if isinstance(value, list) else [value]
+        sizes.append(
+            sum(
+                estimate_tokens(item) for item in items if isinstance(item, str)
+            )
+        )
+
+    batches: List[List[int]] = [[]]
+    tokens = 0
+    for index, size in enumerate(sizes):
+        batch = batches[-1]
+        if batch and (
+            len(batch) >= config.max_inputs
+            or (
+                config.max_tokens is not None
+                and tokens + size > config.max_tokens
+            )
+        ):
+            batch = []
+            batches.append(batch)
+            tokens = 0
+
+        batch.append(index)
+        tokens += size
+
+    return batches
+
+
+async def _call(
+    request: Request,
+    embeddings: Callable[[Request], Awaitable[Response]],
+    config: SubBatchConfig,
+    is_transient: Callable[[Exception], bool],
+) -> Response:
+    retry = 0
+    while True:
+        try:
+            return await embeddings(request)
+        except Exception as e:
+            if retry >= config.max_retries or not is_transient(e):
+                raise
+
+            delay = _retry_delay(e, config.retry_delay * 2**retry)
+            _upstream_retries.add(
+                attributes={"deployment": deployment_id.get() or ""}
+            )
+            log_warning(
+                "Upstream embeddings call failed, retrying in %.2f s: %r",
+                delay,
+                e,
+            )
+            await asyncio.sleep(delay)
+            retry += 1
+
+
+def _retry_delay(error: Exception, delay: float) -> float:
+    delay *= random.uniform(0.5, 1.0)
+
+    # Retry-After of the rate limit errors takes precedence
+    retry_after = (_headers(error) or {}).get("Retry-After")
+    if retry_after is not None:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+
+    return delay
@@ -0,0 +1,126 @@
+"""
+Compact representation of the embedding vectors.
+
+Float32Vector keeps the raw float32 values of a vector instead of
+a list of Python floats, so the vector isn't validated element by element
+and is serialized in bulk: as base64 of the little-endian bytes
+or as a JSON array of floats formatted by a single format operation.
+"""
+
+import base64
+import sys
+from array import array
+from functools import lru_cache
+from typing import Any, Callable, Iterator, List, Union
+
+from aidial_sdk.utils.json import JSONCodec
+
+# float32 values round-trip through 9 significant digits
+_FLOAT_FORMAT = "%.9g"
+
+
+class Float32Vector:
+    """
+    Embedding vector of float32 values.
+
+    Accepts array('f'), array('d'), a memoryview and any other object
+    supporting the buffer protocol with float32 or float64 items,
+    e.g. a contiguous NumPy array. float32 buffers are wrapped without
+    copying, so the source must not be modified until the response is sent.
+    """
+
+    __slots__ = ("_view",)
+
+    _view: memoryview
+
+    def __init__(self, data: Any):
+        view = memoryview(data)
+        if view.format not in ("f", "d"):
+            raise TypeError(
+                f"Expected a buffer of float32 or float64 items, got {view.format!r}"
+            )
+        if view.ndim != 1:
+            if not view.c_contiguous:
+                raise TypeError("Expected a contiguous buffer")
+            view = view.cast("B").cast(view.format)
+        if view.format == "d":
+            view = memoryview(array("f", view))
+
+        self._view = view
+
+    @classmethod
+    def frombytes(cls, data: Union[bytes, memoryview]) -> "Float32Vector":
+        """Vector of little-endian float32 bytes"""
+        values = array("f")
+        values.frombytes(data)
+        if sys.byteorder != "little":
+            values.byteswap()
+        return cls(values)
+
+    @classmethod
+    def __get_validators__(cls) -> Iterator[Callable[[Any], "Float32Vector"]]:
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value: Any) -> "Float32Vector":
+        if isinstance(value, cls):
+            return value
+        return cls(value)
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Float32Vector):
+            return self._view == other._view
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Float32Vector(dimensions={len(self)})"
+
+    def tolist(self) -> List[float]:
+        return self._view.tolist()
+
+    def tobytes(self) -> bytes:
+        """Little-endian float32 bytes"""
+        if sys.byteorder == "little":
+            return self._view.tobytes()
+        values = array("f", self._view)
+        values.byteswap()
+        return values.tobytes()
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.tobytes()).decode("ascii")
+
+    def to_json(self) -> str:
+        """JSON array of the values with 9 significant digits"""
+
+        text = _array_format(len(self)) % tuple(self._view)
+        # "inf" and "nan" are the only formatted values with "n"
+        if "n" in text:
+            raise ValueError("Out of range float values are not JSON compliant")
+        return text
+
+
+@lru_cache(maxsize=16)
+def _array_format(size: int) -> str:
+    return "[" + ",".join([_FLOAT_FORMAT] * size) + "]"
+
+
+EmbeddingVector = Union[str, List[float], Float32Vector]
+
+
+def encode_embedding(
+    embedding: EmbeddingVector, encoding_format: str, codec: JSONCodec
+) -> bytes:
+    """
+    JSON of the embedding.
+    Float32Vector is encoded according to the requested encoding_format,
+    the other values are encoded as they are.
+    """
+
+    if isinstance(embedding, Float32Vector):
+        if encoding_format == "base64":
+            return b'"' + embedding.to_base64().encode("ascii") + b'"'
+        return embedding.to_json().encode("ascii")
+    return codec.encode(embedding)
@@ -1,7 +1,7 @@
 import functools
 import warnings
 from http import HTTPStatus
-from typing import Optional
+from typing import Dict, Optional
 
 from fastapi import HTTPException as FastAPIException
 from fastapi.responses import JSONResponse
@@ -18,6 +18,7 @@ class HTTPException(Exception):
         param: Optional[str] = None,
         code: Optional[str] = None,
         display_message: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
     ) -> None:
         status_code = int(status_code)
 
@@ -27,6 +28,7 @@ class HTTPException(Exception):
         self.param = param
         self.code = code or str(status_code)
         self.display_message = display_message
+        self.headers = headers
 
     def __repr__(self):
         return (
@@ -59,12 +61,14 @@ class HTTPException(Exception):
         return JSONResponse(
             status_code=self.status_code,
             content=self.json_error(),
+            headers=self.headers,
         )
 
     def to_fastapi_exception(self) -> FastAPIException:
         return FastAPIException(
             status_code=self.status_code,
             detail=self.json_error(),
+            headers=self.headers,
         )
 
 
@@ -177,6 +181,28 @@ class RuntimeServerError(HTTPException):
         )
 
 
+class RateLimitExceededError(HTTPException):
+    """
+    The request is rejected because of the rate or concurrency limits.
+    The client may retry the request after retry_after seconds.
+    """
+
+    def __init__(
+        self, message: str, retry_after: Optional[int] = None, **kwargs
+    ) -> None:
+        return super().__init__(
+            status_code=HTTPStatus.TOO_MANY_REQUESTS,
+            type="rate_limit_error",
+            message=message,
+            headers=(
+                {"Retry-After": str(retry_after)}
+                if retry_after is not None
+                else None
+            ),
+            **kwargs,
+        )
+
+
 class InternalServerError(HTTPException):
     def __init__(self, message: str, **kwargs) -> None:
         return super().__init__(
@@ -0,0 +1,12 @@
+from aidial_sdk.limits.adaptive import (
+    AdaptiveConcurrencyLimiter,
+    AIMDLimit,
+    GradientLimit,
+    LimitAlgorithm,
+)
+from aidial_sdk.limits.base import Limiter, Permit
+from aidial_sdk.limits.composite import CompositeLimiter
+from aidial_sdk.limits.concurrency import ConcurrencyLimiter
+from aidial_sdk.limits.fair import FairConcurrencyLimiter, api_key
+from aidial_sdk.limits.loop_lag import LoopLagLimiter
+from aidial_sdk.limits.rate import RateLimit, RateLimiter
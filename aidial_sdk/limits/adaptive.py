@@ -0,0 +1,209 @@
+import math
+from abc import ABC, abstractmethod
+from time import monotonic
+from typing import Optional
+
+from aidial_sdk.limits.base import Permit
+from aidial_sdk.limits.concurrency import ConcurrencyLimiter
+
+
+class LimitAlgorithm(ABC):
+    """
+    Algorithm adjusting the concurrency limit from the observed latencies.
+    """
+
+    @property
+    @abstractmethod
+    def limit(self) -> int:
+        """Current concurrency limit"""
+
+    @abstractmethod
+    def update(self, latency: float, in_flight: int) -> None:
+        """
+        Takes into account the latency of a finished request.
+        in_flight is the number of the requests served concurrently
+        with it including the request itself.
+        """
+
+
+class AIMDLimit(LimitAlgorithm):
+    """
+    Additive increase, multiplicative decrease.
+
+    The limit is decreased by backoff_ratio when the latency exceeds
+    max_latency and is increased by one otherwise,
+    if the limit is actually used by at least a half.
+    Like in TCP congestion control, the limit is decreased only once
+    per overload: the slow requests admitted before the last decrease
+    don't decrease it further.
+    """
+
+    _limit: float
+    _min_limit: int
+    _max_limit: int
+    _max_latency: float
+    _backoff_ratio: float
+    _backoff_at: float
+
+    def __init__(
+        self,
+        max_latency: float,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        backoff_ratio: float = 0.9,
+    ):
+        _validate_limits(initial_limit, min_limit, max_limit)
+        if max_latency <= 0:
+            raise ValueError("max_latency must be positive")
+        if not 0 < backoff_ratio < 1:
+            raise ValueError("backoff_ratio must be between 0 and 1")
+
+        self._limit = initial_limit
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._max_latency = max_latency
+        self._backoff_ratio = backoff_ratio
+        self._backoff_at = float("-inf")
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def update(self, latency: float, in_flight: int) -> None:
+        if latency > self._max_latency:
+            now = monotonic()
+            if now - latency >= self._backoff_at:
+                self._backoff_at = now
+                self._limit = max(
+                    self._min_limit,
+                    math.floor(self._limit * self._backoff_ratio),
+                )
+        elif in_flight * 2 >= self._limit:
+            self._limit = min(self._max_limit, self._limit + 1)
+
+
+class GradientLimit(LimitAlgorithm):
+    """
+    Gradient of the latency relative to the latency without load.
+
+    The latency without load is estimated as the minimal observed latency,
+    which is re-measured every probe_interval requests to follow
+    the changes of the upstream.
+    While the latency is within tolerance of it, the limit grows by
+    the square root of itself (the allowed queue), as the latency grows
+    further the limit shrinks proportionally:
+
+        limit = limit * min(1, tolerance * min_latency / latency) + sqrt(limit)
+
+    The new limit is smoothed with the previous one.
+    """
+
+    _limit: float
+    _min_limit: int
+    _max_limit: int
+    _tolerance: float
+    _smoothing: float
+    _probe_interval: int
+    _min_latency: Optional[float]
+    _samples: int
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        probe_interval: int = 500,
+    ):
+        _validate_limits(initial_limit, min_limit, max_limit)
+        if tolerance < 1:
+            raise ValueError("tolerance must be at least 1")
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be between 0 and 1")
+        if probe_interval < 1:
+            raise ValueError("probe_interval must be positive")
+
+        self._limit = initial_limit
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._tolerance = tolerance
+        self._smoothing = smoothing
+        self._probe_interval = probe_interval
+        self._min_latency = None
+        self._samples = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def update(self, latency: float, in_flight: int) -> None:
+        self._samples += 1
+        if self._samples > self._probe_interval:
+            self._samples = 1
+            self._min_latency = None
+
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+
+        if latency <= 0:
+            return
+
+        gradient = min(1.0, self._tolerance * self._min_latency / latency)
+
+        # The limit isn't grown while the demand doesn't reach it
+        if gradient == 1.0 and in_flight * 2 < self._limit:
+            return
+
+        new_limit = self._limit * gradient + math.sqrt(self._limit)
+        new_limit = (
+            self._limit * (1 - self._smoothing) + new_limit * self._smoothing
+        )
+        self._limit = max(self._min_limit, min(self._max_limit, new_limit))
+
+
+class AdaptiveConcurrencyLimiter(ConcurrencyLimiter):
+    """
+    Concurrency limiter with the limit adjusted by the algorithm
+    (GradientLimit by default) from the latencies of the requests:
+    time to the first chunk of the chat completions
+    and the total duration of the other requests.
+    """
+
+    _algorithm: LimitAlgorithm
+
+    def __init__(
+        self,
+        algorithm: Optional[LimitAlgorithm] = None,
+        max_queue_size: int = 0,
+        queue_timeout: Optional[float] = None,
+    ):
+        self._algorithm = algorithm or GradientLimit()
+        super().__init__(
+            max_concurrency=self._algorithm.limit,
+            max_queue_size=max_queue_size,
+            queue_timeout=queue_timeout,
+        )
+
+    @property
+    def algorithm(self) -> LimitAlgorithm:
+        return self._algorithm
+
+    def _release(self, permit: Permit, duration: float) -> None:
+        latency = permit.time_to_first_chunk
+        if latency is None:
+            latency = duration
+
+        self._algorithm.update(latency, self._in_flight)
+        self._max_concurrency = self._algorithm.limit
+        super()._release(permit, duration)
+
+
+def _validate_limits(initial_limit: int, min_limit: int, max_limit: int):
+    if min_limit < 1:
+        raise ValueError("min_limit must be positive")
+    if not min_limit <= initial_limit <= max_limit:
+        raise ValueError(
+            "initial_limit must be between min_limit and max_limit"
+        )
@@ -0,0 +1,91 @@
+from abc import ABC, abstractmethod
+from time import monotonic
+from typing import Dict, Optional
+
+from fastapi import Request
+
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.logging import deployment_id
+
+_rejected_requests = metrics.counter(
+    "aidial_sdk.limits.rejected",
+    description="Number of requests rejected by the limiters",
+)
+
+
+class Permit:
+    """
+    Permission to serve a request granted by a limiter.
+    Must be released once the response is finished.
+    """
+
+    _limiter: "Limiter"
+    _acquired_at: float
+    _first_chunk_at: Optional[float]
+    _released: bool
+
+    attributes: Dict[str, str]
+
+    """Number of tokens used by the response according to its usage"""
+    tokens: int
+
+    def __init__(self, limiter: "Limiter", attributes: Dict[str, str]):
+        self._limiter = limiter
+        self._acquired_at = monotonic()
+        self._first_chunk_at = None
+        self._released = False
+        self.attributes = attributes
+        self.tokens = 0
+
+    @property
+    def released(self) -> bool:
+        return self._released
+
+    @property
+    def time_to_first_chunk(self) -> Optional[float]:
+        if self._first_chunk_at is None:
+            return None
+        return self._first_chunk_at - self._acquired_at
+
+    def first_chunk(self) -> None:
+        """Marks the moment the first chunk of the response is generated"""
+
+        if self._first_chunk_at is None:
+            self._first_chunk_at = monotonic()
+
+    def release(self) -> None:
+        if self._released:
+            return
+
+        self._released = True
+        self._limiter._release(self, monotonic() - self._acquired_at)
+
+
+class Limiter(ABC):
+    """
+    Admission control of the requests to a deployment.
+
+    A limiter instance could be shared by several deployments
+    to limit them together.
+    """
+
+    @abstractmethod
+    async def acquire(self, request: Optional[Request] = None) -> Permit:
+        """
+        Waits until the request could be served.
+        The request is used by the limiters treating the clients differently.
+        Raises RateLimitExceededError if the request is rejected.
+        """
+
+    @abstractmethod
+    def _release(self, permit: Permit, duration: float) -> None:
+        """Called once the response of the permitted request is finished"""
+
+
+def _attributes() -> Dict[str, str]:
+    """Metric attributes of the current request"""
+    return {"deployment": deployment_id.get() or ""}
+
+
+def _count_rejection(attributes: Dict[str, str], reason: str) -> None:
+    _rejected_requests.add(attributes={**attributes, "reason": reason})
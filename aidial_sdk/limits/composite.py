@@ -0,0 +1,57 @@
+from typing import List, Optional, Sequence
+
+from fastapi import Request
+
+from aidial_sdk.limits.base import Limiter, Permit, _attributes
+
+
+class _CompositePermit(Permit):
+    permits: List[Permit]
+
+    def __init__(self, limiter: Limiter, permits: List[Permit]):
+        super().__init__(limiter, _attributes())
+        self.permits = permits
+
+    def first_chunk(self) -> None:
+        super().first_chunk()
+        for permit in self.permits:
+            permit.first_chunk()
+
+
+class CompositeLimiter(Limiter):
+    """
+    Combines several limiters, e.g. a cap of the concurrency
+    with a limit of the rate of requests and tokens.
+
+    The limiters are acquired in order, so the cheaper checks
+    (like a rate limit) are better placed before the ones holding
+    a resource while the request waits (like a concurrency limit).
+    If one of the limiters rejects the request, the permits
+    already granted by the preceding ones are released in reverse order.
+    """
+
+    _limiters: List[Limiter]
+
+    def __init__(self, limiters: Sequence[Limiter]):
+        self._limiters = list(limiters)
+
+    async def acquire(self, request: Optional[Request] = None) -> Permit:
+        permits: List[Permit] = []
+        try:
+            for limiter in self._limiters:
+                permits.append(await limiter.acquire(request))
+        except BaseException:
+            _release_all(permits, tokens=0)
+            raise
+
+        return _CompositePermit(self, permits)
+
+    def _release(self, permit: Permit, duration: float) -> None:
+        if isinstance(permit, _CompositePermit):
+            _release_all(permit.permits, permit.tokens)
+
+
+def _release_all(permits: List[Permit], tokens: int) -> None:
+    for permit in reversed(permits):
+        permit.tokens = tokens
+        permit.release()
@@ -0,0 +1,222 @@
+import asyncio
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from fastapi import Request
+
+from aidial_sdk.exceptions import RateLimitExceededError
+from aidial_sdk.limits.base import (
+    Limiter,
+    Permit,
+    _attributes,
+    _count_rejection,
+)
+from aidial_sdk.telemetry.metrics import metrics
+
+_queue_size = metrics.up_down_counter(
+    "aidial_sdk.limits.queue_size",
+    description="Number of requests waiting for the concurrency limit",
+)
+_in_flight = metrics.up_down_counter(
+    "aidial_sdk.limits.in_flight",
+    description="Number of requests served within the concurrency limit",
+)
+
+# Weight of the latest observation in the average service time
+_SERVICE_TIME_WEIGHT = 0.2
+
+
+class _Waiter:
+    __slots__ = ("future", "attributes", "key")
+
+    future: "asyncio.Future[Optional[Permit]]"
+    attributes: Dict[str, str]
+    key: str
+
+    def __init__(
+        self,
+        future: "asyncio.Future[Optional[Permit]]",
+        attributes: Dict[str, str],
+        key: str,
+    ):
+        self.future = future
+        self.attributes = attributes
+        self.key = key
+
+
+class ConcurrencyLimiter(Limiter):
+    """
+    Limits the number of the requests served concurrently.
+
+    The requests exceeding the limit wait in a FIFO queue of at most
+    max_queue_size requests for at most queue_timeout seconds.
+    The requests which don't fit into the queue or time out in it are
+    rejected with HTTP 429 and Retry-After estimated from the observed
+    service time of the requests.
+    """
+
+    _max_concurrency: int
+    _max_queue_size: int
+    _queue_timeout: Optional[float]
+    _in_flight: int
+    _waiters: Deque[_Waiter]
+    _service_time: Optional[float]
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue_size: int = 0,
+        queue_timeout: Optional[float] = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be positive")
+        if max_queue_size < 0:
+            raise ValueError("max_queue_size must be non-negative")
+        if queue_timeout is not None and queue_timeout <= 0:
+            raise ValueError("queue_timeout must be positive")
+
+        self._max_concurrency = max_concurrency
+        self._max_queue_size = max_queue_size
+        self._queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters = deque()
+        self._service_time = None
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """
+        Estimated time (in seconds) until the queue is served,
+        if the requests take the average observed service time.
+        """
+
+        if self._service_time is None:
+            return 1
+
+        waves = (self.queue_size + 1) / self._max_concurrency
+        return max(1, math.ceil(self._service_time * waves))
+
+    async def acquire(self, request: Optional[Request] = None) -> Permit:
+        attributes = _attributes()
+
+        if self._in_flight < self._max_concurrency and self.queue_size == 0:
+            return self._grant(attributes)
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), attributes, self._key(request))
+        if not self._enqueue(waiter):
+            raise self._reject(attributes, "queue_full")
+        _queue_size.add(1, attributes)
+
+        timer = None
+        if self._queue_timeout is not None:
+            timer = loop.call_later(
+                self._queue_timeout, _resolve, waiter.future, None
+            )
+
+        try:
+            permit = await waiter.future
+        except asyncio.CancelledError:
+            # The permit could have been granted right before the cancellation
+            future = waiter.future
+            if (
+                future.done()
+                and not future.cancelled()
+                and future.exception() is None
+            ):
+                granted = future.result()
+                if granted is not None:
+                    granted.release()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if self._discard(waiter):
+                _queue_size.add(-1, attributes)
+
+        if permit is None:
+            raise self._reject(attributes, "queue_timeout")
+
+        return permit
+
+    def _key(self, request: Optional[Request]) -> str:
+        """Key of the queue of the request"""
+        return ""
+
+    def _enqueue(self, waiter: _Waiter) -> bool:
+        """Adds the waiter to the queue unless the queue is full"""
+
+        if len(self._waiters) >= self._max_queue_size:
+            return False
+
+        self._waiters.append(waiter)
+        return True
+
+    def _dequeue(self) -> Optional[_Waiter]:
+        """Removes the waiter to be served next from the queue"""
+        return self._waiters.popleft() if self._waiters else None
+
+    def _discard(self, waiter: _Waiter) -> bool:
+        """Removes the waiter from the queue if it is still there"""
+
+        try:
+            self._waiters.remove(waiter)
+            return True
+        except ValueError:
+            return False
+
+    def _grant(self, attributes: Dict[str, str]) -> Permit:
+        self._in_flight += 1
+        _in_flight.add(1, attributes)
+        return Permit(self, attributes)
+
+    def _release(self, permit: Permit, duration: float) -> None:
+        self._service_time = (
+            duration
+            if self._service_time is None
+            else self._service_time
+            + _SERVICE_TIME_WEIGHT * (duration - self._service_time)
+        )
+
+        self._in_flight -= 1
+        _in_flight.add(-1, permit.attributes)
+        self._grant_waiters()
+
+    def _grant_waiters(self) -> None:
+        """Hands the free slots over to the next waiters still waiting"""
+
+        while self._in_flight < self._max_concurrency:
+            waiter = self._dequeue()
+            if waiter is None:
+                return
+
+            _queue_size.add(-1, waiter.attributes)
+            if not waiter.future.done():
+                waiter.future.set_result(self._grant(waiter.attributes))
+
+    def _reject(
+        self, attributes: Dict[str, str], reason: str
+    ) -> RateLimitExceededError:
+        _count_rejection(attributes, reason)
+        return RateLimitExceededError(
+            "Too many concurrent requests to the deployment",
+            retry_after=self.retry_after(),
+        )
+
+
+def _resolve(
+    future: "asyncio.Future[Optional[Permit]]", result: Optional[Permit]
+) -> None:
+    if not future.done():
+        future.set_result(result)
@@ -0,0 +1,172 @@
+from collections import deque
+from typing import Callable, Deque, Dict, Mapping, Optional
+
+from fastapi import Request
+
+from aidial_sdk.limits.concurrency import (
+    ConcurrencyLimiter,
+    _queue_size,
+    _Waiter,
+)
+
+KeyFunction = Callable[[Optional[Request]], str]
+
+
+def api_key(request: Optional[Request]) -> str:
+    """Key of the client sending the request: its Api-Key header"""
+    if request is None:
+        return ""
+    return request.headers.get("Api-Key") or ""
+
+
+class _Queue:
+    __slots__ = ("waiters", "deficit")
+
+    waiters: Deque[_Waiter]
+    deficit: float
+
+    def __init__(self) -> None:
+        self.waiters = deque()
+        self.deficit = 0.0
+
+
+class FairConcurrencyLimiter(ConcurrencyLimiter):
+    """
+    Concurrency limiter sharing the slots fairly between the clients.
+
+    The waiting requests are queued per client (per api key by default,
+    or per the result of the key function) and the queues are served
+    with deficit round-robin: in every round a client is admitted
+    as many requests as its weight (1 by default),
+    so a client flooding the deployment delays only its own requests.
+
+    When the queue is full, a new request evicts the latest request
+    of the client with the longest queue, if that client has more
+    requests waiting than the client of the new request.
+    """
+
+    _key_function: KeyFunction
+    _weights: Mapping[str, float]
+    _default_weight: float
+    _queues: Dict[str, _Queue]
+    _active: Deque[str]
+    _size: int
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue_size: int = 0,
+        queue_timeout: Optional[float] = None,
+        key: KeyFunction = api_key,
+        weights: Optional[Mapping[str, float]] = None,
+        default_weight: float = 1.0,
+    ):
+        super().__init__(
+            max_concurrency=max_concurrency,
+            max_queue_size=max_queue_size,
+            queue_timeout=queue_timeout,
+        )
+
+        weights = weights or {}
+        if default_weight <= 0 or any(w <= 0 for w in weights.values()):
+            raise ValueError("weights must be positive")
+
+        self._key_function = key
+        self._weights = weights
+        self._default_weight = default_weight
+        self._queues = {}
+        self._active = deque()
+        self._size = 0
+
+    @property
+    def queue_size(self) -> int:
+        return self._size
+
+    def _key(self, request: Optional[Request]) -> str:
+        return self._key_function(request)
+
+    def _enqueue(self, waiter: _Waiter) -> bool:
+        if self._size >= self._max_queue_size and not self._evict_for(
+            waiter.key
+        ):
+            return False
+
+        queue = self._queues.get(waiter.key)
+        if queue is None:
+            queue = self._queues[waiter.key] = _Queue()
+            self._active.append(waiter.key)
+
+        queue.waiters.append(waiter)
+        self._size += 1
+        return True
+
+    def _dequeue(self) -> Optional[_Waiter]:
+        while self._active:
+            key = self._active[0]
+            queue = self._queues[key]
+
+            # The client gets its share on its turn in the round
+            if queue.deficit < 1:
+                queue.deficit += self._weights.get(key, self._default_weight)
+                if queue.deficit < 1:
+                    self._active.rotate(-1)
+                    continue
+
+            waiter = queue.waiters.popleft()
+            queue.deficit -= 1
+            self._size -= 1
+
+            if not queue.waiters:
+                self._remove_queue(key)
+            elif queue.deficit < 1:
+                # The client has used up its share in this round
+                self._active.rotate(-1)
+
+            return waiter
+
+        return None
+
+    def _discard(self, waiter: _Waiter) -> bool:
+        queue = self._queues.get(waiter.key)
+        if queue is None:
+            return False
+
+        try:
+            queue.waiters.remove(waiter)
+        except ValueError:
+            return False
+
+        self._size -= 1
+        if not queue.waiters:
+            self._remove_queue(waiter.key)
+        return True
+
+    def _remove_queue(self, key: str) -> None:
+        del self._queues[key]
+        self._active.remove(key)
+
+    def _evict_for(self, key: str) -> bool:
+        """
+        Rejects the latest waiter of the longest queue
+        to make room for a waiter with the given key.
+        """
+
+        if not self._queues:
+            return False
+
+        longest = max(self._queues, key=lambda k: len(self._queues[k].waiters))
+        own = self._queues.get(key)
+        if (
+            len(self._queues[longest].waiters)
+            <= (len(own.waiters) if own is not None else 0) + 1
+        ):
+            return False
+
+        waiter = self._queues[longest].waiters.pop()
+        self._size -= 1
+        _queue_size.add(-1, waiter.attributes)
+        if not waiter.future.done():
+            waiter.future.set_exception(
+                self._reject(waiter.attributes, "queue_evicted")
+            )
+        return True
@@ -0,0 +1,50 @@
+from typing import Optional
+
+from fastapi import Request
+
+from aidial_sdk.exceptions import RateLimitExceededError
+from aidial_sdk.limits.base import (
+    Limiter,
+    Permit,
+    _attributes,
+    _count_rejection,
+)
+from aidial_sdk.telemetry.loop_monitor import LoopMonitor
+
+
+class LoopLagLimiter(Limiter):
+    """
+    Rejects the new requests while the lag of the event loop
+    stays above max_lag for the whole window of the monitor,
+    so that an overloaded worker doesn't delay the requests
+    it is already serving even more.
+    """
+
+    _monitor: LoopMonitor
+    _max_lag: float
+    _retry_after: int
+
+    def __init__(
+        self, monitor: LoopMonitor, max_lag: float, retry_after: int = 1
+    ):
+        if max_lag <= 0:
+            raise ValueError("max_lag must be positive")
+
+        self._monitor = monitor
+        self._max_lag = max_lag
+        self._retry_after = retry_after
+
+    async def acquire(self, request: Optional[Request] = None) -> Permit:
+        self._monitor.ensure_started()
+        attributes = _attributes()
+
+        if self._monitor.sustained_lag > self._max_lag:
+            _count_rejection(attributes, "loop_lag")
+            raise RateLimitExceededError(
+                "The server is overloaded", retry_after=self._retry_after
+            )
+
+        return Permit(self, attributes)
+
+    def _release(self, permit: Permit, duration: float) -> None:
+        pass
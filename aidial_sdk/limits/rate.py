@@ -0,0 +1,283 @@
+import hashlib
+import math
+from array import array
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+
+from aidial_sdk.exceptions import RateLimitExceededError
+from aidial_sdk.limits.base import (
+    Limiter,
+    Permit,
+    _attributes,
+    _count_rejection,
+)
+from aidial_sdk.limits.fair import KeyFunction, api_key
+from aidial_sdk.pydantic_v1 import BaseModel, PositiveFloat
+
+# Interval (in seconds) of the removal of the buckets of idle keys
+_SWEEP_INTERVAL = 60.0
+
+_MIN_CAPACITY = 16
+
+# Key of the bucket of the deployment as a whole
+_DEPLOYMENT_KEY = 1
+
+
+class RateLimit(BaseModel):
+    """
+    Limits of the rate of requests and tokens.
+
+    Each limit is a token bucket holding a minute worth of the rate,
+    so short bursts up to the per minute limit are allowed.
+    """
+
+    """Limit of the number of requests"""
+    requests_per_minute: Optional[PositiveFloat] = None
+
+    """Limit of the total tokens reported by the usage of the responses.
+    As the usage is known only at the end of a response, the tokens
+    are charged afterwards and a client exceeding the limit is rejected
+    until the bucket is refilled."""
+    tokens_per_minute: Optional[PositiveFloat] = None
+
+
+class _Buckets:
+    """
+    Token buckets of the keys.
+
+    The buckets are kept in an open addressing hash table of flat arrays:
+    a 64-bit hash of the key and three doubles per slot (32 bytes)
+    instead of an object per key in a dictionary.
+    The buckets refilled completely are indistinguishable from the new ones,
+    so they are removed periodically to bound the memory by the number
+    of recently active keys.
+    """
+
+    _limit: RateLimit
+    _keys: array
+    _requests: array
+    _tokens: array
+    _updated_at: array
+    _mask: int
+    _count: int
+    _swept_at: float
+
+    def __init__(self, limit: RateLimit) -> None:
+        self._limit = limit
+        self._create_table(_MIN_CAPACITY)
+        self._swept_at = monotonic()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        return self._mask + 1
+
+    def wait_time(self, key: int, now: float) -> Tuple[float, str]:
+        """
+        Time to wait until the key has a request and a token available
+        (0 if they are available now) and the name of the exhausted limit.
+        """
+
+        slot = self._find(key)
+        if self._keys[slot] == 0:
+            return 0.0, ""
+
+        self._refill(slot, now)
+
+        rpm = self._limit.requests_per_minute
+        if rpm is not None and self._requests[slot] < 1:
+            return (1 - self._requests[slot]) * 60 / rpm, "request_rate"
+
+        tpm = self._limit.tokens_per_minute
+        if tpm is not None and self._tokens[slot] <= 0:
+            return (1 - self._tokens[slot]) * 60 / tpm, "token_rate"
+
+        return 0.0, ""
+
+    def charge(
+        self, key: int, now: float, requests: int = 0, tokens: int = 0
+    ) -> None:
+        slot = self._find(key)
+        if self._keys[slot] == 0:
+            slot = self._insert(key, now)
+        else:
+            self._refill(slot, now)
+
+        self._requests[slot] -= requests
+        self._tokens[slot] -= tokens
+
+        if now - self._swept_at >= _SWEEP_INTERVAL:
+            self._sweep(now)
+
+    def _create_table(self, capacity: int) -> None:
+        self._keys = array("Q", bytes(8 * capacity))
+        self._requests = array("d", bytes(8 * capacity))
+        self._tokens = array("d", bytes(8 * capacity))
+        self._updated_at = array("d", bytes(8 * capacity))
+        self._mask = capacity - 1
+        self._count = 0
+
+    def _find(self, key: int) -> int:
+        """Slot of the key or the empty slot where it should be inserted"""
+
+        keys = self._keys
+        mask = self._mask
+        slot = key & mask
+        while True:
+            found = keys[slot]
+            if found == key or found == 0:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _insert(self, key: int, now: float) -> int:
+        if (self._count + 1) * 4 > self.capacity * 3:
+            self._resize(self.capacity * 2, now)
+
+        slot = self._find(key)
+        self._keys[slot] = key
+        self._requests[slot] = self._limit.requests_per_minute or 0.0
+        self._tokens[slot] = self._limit.tokens_per_minute or 0.0
+        self._updated_at[slot] = now
+        self._count += 1
+        return slot
+
+    def _resize(self, capacity: int, now: float, drop_full: bool = False):
+        keys, requests, tokens, updated_at = (
+            self._keys,
+            self._requests,
+            self._tokens,
+            self._updated_at,
+        )
+
+        live = [
+            slot
+            for slot in range(len(keys))
+            if keys[slot] != 0 and not (drop_full and self._refill(slot, now))
+        ]
+        while capacity > _MIN_CAPACITY and len(live) * 4 < capacity:
+            capacity //= 2
+
+        self._create_table(capacity)
+        for old in live:
+            slot = self._find(keys[old])
+            self._keys[slot] = keys[old]
+            self._requests[slot] = requests[old]
+            self._tokens[slot] = tokens[old]
+            self._updated_at[slot] = updated_at[old]
+        self._count = len(live)
+
+    def _refill(self, slot: int, now: float) -> bool:
+        """Refills the bucket. Returns True if it's full."""
+
+        elapsed = now - self._updated_at[slot]
+        self._updated_at[slot] = now
+        full = True
+
+        rpm = self._limit.requests_per_minute
+        if rpm is not None:
+            value = min(rpm, self._requests[slot] + elapsed * rpm / 60)
+            self._requests[slot] = value
+            full = value >= rpm
+
+        tpm = self._limit.tokens_per_minute
+        if tpm is not None:
+            value = min(tpm, self._tokens[slot] + elapsed * tpm / 60)
+            self._tokens[slot] = value
+            full = full and value >= tpm
+
+        return full
+
+    def _sweep(self, now: float) -> None:
+        self._swept_at = now
+        self._resize(self.capacity, now, drop_full=True)
+
+
+class _RatePermit(Permit):
+    key: int
+
+    def __init__(self, limiter: Limiter, attributes: Dict[str, str], key: int):
+        super().__init__(limiter, attributes)
+        self.key = key
+
+
+class RateLimiter(Limiter):
+    """
+    Limits the rate of requests and tokens of a deployment as a whole
+    and of every client (api key by default) of the deployment.
+
+    The requests exceeding the limits are rejected before they are served
+    with HTTP 429 and Retry-After until the bucket has room for them.
+
+    The clients are tracked by a 64-bit hash of the key, so the keys
+    themselves aren't kept in memory.
+    """
+
+    _deployment: Optional[_Buckets]
+    _per_key: Optional[_Buckets]
+    _key_function: KeyFunction
+
+    def __init__(
+        self,
+        deployment: Optional[RateLimit] = None,
+        per_key: Optional[RateLimit] = None,
+        key: KeyFunction = api_key,
+    ):
+        self._deployment = (
+            _Buckets(deployment) if deployment is not None else None
+        )
+        self._per_key = _Buckets(per_key) if per_key is not None else None
+        self._key_function = key
+
+    @property
+    def tracked_keys(self) -> int:
+        return len(self._per_key) if self._per_key is not None else 0
+
+    async def acquire(self, request: Optional[Request] = None) -> Permit:
+        attributes = _attributes()
+        key = (
+            _hash(self._key_function(request))
+            if self._per_key is not None
+            else _DEPLOYMENT_KEY
+        )
+        now = monotonic()
+
+        for buckets, bucket_key in self._buckets(key):
+            wait_time, reason = buckets.wait_time(bucket_key, now)
+            if wait_time > 0:
+                _count_rejection(attributes, reason)
+                raise RateLimitExceededError(
+                    "Rate limit exceeded",
+                    retry_after=max(1, math.ceil(wait_time)),
+                )
+
+        for buckets, bucket_key in self._buckets(key):
+            buckets.charge(bucket_key, now, requests=1)
+
+        return _RatePermit(self, attributes, key)
+
+    def _release(self, permit: Permit, duration: float) -> None:
+        if permit.tokens == 0:
+            return
+
+        key = permit.key if isinstance(permit, _RatePermit) else _DEPLOYMENT_KEY
+        now = monotonic()
+        for buckets, bucket_key in self._buckets(key):
+            buckets.charge(bucket_key, now, tokens=permit.tokens)
+
+    def _buckets(self, key: int) -> List[Tuple[_Buckets, int]]:
+        buckets = []
+        if self._deployment is not None:
+            buckets.append((self._deployment, _DEPLOYMENT_KEY))
+        if self._per_key is not None:
+            buckets.append((self._per_key, key))
+        return buckets
+
+
+def _hash(key: str) -> int:
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    # 0 marks the empty slots of the buckets table
+    return int.from_bytes(digest, "little") or 1
@@ -1,4 +1,16 @@
 try:
     from pydantic.v1 import *  # type: ignore
+    from pydantic.v1.error_wrappers import ErrorWrapper  # type: ignore
+    from pydantic.v1.errors import (  # type: ignore
+        IntegerError,
+        ListError,
+        NoneIsNotAllowedError,
+    )
 except ImportError:
     from pydantic import *  # type: ignore
+    from pydantic.error_wrappers import ErrorWrapper  # type: ignore
+    from pydantic.errors import (  # type: ignore
+        IntegerError,
+        ListError,
+        NoneIsNotAllowedError,
+    )
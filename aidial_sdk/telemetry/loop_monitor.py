@@ -0,0 +1,174 @@
+"""
+Monitoring of the event loop shared by all the requests of the worker.
+
+A CPU-bound code in a single request delays all the other requests
+served by the same event loop. The monitor measures the delay
+(the lag of the loop) and optionally detects the callbacks blocking
+the loop for too long attributing them to the deployment of the request.
+"""
+
+import asyncio
+import contextvars
+from collections import deque
+from time import perf_counter
+from typing import Deque, Optional
+
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.logging import deployment_id, log_warning
+
+_loop_lag = metrics.histogram(
+    "aidial_sdk.event_loop.lag",
+    description="Delay of the scheduled callbacks of the event loop",
+)
+_slow_callbacks = metrics.counter(
+    "aidial_sdk.event_loop.slow_callbacks",
+    description="Number of the callbacks blocking the event loop for too long",
+)
+_slow_callback_duration = metrics.histogram(
+    "aidial_sdk.event_loop.slow_callback_duration",
+    description="Duration of the callbacks blocking the event loop for too long",
+)
+
+
+class LoopMonitor:
+    """
+    Samples the lag of the event loop every interval seconds:
+    the time a timer scheduled by loop.call_later fired after its deadline.
+    The sampling doesn't alter the loop, so it works with any event loop.
+
+    The detection of the slow callbacks is opt-in: if slow_callback_duration
+    is set, asyncio.Handle._run is replaced until stop() to time every
+    callback of the monitored loop and the ones taking longer are reported
+    with the deployment of the request they belong to.
+    The replacement is process-wide and relies on the internals
+    of asyncio.Handle, so it isn't available with the alternative
+    event loops like uvloop.
+
+    The monitor is started on the first request to the app
+    (see DIALApp(loop_monitor=...)) or explicitly by ensure_started.
+    """
+
+    _interval: float
+    _slow_callback_duration: Optional[float]
+    _lags: Deque[float]
+    _loop: Optional[asyncio.AbstractEventLoop]
+    _timer: Optional[asyncio.TimerHandle]
+    # The sampler doesn't belong to the request which started it
+    _context: contextvars.Context
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        window: int = 5,
+        slow_callback_duration: Optional[float] = None,
+    ):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if window < 1:
+            raise ValueError("window must be positive")
+        if slow_callback_duration is not None and slow_callback_duration <= 0:
+            raise ValueError("slow_callback_duration must be positive")
+
+        self._interval = interval
+        self._slow_callback_duration = slow_callback_duration
+        self._lags = deque(maxlen=window)
+        self._loop = None
+        self._timer = None
+        self._context = contextvars.Context()
+
+    @property
+    def lag(self) -> float:
+        """The latest sampled lag"""
+        return self._lags[-1] if self._lags else 0.0
+
+    @property
+    def sustained_lag(self) -> float:
+        """The lag the loop has stayed above for the whole window"""
+        if len(self._lags) < self._lags.maxlen:  # type: ignore
+            return 0.0
+        return min(self._lags)
+
+    def ensure_started(self) -> None:
+        """Starts the monitoring of the running event loop"""
+
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and self._loop is loop:
+            return
+
+        self.stop()
+        self._lags.clear()
+        self._loop = loop
+        self._schedule()
+
+        if self._slow_callback_duration is not None:
+            _install(self)
+
+    def stop(self) -> None:
+        """Stops the sampling and restores asyncio.Handle._run"""
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._loop = None
+        _uninstall(self)
+
+    def _schedule(self) -> None:
+        self._timer = self._loop.call_later(  # type: ignore
+            self._interval, self._sample, context=self._context
+        )
+
+    def _sample(self) -> None:
+        if self._timer is None or self._loop is None:
+            return
+
+        lag = max(0.0, self._loop.time() - self._timer.when())
+        self._lags.append(lag)
+        _loop_lag.record(lag)
+        self._schedule()
+
+    def _report_slow_callback(
+        self, handle: asyncio.Handle, duration: float
+    ) -> None:
+        context = getattr(handle, "_context", None)
+        deployment = context.get(deployment_id) if context is not None else None
+
+        attributes = {"deployment": deployment or ""}
+        _slow_callbacks.add(1, attributes)
+        _slow_callback_duration.record(duration, attributes)
+
+        log_warning(
+            "Event loop was blocked for %.3f s by %r",
+            duration,
+            handle,
+            extra={"deployment_id": deployment},
+        )
+
+
+_handle_run = asyncio.Handle._run
+_installed: Optional[LoopMonitor] = None
+
+
+def _timed_run(handle: asyncio.Handle) -> None:
+    monitor = _installed
+    if monitor is None or monitor._loop is not asyncio.get_running_loop():
+        return _handle_run(handle)
+
+    started_at = perf_counter()
+    _handle_run(handle)
+    duration = perf_counter() - started_at
+
+    if duration >= monitor._slow_callback_duration:  # type: ignore
+        monitor._report_slow_callback(handle, duration)
+
+
+def _install(monitor: LoopMonitor) -> None:
+    global _installed
+    _installed = monitor
+    asyncio.Handle._run = _timed_run  # type: ignore
+
+
+def _uninstall(monitor: LoopMonitor) -> None:
+    global _installed
+    if _installed is monitor:
+        _installed = None
+        asyncio.Handle._run = _handle_run  # type: ignore
@@ -0,0 +1,277 @@
+"""
+Metrics reported by the SDK.
+
+The values are kept in an in-memory registry, so they are available
+without the telemetry extras installed.
+If OpenTelemetry API is available, the values are also reported to
+the OpenTelemetry meter provider, e.g. the one configured by
+DIALApp(telemetry_config=...).
+"""
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:
+    otel_metrics = None
+
+Attributes = Mapping[str, str]
+
+_Key = Tuple[Tuple[str, str], ...]
+
+
+def _key(attributes: Optional[Attributes]) -> _Key:
+    return tuple(sorted(attributes.items())) if attributes else ()
+
+
+class Instrument(ABC):
+    name: str
+    unit: str
+    description: str
+
+    def __init__(
+        self, name: str, unit: str, description: str, meter: Any
+    ) -> None:
+        self.name = name
+        self.unit = unit
+        self.description = description
+
+    @abstractmethod
+    def collect(self) -> Dict[_Key, Any]:
+        pass
+
+
+class Counter(Instrument):
+    """Monotonic sum of the values"""
+
+    _values: Dict[_Key, float]
+
+    def __init__(
+        self, name: str, unit: str, description: str, meter: Any
+    ) -> None:
+        super().__init__(name, unit, description, meter)
+        self._values = {}
+        self._otel = self._create_otel(meter) if meter is not None else None
+
+    def _create_otel(self, meter: Any) -> Any:
+        return meter.create_counter(
+            self.name, unit=self.unit, description=self.description
+        )
+
+    def add(
+        self, amount: float = 1, attributes: Optional[Attributes] = None
+    ) -> None:
+        key = _key(attributes)
+        self._values[key] = self._values.get(key, 0) + amount
+        if self._otel is not None:
+            self._otel.add(amount, attributes)
+
+    def value(self, attributes: Optional[Attributes] = None) -> float:
+        return self._values.get(_key(attributes), 0)
+
+    def collect(self) -> Dict[_Key, Any]:
+        return dict(self._values)
+
+
+class UpDownCounter(Counter):
+    """Sum of the values, which could go down, e.g. the size of a queue"""
+
+    def _create_otel(self, meter: Any) -> Any:
+        return meter.create_up_down_counter(
+            self.name, unit=self.unit, description=self.description
+        )
+
+
+DEFAULT_DURATION_BOUNDARIES: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+class HistogramData:
+    """
+    Distribution of the recorded values.
+    counts[i] is the number of values in (boundaries[i-1], boundaries[i]],
+    the last one is the number of values above the last boundary.
+    """
+
+    boundaries: Sequence[float]
+    counts: List[int]
+    count: int
+    sum: float
+    min: float
+    max: float
+
+    def __init__(self, boundaries: Sequence[float]) -> None:
+        self.boundaries = boundaries
+        self.counts = [0] * (len(boundaries) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def record(self, value: float) -> None:
+        self.counts[bisect_left(self.boundaries, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the quantile as the upper boundary of its bucket
+        (the maximum value for the last bucket).
+        """
+
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        accumulated = 0
+        for index, count in enumerate(self.counts):
+            accumulated += count
+            if accumulated >= rank and count > 0:
+                if index < len(self.boundaries):
+                    return min(self.boundaries[index], self.max)
+                return self.max
+        return self.max
+
+
+class Histogram(Instrument):
+    """Distribution of the values, e.g. of durations"""
+
+    boundaries: Tuple[float, ...]
+    _values: Dict[_Key, HistogramData]
+
+    def __init__(
+        self,
+        name: str,
+        unit: str,
+        description: str,
+        meter: Any,
+        boundaries: Sequence[float] = DEFAULT_DURATION_BOUNDARIES,
+    ) -> None:
+        super().__init__(name, unit, description, meter)
+        self.boundaries = tuple(boundaries)
+        self._values = {}
+        self._otel = (
+            meter.create_histogram(name, unit=unit, description=description)
+            if meter is not None
+            else None
+        )
+
+    def record(
+        self, value: float, attributes: Optional[Attributes] = None
+    ) -> None:
+        key = _key(attributes)
+        data = self._values.get(key)
+        if data is None:
+            data = self._values[key] = HistogramData(self.boundaries)
+        data.record(value)
+        if self._otel is not None:
+            self._otel.record(value, attributes)
+
+    def value(
+        self, attributes: Optional[Attributes] = None
+    ) -> Optional[HistogramData]:
+        return self._values.get(_key(attributes))
+
+    def collect(self) -> Dict[_Key, Any]:
+        return dict(self._values)
+
+
+InstrumentType = TypeVar("InstrumentType", bound=Instrument)
+
+
+class MetricsRegistry:
+    _meter: Any
+    _instruments: Dict[str, Instrument]
+
+    def __init__(self, meter_name: str = "aidial_sdk") -> None:
+        self._meter = (
+            otel_metrics.get_meter(meter_name)
+            if otel_metrics is not None
+            else None
+        )
+        self._instruments = {}
+
+    def counter(
+        self, name: str, unit: str = "1", description: str = ""
+    ) -> Counter:
+        return self._instrument(Counter, name, unit, description)
+
+    def up_down_counter(
+        self, name: str, unit: str = "1", description: str = ""
+    ) -> UpDownCounter:
+        return self._instrument(UpDownCounter, name, unit, description)
+
+    def histogram(
+        self,
+        name: str,
+        unit: str = "s",
+        description: str = "",
+        boundaries: Sequence[float] = DEFAULT_DURATION_BOUNDARIES,
+    ) -> Histogram:
+        return self._instrument(
+            Histogram, name, unit, description, boundaries=boundaries
+        )
+
+    def collect(self) -> Dict[str, Dict[_Key, Any]]:
+        """
+        Returns a snapshot of the values of all the instruments
+        by instrument name and sorted attributes.
+        """
+
+        return {
+            name: instrument.collect()
+            for name, instrument in self._instruments.items()
+        }
+
+    def _instrument(
+        self,
+        cls: Type[InstrumentType],
+        name: str,
+        unit: str,
+        description: str,
+        **kwargs: Any,
+    ) -> InstrumentType:
+        instrument = self._instruments.get(name)
+        if instrument is None:
+            instrument = self._instruments[name] = cls(
+                name, unit, description, self._meter, **kwargs
+            )
+        elif type(instrument) is not cls:
+            raise ValueError(
+                f"Metric {name!r} is already registered as {type(instrument).__name__}"
+            )
+        return instrument
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,248 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aidial_sdk.chat_completion.chunks import (
+    AttachmentChunk,
+    AttachmentStageChunk,
+    BaseChunk,
+    ContentChunk,
+    ContentStageChunk,
+    DiscardedMessagesChunk,
+    EndChoiceChunk,
+    FinishStageChunk,
+    FunctionCallChunk,
+    FunctionToolCallChunk,
+    NameStageChunk,
+    StartChoiceChunk,
+    StartStageChunk,
+    StateChunk,
+    UsageChunk,
+    UsagePerModelChunk,
+)
+from aidial_sdk.utils.merge_chunks import cleanup_indices, merge_recursive
+
+
+class _Text(List[str]):
+    """Parts of a string field which are joined on materialization"""
+
+
+class ResponseAccumulator:
+    """
+    Builds a non-streaming response from the chunks of a response stream.
+
+    The result is the same as the one of merging the dictionaries
+    of the chunks with merge_chunks, but
+    1. the chunk types are dispatched directly instead of the recursive
+       merge of their dictionaries,
+    2. the indexed lists (choices, stages, tool calls, attachments)
+       are addressed by index instead of being rescanned on every chunk,
+    3. the appended strings (content, arguments, names) are collected
+       in lists and joined once at the end.
+    Hence the time to build a response is linear in its size.
+
+    Chunks of unknown types are merged with the generic merge.
+    """
+
+    _response: Dict[str, Any]
+    _texts: List[Tuple[Dict[str, Any], str]]
+    _add_default_fields: Optional[Callable[[Dict[str, Any]], None]]
+
+    def __init__(
+        self,
+        add_default_fields: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self._response = {}
+        self._texts = []
+        self._add_default_fields = add_default_fields
+
+    def add(self, chunk: BaseChunk) -> None:
+        handler = _HANDLERS.get(type(chunk))
+        if handler is None:
+            self._materialize_texts()
+            self._response = merge_recursive(
+                self._response, chunk.to_dict(), path=[]
+            )
+        else:
+            handler(self, chunk)
+
+        # NOTE: default fields are added after the first chunk
+        # to keep them after the fields of the chunk
+        if self._add_default_fields is not None:
+            self._add_default_fields(self._response)
+            self._add_default_fields = None
+
+    def finish(self) -> Dict[str, Any]:
+        self._materialize_texts()
+
+        response = self._response
+        for choice in response.get("choices", []):
+            choice["message"] = cleanup_indices(choice.pop("delta"))
+
+        return response
+
+    def _append_text(
+        self, target: Dict[str, Any], key: str, text: Optional[str]
+    ) -> None:
+        if text is None:
+            target.setdefault(key, None)
+            return
+
+        current = target.get(key)
+        if current is None:
+            target[key] = text
+        elif isinstance(current, _Text):
+            current.append(text)
+        else:
+            target[key] = _Text([current, text])
+            self._texts.append((target, key))
+
+    def _materialize_texts(self) -> None:
+        for target, key in self._texts:
+            target[key] = "".join(target[key])
+        self._texts.clear()
+
+    def _choice(self, index: int, finish_reason: bool = True) -> dict:
+        choices = self._response.setdefault("choices", [])
+        self._response.setdefault("usage", None)
+
+        choice = _indexed_element(choices, index)
+        if finish_reason:
+            choice.setdefault("finish_reason", None)
+        return choice
+
+    def _delta(self, index: int, finish_reason: bool = True) -> dict:
+        return self._choice(index, finish_reason).setdefault("delta", {})
+
+    def _custom_content(self, index: int) -> dict:
+        return self._delta(index).setdefault("custom_content", {})
+
+    def _stage(self, choice_index: int, stage_index: int) -> dict:
+        stages = self._custom_content(choice_index).setdefault("stages", [])
+        return _indexed_element(stages, stage_index)
+
+    def _statistics(self) -> dict:
+        return self._response.setdefault("statistics", {})
+
+    def _add_start_choice(self, chunk: StartChoiceChunk) -> None:
+        self._delta(chunk.choice_index)["role"] = "assistant"
+
+    def _add_end_choice(self, chunk: EndChoiceChunk) -> None:
+        choice = self._choice(chunk.choice_index)
+        choice["finish_reason"] = chunk.finish_reason.value
+        choice.setdefault("delta", {})
+
+    def _add_content(self, chunk: ContentChunk) -> None:
+        delta = self._delta(chunk.choice_index)
+        self._append_text(delta, "content", chunk.content)
+
+    def _add_function_tool_call(self, chunk: FunctionToolCallChunk) -> None:
+        delta = self._delta(chunk.choice_index, finish_reason=False)
+        delta.setdefault("content", None)
+
+        tool_calls = delta.setdefault("tool_calls", [])
+        tool_call = _indexed_element(tool_calls, chunk.call_index)
+        if chunk.id is not None:
+            tool_call["id"] = chunk.id
+        tool_call["type"] = "function"
+
+        function = tool_call.setdefault("function", {})
+        if chunk.name is not None:
+            self._append_text(function, "name", chunk.name)
+        if chunk.arguments is not None:
+            self._append_text(function, "arguments", chunk.arguments)
+
+    def _add_function_call(self, chunk: FunctionCallChunk) -> None:
+        delta = self._delta(chunk.choice_index, finish_reason=False)
+        delta.setdefault("content", None)
+
+        function_call = delta.setdefault("function_call", {})
+        if chunk.name is not None:
+            self._append_text(function_call, "name", chunk.name)
+        if chunk.arguments is not None:
+            self._append_text(function_call, "arguments", chunk.arguments)
+
+    def _add_start_stage(self, chunk: StartStageChunk) -> None:
+        stage = self._stage(chunk.choice_index, chunk.stage_index)
+        self._append_text(stage, "name", chunk.name)
+        stage.setdefault("status", None)
+
+    def _add_finish_stage(self, chunk: FinishStageChunk) -> None:
+        stage = self._stage(chunk.choice_index, chunk.stage_index)
+        stage["status"] = chunk.status.value
+
+    def _add_content_stage(self, chunk: ContentStageChunk) -> None:
+        stage = self._stage(chunk.choice_index, chunk.stage_index)
+        self._append_text(stage, "content", chunk.content)
+        stage.setdefault("status", None)
+
+    def _add_name_stage(self, chunk: NameStageChunk) -> None:
+        stage = self._stage(chunk.choice_index, chunk.stage_index)
+        self._append_text(stage, "name", chunk.name)
+        stage.setdefault("status", None)
+
+    def _add_attachment(self, chunk: AttachmentChunk) -> None:
+        attachments = self._custom_content(chunk.choice_index).setdefault(
+            "attachments", []
+        )
+        _indexed_element(attachments, chunk.attachment_index).update(
+            chunk.attachment_dict(chunk.attachment_index)
+        )
+
+    def _add_attachment_stage(self, chunk: AttachmentStageChunk) -> None:
+        stage = self._stage(chunk.choice_index, chunk.stage_index)
+        attachments = stage.setdefault("attachments", [])
+        _indexed_element(attachments, chunk.attachment_index).update(
+            chunk.attachment_dict(chunk.attachment_index)
+        )
+        stage.setdefault("status", None)
+
+    def _add_state(self, chunk: StateChunk) -> None:
+        custom_content = self._custom_content(chunk.choice_index)
+        custom_content["state"] = merge_recursive(
+            custom_content.get("state"), chunk.state, path=[]
+        )
+
+    def _add_usage(self, chunk: UsageChunk) -> None:
+        self._response["usage"] = chunk.to_dict()["usage"]
+
+    def _add_usage_per_model(self, chunk: UsagePerModelChunk) -> None:
+        usage_per_model = self._statistics().setdefault("usage_per_model", [])
+        _indexed_element(usage_per_model, chunk.index).update(
+            chunk.to_dict()["statistics"]["usage_per_model"][0]
+        )
+
+    def _add_discarded_messages(self, chunk: DiscardedMessagesChunk) -> None:
+        statistics = self._statistics()
+        statistics["discarded_messages"] = merge_recursive(
+            statistics.get("discarded_messages"),
+            chunk.discarded_messages,
+            path=[],
+        )
+
+
+def _indexed_element(elements: List[dict], index: int) -> dict:
+    if index < len(elements):
+        return elements[index]
+
+    elements.extend({"index": idx} for idx in range(len(elements), index))
+    element = {"index": index}
+    elements.append(element)
+    return element
+
+
+_HANDLERS: Dict[type, Callable[[ResponseAccumulator, Any], None]] = {
+    StartChoiceChunk: ResponseAccumulator._add_start_choice,
+    EndChoiceChunk: ResponseAccumulator._add_end_choice,
+    ContentChunk: ResponseAccumulator._add_content,
+    FunctionToolCallChunk: ResponseAccumulator._add_function_tool_call,
+    FunctionCallChunk: ResponseAccumulator._add_function_call,
+    StartStageChunk: ResponseAccumulator._add_start_stage,
+    FinishStageChunk: ResponseAccumulator._add_finish_stage,
+    ContentStageChunk: ResponseAccumulator._add_content_stage,
+    NameStageChunk: ResponseAccumulator._add_name_stage,
+    AttachmentChunk: ResponseAccumulator._add_attachment,
+    AttachmentStageChunk: ResponseAccumulator._add_attachment_stage,
+    StateChunk: ResponseAccumulator._add_state,
+    UsageChunk: ResponseAccumulator._add_usage,
+    UsagePerModelChunk: ResponseAccumulator._add_usage_per_model,
+    DiscardedMessagesChunk: ResponseAccumulator._add_discarded_messages,
+}
@@ -1,6 +1,8 @@
 from typing import Optional, cast, overload
 
 from aidial_sdk.chat_completion.request import Attachment
+from aidial_sdk.pydantic_v1 import ValidationError
+from aidial_sdk.utils.errors import runtime_error
 
 
 @overload
@@ -43,3 +45,22 @@ def _attachment_from_fields(
         reference_url=reference_url,
         reference_type=reference_type,
     )
+
+
+def create_response_attachment(*args, **kwargs) -> Attachment:
+    """
+    Creates an attachment to be sent in a response.
+    Raises a runtime error if the attachment is invalid.
+    """
+
+    try:
+        attachment = create_attachment(*args, **kwargs)
+    except ValidationError as e:
+        raise runtime_error(e.errors()[0]["msg"])
+
+    if attachment.data is None and attachment.url is None:
+        raise runtime_error("Trying to add attachment without data and url")
+    if attachment.data is not None and attachment.url is not None:
+        raise runtime_error("Trying to add attachment with data and url")
+
+    return attachment
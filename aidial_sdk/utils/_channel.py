@@ -0,0 +1,293 @@
+import asyncio
+from collections import deque
+from typing import (
+    Callable,
+    Deque,
+    Generic,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+
+class MemoryBudget:
+    """
+    Limit of the total size of the items buffered in all the channels
+    sharing the budget.
+    """
+
+    _max_bytes: int
+    _used: int
+    _waiters: Set["asyncio.Future[None]"]
+
+    def __init__(self, max_bytes: int) -> None:
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+
+        self._max_bytes = max_bytes
+        self._used = 0
+        self._waiters = set()
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def _exceeded(self, size: int) -> bool:
+        return self._used + size > self._max_bytes
+
+    def _acquire(self, size: int) -> None:
+        self._used += size
+
+    def _release(self, size: int) -> None:
+        if size == 0:
+            return
+
+        self._used -= size
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+class Channel(Generic[T]):
+    """
+    Single-consumer channel of chunks.
+
+    Unlike asyncio.Queue it doesn't require a task per item to wait for
+    either a new item or the producer completion: the consumer waits on
+    a single future which is resolved by the first item put after the wait
+    started, by the channel closing or by the timeout.
+    All the items accumulated by the time of the wake-up are
+    available to the consumer via get_nowait without further suspensions.
+
+    The channel could be bounded by the number of items, by their total size
+    and by a memory budget shared with other channels.
+    put suspends the producer while the channel is full, put_nowait
+    ignores the bounds. A single item is always accepted by an empty channel,
+    so that an item exceeding the bounds doesn't block the producer forever.
+
+    Supports join/task_done protocol of asyncio.Queue to let the producer
+    wait until the consumer has processed all the items.
+    """
+
+    _items: Deque[T]
+    _sizes: Deque[int]
+    _closed: bool
+    _waiter: Optional["asyncio.Future[bool]"]
+    _putters: List["asyncio.Future[None]"]
+    _unfinished: int
+    _finished: asyncio.Event
+    _max_items: Optional[int]
+    _max_bytes: Optional[int]
+    _size: Optional[Callable[[T], int]]
+    _budget: Optional[MemoryBudget]
+    _bytes: int
+    _notify: Optional[Callable[[], None]]
+
+    def __init__(
+        self,
+        max_items: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        size: Optional[Callable[[T], int]] = None,
+        budget: Optional[MemoryBudget] = None,
+        notify: Optional[Callable[[], None]] = None,
+    ) -> None:
+        if (max_bytes is not None or budget is not None) and size is None:
+            raise ValueError(
+                "size function is required to bound the size of the channel"
+            )
+
+        self._items = deque()
+        self._sizes = deque()
+        self._closed = False
+        self._waiter = None
+        self._putters = []
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self._size = size
+        self._budget = budget
+        self._bytes = 0
+        self._notify = notify
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the buffered items"""
+        return self._bytes
+
+    def full(self, size: int = 0) -> bool:
+        """Checks if an item of the given size would exceed the bounds"""
+
+        if not self._items:
+            return False
+        if self._max_items is not None and len(self._items) >= self._max_items:
+            return True
+        if self._max_bytes is not None and self._bytes + size > self._max_bytes:
+            return True
+        return self._budget is not None and self._budget._exceeded(size)
+
+    def put_nowait(self, item: T) -> None:
+        self._put(item, self._item_size(item))
+
+    async def put(self, item: T) -> None:
+        """Puts the item waiting until the channel has room for it"""
+
+        size = self._item_size(item)
+
+        while self.full(size):
+            putter = asyncio.get_running_loop().create_future()
+            self._putters.append(putter)
+            if self._budget is not None:
+                self._budget._waiters.add(putter)
+
+            try:
+                await putter
+            finally:
+                self._putters.remove(putter)
+                if self._budget is not None:
+                    self._budget._waiters.discard(putter)
+
+        self._put(item, size)
+
+    def get_nowait(self) -> T:
+        item = self._items.popleft()
+        if self._size is not None:
+            self._release(self._sizes.popleft())
+        self._wakeup_putters()
+        return item
+
+    def clear(self) -> None:
+        """
+        Drops the buffered items releasing their memory budget.
+        The items are considered processed, so that join doesn't wait
+        for them.
+        """
+
+        self._items.clear()
+        self._release(self._bytes)
+        self._sizes.clear()
+        self._unfinished = 0
+        self._finished.set()
+        self._wakeup_putters()
+
+    def close(self) -> None:
+        """Signals the consumer that the producer has finished"""
+        self._closed = True
+        self._wakeup(True)
+        if self._notify is not None:
+            self._notify()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until there is an item in the channel or the channel is closed.
+        Returns False if the timeout has expired before that.
+        """
+
+        if self._items or self._closed:
+            return True
+
+        loop = asyncio.get_running_loop()
+        waiter = self._waiter = loop.create_future()
+
+        timer = None
+        if timeout is not None:
+            timer = loop.call_later(timeout, self._wakeup, False)
+
+        try:
+            return await waiter
+        finally:
+            self._waiter = None
+            if timer is not None:
+                timer.cancel()
+
+    def task_done(self, count: int = 1) -> None:
+        if count > self._unfinished:
+            raise ValueError("task_done() called too many times")
+
+        self._unfinished -= count
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        if self._unfinished > 0:
+            await self._finished.wait()
+
+    def _item_size(self, item: T) -> int:
+        return self._size(item) if self._size is not None else 0
+
+    def _put(self, item: T, size: int) -> None:
+        self._items.append(item)
+        if self._size is not None:
+            self._sizes.append(size)
+            self._bytes += size
+            if self._budget is not None:
+                self._budget._acquire(size)
+
+        self._unfinished += 1
+        self._finished.clear()
+        self._wakeup(True)
+        if self._notify is not None:
+            self._notify()
+
+    def _release(self, size: int) -> None:
+        self._bytes -= size
+        if self._budget is not None:
+            self._budget._release(size)
+
+    def _wakeup(self, result: bool) -> None:
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(result)
+
+    def _wakeup_putters(self) -> None:
+        for putter in self._putters:
+            if not putter.done():
+                putter.set_result(None)
+
+
+async def interleave(
+    sources: Sequence[Channel[T]], target: Channel[T], ready: asyncio.Event
+) -> None:
+    """
+    Forwards the items of the source channels to the target channel
+    taking a single item from each non-empty source in turn
+    until all the sources are closed and drained.
+
+    The sources must set the ready event on every put and close
+    (see the notify argument of Channel).
+    """
+
+    active = list(sources)
+    while active:
+        ready.clear()
+        forwarded = False
+
+        for source in list(active):
+            if not source.empty():
+                await target.put(source.get_nowait())
+                source.task_done()
+                forwarded = True
+            elif source.closed:
+                active.remove(source)
+
+        if active and not forwarded:
+            await ready.wait()
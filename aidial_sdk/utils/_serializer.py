@@ -0,0 +1,95 @@
+from typing import Any, Callable, Dict, Tuple
+
+from aidial_sdk.chat_completion.chunks import (
+    BaseChunk,
+    ContentChunk,
+    ContentStageChunk,
+    FunctionToolCallChunk,
+)
+from aidial_sdk.utils.json import DEFAULT_JSON_CODEC, JSONCodec
+from aidial_sdk.utils.logging import is_debug_enabled, log_debug
+from aidial_sdk.utils.streaming import format_chunk, to_event
+
+_PLACEHOLDER = "__aidial_sdk_text_placeholder__"
+
+Template = Tuple[str, str]
+
+
+class ChunkSerializer:
+    """
+    Formats chunks as SSE events.
+
+    The events of the most frequent chunks (content, stage content and
+    tool call arguments) differ only in a single string field.
+    The serializer renders such an event once per choice (and stage or
+    tool call) with a placeholder in place of the string and then only
+    escapes the string and concatenates it with the pre-rendered prefix
+    and suffix.
+    The result is identical to the one of format_chunk with the same codec.
+    """
+
+    _add_default_fields: Callable[[Dict[str, Any]], None]
+    _codec: JSONCodec
+    _templates: Dict[Tuple[Any, ...], Template]
+
+    def __init__(
+        self,
+        add_default_fields: Callable[[Dict[str, Any]], None],
+        codec: JSONCodec = DEFAULT_JSON_CODEC,
+    ):
+        self._add_default_fields = add_default_fields
+        self._codec = codec
+        self._templates = {}
+
+    def format(self, chunk: BaseChunk) -> str:
+        if type(chunk) is ContentChunk:
+            key = (ContentChunk, chunk.choice_index)
+            text = chunk.content
+        elif type(chunk) is ContentStageChunk:
+            key = (ContentStageChunk, chunk.choice_index, chunk.stage_index)
+            text = chunk.content
+        elif (
+            type(chunk) is FunctionToolCallChunk
+            and chunk.id is None
+            and chunk.name is None
+            and chunk.arguments is not None
+        ):
+            key = (FunctionToolCallChunk, chunk.choice_index, chunk.call_index)
+            text = chunk.arguments
+        else:
+            return format_chunk(self._to_dict(chunk), self._codec)
+
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = self._create_template(chunk)
+
+        prefix, suffix = template
+        event = prefix + self._codec.dumps_str(text) + suffix
+
+        if is_debug_enabled():
+            log_debug(event[:-2])
+
+        return event
+
+    def _to_dict(self, chunk: BaseChunk) -> Dict[str, Any]:
+        data = chunk.to_dict()
+        self._add_default_fields(data)
+        return data
+
+    def _create_template(self, chunk: BaseChunk) -> Template:
+        sample = _with_text(chunk, _PLACEHOLDER)
+        event = to_event(self._to_dict(sample), self._codec)
+        prefix, _, suffix = event.partition(self._codec.dumps_str(_PLACEHOLDER))
+        return prefix, suffix
+
+
+def _with_text(chunk: BaseChunk, text: str) -> BaseChunk:
+    if isinstance(chunk, ContentChunk):
+        return ContentChunk(text, chunk.choice_index)
+    if isinstance(chunk, ContentStageChunk):
+        return ContentStageChunk(chunk.choice_index, chunk.stage_index, text)
+    if isinstance(chunk, FunctionToolCallChunk):
+        return FunctionToolCallChunk(
+            chunk.choice_index, chunk.call_index, None, None, text
+        )
+    raise TypeError(f"Chunk '{type(chunk).__name__}' has no text field")
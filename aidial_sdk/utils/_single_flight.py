@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Generic, List, TypeVar
+
+from aidial_sdk.deployment.from_request_mixin import FromRequestDeploymentMixin
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.logging import deployment_id
+
+T = TypeVar("T")
+
+_shared_requests = metrics.counter(
+    "aidial_sdk.single_flight.shared",
+    description="Number of requests served by the execution of a concurrent identical request",
+)
+
+# Headers which differ between the otherwise identical requests
+# and don't affect the response
+_PER_REQUEST_HEADERS = {
+    "accept",
+    "accept-encoding",
+    "baggage",
+    "connection",
+    "content-length",
+    "host",
+    "traceparent",
+    "tracestate",
+    "user-agent",
+    "x-request-id",
+}
+
+
+def client_scope(request: FromRequestDeploymentMixin) -> List[Any]:
+    """
+    Credentials (api key and JWT) and forwarded headers of the request,
+    which scope the responses shared between the requests to a client.
+    """
+
+    headers = sorted(
+        (name.lower(), value)
+        for name, value in request.headers.items()
+        if name.lower() not in _PER_REQUEST_HEADERS
+    )
+    return [request.api_key, request.jwt, headers]
+
+
+def request_key(request: FromRequestDeploymentMixin, endpoint: str) -> str:
+    """
+    Hash of the validated request identifying the identical requests
+    of the same client.
+    """
+
+    body = request.dict(
+        exclude={"api_key_secret", "jwt_secret", "headers", "original_request"}
+    )
+
+    data = json.dumps(
+        [endpoint, *client_scope(request), body],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class _Flight(Generic[T]):
+    __slots__ = ("task", "waiters")
+
+    task: "asyncio.Task[T]"
+    waiters: int
+
+    def __init__(self, task: "asyncio.Task[T]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Executes concurrent calls with the same key once.
+
+    The execution runs in a separate task, so it isn't interrupted
+    when the caller which started it is cancelled (e.g. on disconnect)
+    while the others still wait for the result.
+    It's cancelled once all the callers are gone.
+    """
+
+    _flights: Dict[str, _Flight]
+
+    def __init__(self) -> None:
+        self._flights = {}
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            _shared_requests.add(
+                attributes={"deployment": deployment_id.get() or ""}
+            )
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,150 @@
+from time import perf_counter
+from typing import Dict, Optional
+
+from aidial_sdk.telemetry.metrics import metrics
+
+_RATE_BOUNDARIES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+_PREFIX = "aidial_sdk.chat_completion."
+
+_request_parse_duration = metrics.histogram(
+    _PREFIX + "request_parse_duration",
+    description="Time to read and validate the request",
+)
+_time_to_first_chunk = metrics.histogram(
+    _PREFIX + "time_to_first_chunk",
+    description="Time from the arrival of the request "
+    "until the application has generated the first chunk",
+)
+_time_to_first_content = metrics.histogram(
+    _PREFIX + "time_to_first_content",
+    description="Time from the arrival of the request "
+    "until the first content chunk is sent",
+)
+_inter_chunk_gap = metrics.histogram(
+    _PREFIX + "inter_chunk_gap",
+    description="Time between consecutive chunks of the response",
+)
+_duration = metrics.histogram(
+    _PREFIX + "duration",
+    description="Time from the arrival of the request "
+    "until the end of the response",
+)
+_content_rate = metrics.histogram(
+    _PREFIX + "content_chunk_rate",
+    unit="{chunk}/s",
+    description="Number of content chunks per second "
+    "after the first content chunk",
+    boundaries=_RATE_BOUNDARIES,
+)
+_chunks = metrics.counter(
+    _PREFIX + "chunks",
+    unit="{chunk}",
+    description="Number of chunks of the responses",
+)
+_in_flight = metrics.up_down_counter(
+    _PREFIX + "in_flight",
+    unit="{request}",
+    description="Number of the chat completions being served",
+)
+_response_size = metrics.counter(
+    _PREFIX + "response_size",
+    unit="By",
+    description="Size of the SSE events and the non-streaming responses",
+)
+
+
+class StreamMetrics:
+    """
+    Records the latency metrics of a single chat completion.
+    All the times are measured from the start of the request handling.
+    The chat completion is counted in flight from the parsing
+    of the request until finish.
+    """
+
+    _started_at: float
+    _attributes: Dict[str, str]
+    _last_chunk_at: Optional[float]
+    _first_content_at: Optional[float]
+    _last_content_at: float
+    _chunks: int
+    _content_chunks: int
+    _size: int
+    _in_flight: bool
+    _finished: bool
+
+    def __init__(
+        self, deployment_id: str, started_at: Optional[float] = None
+    ) -> None:
+        self._started_at = perf_counter() if started_at is None else started_at
+        self._attributes = {"deployment": deployment_id}
+        self._last_chunk_at = None
+        self._first_content_at = None
+        self._last_content_at = 0.0
+        self._chunks = 0
+        self._content_chunks = 0
+        self._size = 0
+        self._in_flight = False
+        self._finished = False
+
+    def request_parsed(self, stream: bool) -> None:
+        self._attributes["stream"] = "true" if stream else "false"
+        _request_parse_duration.record(
+            perf_counter() - self._started_at, self._attributes
+        )
+        if not self._finished and not self._in_flight:
+            self._in_flight = True
+            _in_flight.add(1, self._attributes)
+
+    def first_chunk(self) -> None:
+        _time_to_first_chunk.record(
+            perf_counter() - self._started_at, self._attributes
+        )
+
+    def chunk(self, size: int = 0, content_chunks: int = 0) -> None:
+        """
+        Records a chunk of the response of the given size in bytes,
+        which carries the given number of content chunks of the application.
+        """
+
+        now = perf_counter()
+
+        if self._last_chunk_at is not None:
+            _inter_chunk_gap.record(now - self._last_chunk_at, self._attributes)
+        self._last_chunk_at = now
+
+        if content_chunks:
+            if self._first_content_at is None:
+                self._first_content_at = now
+                _time_to_first_content.record(
+                    now - self._started_at, self._attributes
+                )
+            self._last_content_at = now
+            self._content_chunks += content_chunks
+
+        self._chunks += 1
+        self._size += size
+
+    def add_size(self, size: int) -> None:
+        self._size += size
+
+    def finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+
+        if self._in_flight:
+            self._in_flight = False
+            _in_flight.add(-1, self._attributes)
+
+        _duration.record(perf_counter() - self._started_at, self._attributes)
+
+        if self._first_content_at is not None and self._content_chunks > 1:
+            elapsed = self._last_content_at - self._first_content_at
+            if elapsed > 0:
+                _content_rate.record(
+                    (self._content_chunks - 1) / elapsed, self._attributes
+                )
+
+        _chunks.add(self._chunks, self._attributes)
+        _response_size.add(self._size, self._attributes)
@@ -1,2 +1,134 @@
+import json
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from json import JSONDecodeError
+from json.encoder import encode_basestring_ascii
+from typing import Any, Literal, Union
+
+
 def remove_nones(d: dict) -> dict:
     return {k: v for k, v in d.items() if v is not None}
+
+
+class JSONCodec(ABC):
+    """
+    Encoder and decoder of JSON used for the request and response bodies.
+    """
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> str:
+        """Compact JSON of the SSE events"""
+
+    @abstractmethod
+    def dumps_str(self, value: str) -> str:
+        """JSON string literal consistent with the output of dumps"""
+
+    @abstractmethod
+    def encode(self, obj: Any) -> bytes:
+        """UTF-8 JSON of the non-streaming response bodies"""
+
+    @abstractmethod
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Parses JSON. Raises JSONDecodeError on invalid input."""
+
+
+class StdlibJSONCodec(JSONCodec):
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+    def dumps_str(self, value: str) -> str:
+        return encode_basestring_ascii(value)
+
+    def encode(self, obj: Any) -> bytes:
+        # The same options as in starlette.responses.JSONResponse
+        return json.dumps(
+            obj,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonJSONCodec(JSONCodec):
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+
+    def dumps(self, obj: Any) -> str:
+        return self._orjson.dumps(obj).decode("utf-8")
+
+    def dumps_str(self, value: str) -> str:
+        return self._orjson.dumps(value).decode("utf-8")
+
+    def encode(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        return self._orjson.loads(data)
+
+
+class MsgspecJSONCodec(JSONCodec):
+    def __init__(self) -> None:
+        import msgspec
+
+        self._msgspec = msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any) -> str:
+        return self._encoder.encode(obj).decode("utf-8")
+
+    def dumps_str(self, value: str) -> str:
+        return self._encoder.encode(value).decode("utf-8")
+
+    def encode(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except self._msgspec.DecodeError as e:
+            doc = data if isinstance(data, str) else repr(data)
+            raise JSONDecodeError(str(e), doc, 0) from e
+
+
+JSONCodecName = Literal["stdlib", "orjson", "msgspec"]
+
+
+def create_json_codec(name: JSONCodecName) -> JSONCodec:
+    if name == "stdlib":
+        return StdlibJSONCodec()
+
+    try:
+        if name == "orjson":
+            return OrjsonJSONCodec()
+        if name == "msgspec":
+            return MsgspecJSONCodec()
+    except ImportError:
+        raise ValueError(
+            f"Missing {name} dependency. "
+            f"Install the package to use the '{name}' JSON codec: pip install {name}"
+        )
+
+    raise ValueError(f"Unknown JSON codec: {name!r}")
+
+
+DEFAULT_JSON_CODEC: JSONCodec = StdlibJSONCodec()
+
+json_codec: ContextVar[JSONCodec] = ContextVar(
+    "json_codec", default=DEFAULT_JSON_CODEC
+)
+
+
+def set_json_codec(codec: JSONCodec) -> None:
+    json_codec.set(codec)
+
+
+def get_json_codec() -> JSONCodec:
+    return json_codec.get()
@@ -3,6 +3,7 @@ import os
 from aidial_sdk.pydantic_v1 import BaseModel
 
 DIAL_SDK_LOG = os.environ.get("DIAL_SDK_LOG", "WARNING").upper()
+DIAL_SDK_LOG_QUEUE_SIZE = int(os.environ.get("DIAL_SDK_LOG_QUEUE_SIZE", "0"))
 
 
 class LogConfig(BaseModel):
@@ -17,6 +18,17 @@ class LogConfig(BaseModel):
             "datefmt": "%Y-%m-%d %H:%M:%S",
             "use_colors": True,
         },
+        "aidial_sdk": {
+            "()": "uvicorn.logging.DefaultFormatter",
+            "fmt": "%(levelprefix)s | %(asctime)s | %(name)s | %(process)d | [%(deployment_id)s] %(message)s",
+            "datefmt": "%Y-%m-%d %H:%M:%S",
+            "use_colors": True,
+        },
+    }
+    filters = {
+        "deployment_id": {
+            "()": "aidial_sdk.utils.logging.DeploymentIdFilter",
+        },
     }
     handlers = {
         "default": {
@@ -24,9 +36,15 @@ class LogConfig(BaseModel):
             "class": "logging.StreamHandler",
             "stream": "ext://sys.stderr",
         },
+        "aidial_sdk": {
+            "formatter": "aidial_sdk",
+            "filters": ["deployment_id"],
+            "class": "logging.StreamHandler",
+            "stream": "ext://sys.stderr",
+        },
     }
     loggers = {
-        "aidial_sdk": {"handlers": ["default"], "level": DIAL_SDK_LOG},
+        "aidial_sdk": {"handlers": ["aidial_sdk"], "level": DIAL_SDK_LOG},
         "uvicorn": {
             "handlers": ["default"],
             "propagate": False,
@@ -0,0 +1,118 @@
+"""
+Non-blocking logging of the aidial_sdk logger.
+
+The records are put to a bounded queue and written by the handlers
+of the logger in a background thread, so that a slow log sink
+(e.g. a stderr pipe under pressure) doesn't block the event loop.
+When the queue is full, the records are dropped and counted.
+"""
+
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+from typing import List, Optional
+
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.logging import DeploymentIdFilter, logger
+
+_dropped_records = metrics.counter(
+    "aidial_sdk.logging.dropped_records",
+    description="Number of log records dropped because the log queue is full",
+)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler which drops the record instead of blocking
+    when the queue is full.
+    The number of the dropped records is reported by a warning record
+    as soon as the queue has room again.
+    """
+
+    dropped: int
+
+    def __init__(self, queue: "Queue[logging.LogRecord]") -> None:
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.dropped:
+            try:
+                self.queue.put_nowait(self._dropped_record())
+                self.dropped = 0
+            except Full:
+                pass
+
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+            _dropped_records.add()
+
+    def _dropped_record(self) -> logging.LogRecord:
+        return logging.LogRecord(
+            logger.name,
+            logging.WARNING,
+            __file__,
+            0,
+            f"Dropped {self.dropped} log records because the log queue is full",
+            None,
+            None,
+        )
+
+
+class _QueueListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Waits for the room in the full queue instead of failing
+        self.queue.put(self._sentinel)  # type: ignore
+
+
+_listener: Optional[QueueListener] = None
+_handlers: List[logging.Handler] = []
+
+
+def enable_log_queue(max_size: int) -> None:
+    """
+    Moves the handlers of the aidial_sdk logger to a background thread
+    behind a queue of at most max_size records.
+    Does nothing if the log queue is already enabled.
+    """
+
+    global _listener, _handlers
+
+    if max_size <= 0:
+        raise ValueError("max_size must be positive")
+
+    if _listener is not None:
+        return
+
+    _handlers = list(logger.handlers)
+
+    queue: "Queue[logging.LogRecord]" = Queue(max_size)
+    handler = DroppingQueueHandler(queue)
+    # The deployment id is taken from the context of the caller
+    handler.addFilter(DeploymentIdFilter())
+
+    _listener = _QueueListener(queue, *_handlers, respect_handler_level=True)
+    logger.handlers = [handler]
+    _listener.start()
+
+
+def disable_log_queue() -> None:
+    """
+    Writes the queued records and restores the synchronous handlers
+    of the aidial_sdk logger.
+    """
+
+    global _listener, _handlers
+
+    if _listener is None:
+        return
+
+    logger.handlers = _handlers
+    _listener.stop()
+    _listener, _handlers = None, []
+
+
+atexit.register(disable_log_queue)
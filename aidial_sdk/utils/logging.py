@@ -1,6 +1,6 @@
 import logging
 from contextvars import ContextVar
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 
 logger = logging.getLogger("aidial_sdk")
 
@@ -13,21 +13,58 @@ def set_log_deployment(new_deployment_id: str):
     deployment_id.set(new_deployment_id)
 
 
+class DeploymentIdFilter(logging.Filter):
+    """
+    Adds the deployment id of the current request to the log records
+    as `deployment_id` attribute, unless the record already has one.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "deployment_id"):
+            record.deployment_id = deployment_id.get()
+        return True
+
+
+def is_debug_enabled() -> bool:
+    """
+    Checks if the debug messages are logged.
+    Used to skip building of the expensive debug messages on the hot path.
+    """
+
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+def _log(
+    level: int, message: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]
+) -> None:
+    # NOTE: the message is formatted with the arguments
+    # only if the record is actually emitted
+    extra = {"deployment_id": deployment_id.get(), **kwargs.pop("extra", {})}
+    # stacklevel=3 attributes the record to the caller of log_*
+    logger.log(level, message, *args, extra=extra, stacklevel=3, **kwargs)
+
+
 def log_info(message: str, *args, **kwargs):
-    logger.info(f"[{deployment_id.get()}] {message}", *args, **kwargs)
+    if logger.isEnabledFor(logging.INFO):
+        _log(logging.INFO, message, args, kwargs)
 
 
 def log_debug(message: str, *args, **kwargs):
-    logger.debug(f"[{deployment_id.get()}] {message}", *args, **kwargs)
+    if logger.isEnabledFor(logging.DEBUG):
+        _log(logging.DEBUG, message, args, kwargs)
 
 
 def log_warning(message: str, *args, **kwargs):
-    logger.warning(f"[{deployment_id.get()}] {message}", *args, **kwargs)
+    if logger.isEnabledFor(logging.WARNING):
+        _log(logging.WARNING, message, args, kwargs)
 
 
 def log_error(message: str, *args, **kwargs):
-    logger.error(f"[{deployment_id.get()}] {message}", *args, **kwargs)
+    if logger.isEnabledFor(logging.ERROR):
+        _log(logging.ERROR, message, args, kwargs)
 
 
 def log_exception(message: str, *args, **kwargs):
-    logger.exception(message, *args, **kwargs)
+    if logger.isEnabledFor(logging.ERROR):
+        kwargs.setdefault("exc_info", True)
+        _log(logging.ERROR, message, args, kwargs)
@@ -1,11 +1,15 @@
-import json
 from typing import Any, AsyncGenerator, Dict
 
-from aidial_sdk.utils.logging import log_debug
+from aidial_sdk.utils.json import DEFAULT_JSON_CODEC, JSONCodec
+from aidial_sdk.utils.logging import is_debug_enabled, log_debug
 from aidial_sdk.utils.merge_chunks import cleanup_indices, merge
 
 DONE_MARKER = "[DONE]"
 
+# SSE comment, which is ignored by the clients,
+# but keeps the idle connection alive for proxies
+KEEP_ALIVE_COMMENT = ": keep-alive\n\n"
+
 
 async def merge_chunks(
     chunk_stream: AsyncGenerator[Any, None]
@@ -21,11 +25,16 @@ async def merge_chunks(
     return response
 
 
-def format_chunk(data: Any):
-    data = "data: " + (
-        json.dumps(data, separators=(",", ":"))
-        if isinstance(data, dict)
-        else data
+def to_event(data: Any, codec: JSONCodec = DEFAULT_JSON_CODEC) -> str:
+    return (
+        "data: "
+        + (codec.dumps(data) if isinstance(data, dict) else data)
+        + "\n\n"
     )
-    log_debug(data)
-    return f"{data}\n\n"
+
+
+def format_chunk(data: Any, codec: JSONCodec = DEFAULT_JSON_CODEC) -> str:
+    event = to_event(data, codec)
+    if is_debug_enabled():
+        log_debug(event[:-2])
+    return event
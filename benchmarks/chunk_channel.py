@@ -0,0 +1,80 @@
+"""
+Per-chunk overhead of passing chunks from the producer (user task)
+to the consumer (response stream):
+
+* queue - asyncio.Queue with a get task and asyncio.wait per chunk
+  (the approach used by Response before the channel was introduced)
+* channel - Channel used by Response now
+
+Run: python -m benchmarks.chunk_channel
+"""
+
+import asyncio
+from typing import Any, List
+
+from aidial_sdk.utils._channel import Channel
+from benchmarks.utils import Measurement, print_table
+
+SIZES = [10_000, 50_000, 100_000]
+
+END = object()
+
+
+async def produce(put, count: int, batch: int):
+    for i in range(count):
+        put(i)
+        if i % batch == 0:
+            await asyncio.sleep(0)
+    put(END)
+
+
+async def consume_queue(count: int, batch: int):
+    queue: asyncio.Queue = asyncio.Queue()
+    user_task = asyncio.create_task(produce(queue.put_nowait, count, batch))
+
+    while True:
+        get_task = asyncio.create_task(queue.get())
+        done = (
+            await asyncio.wait(
+                [get_task, user_task], return_when=asyncio.FIRST_COMPLETED
+            )
+        )[0]
+        item = get_task.result() if get_task in done else await get_task
+        queue.task_done()
+        if item is END:
+            break
+
+
+async def consume_channel(count: int, batch: int):
+    channel: Channel[Any] = Channel()
+    user_task = asyncio.create_task(produce(channel.put_nowait, count, batch))
+    user_task.add_done_callback(lambda _: channel.close())
+
+    while True:
+        await channel.wait()
+        while not channel.empty():
+            item = channel.get_nowait()
+            channel.task_done()
+            if item is END:
+                return
+
+
+async def main():
+    rows: List[List[Any]] = []
+    for batch in [1, 16]:
+        for size in SIZES:
+            row: List[Any] = [size, batch]
+            for consume in [consume_queue, consume_channel]:
+                with Measurement() as m:
+                    await consume(size, batch)
+                row.append(m.wall * 1e6 / size)
+            rows.append(row)
+
+    print_table(
+        ["chunks", "chunks/yield", "queue us/chunk", "channel us/chunk"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
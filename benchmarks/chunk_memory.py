@@ -0,0 +1,135 @@
+"""
+Memory and allocations of the chunks of a 50k-chunk response:
+__slots__ chunks vs chunks with a per-instance __dict__
+and pydantic attachment chunks, measured with tracemalloc.
+
+Run: python -m benchmarks.chunk_memory
+"""
+
+import asyncio
+import timeit
+import tracemalloc
+from typing import Any, Callable, List, Optional
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.chat_completion.chunks import AttachmentChunk, ContentChunk
+from aidial_sdk.pydantic_v1 import BaseModel, root_validator
+from benchmarks.utils import call_app, print_table
+
+CHUNKS = 50_000
+ATTACHMENTS = 10_000
+
+
+class DictContentChunk:
+    """Content chunk with a per-instance __dict__"""
+
+    def __init__(self, content: str, choice_index: int):
+        self.content = content
+        self.choice_index = choice_index
+
+
+class PydanticAttachmentChunk(BaseModel):
+    """Attachment chunk as a pydantic model with a root validator"""
+
+    choice_index: int
+    attachment_index: int
+    type: Optional[str]
+    title: Optional[str]
+    data: Optional[str]
+    url: Optional[str]
+    reference_url: Optional[str]
+    reference_type: Optional[str]
+
+    @root_validator
+    def check_data_or_url(cls, values):
+        if (values.get("data") is None) == (values.get("url") is None):
+            raise ValueError("Exactly one of data and url is expected")
+        return values
+
+
+def retained(create: Callable[[int], Any], count: int) -> float:
+    """Size (KiB) of the objects created and still referenced"""
+
+    tracemalloc.start()
+    objects = [create(i) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size / 1024
+
+
+def construction(create: Callable[[int], Any], count: int) -> float:
+    """Time (us) to create an object"""
+
+    return timeit.timeit(lambda: create(0), number=count) * 1e6 / count
+
+
+class BenchmarkApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            for _ in range(CHUNKS):
+                choice.append_content(" token")
+
+
+async def stream(stream: bool) -> List[Any]:
+    app = DIALApp().add_chat_completion("app", BenchmarkApplication())
+    body = {"messages": [{"role": "user", "content": "Hi"}], "stream": stream}
+
+    # Warm up the app
+    await call_app(app, "/openai/deployments/app/chat/completions", body)
+
+    tracemalloc.start()
+    await call_app(app, "/openai/deployments/app/chat/completions", body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return ["streaming" if stream else "non-streaming", peak / 1024]
+
+
+async def main():
+    content: List[Callable[[int], Any]] = [
+        lambda i: DictContentChunk(" token", 0),
+        lambda i: ContentChunk(" token", 0),
+    ]
+    attachment: List[Callable[[int], Any]] = [
+        lambda i: PydanticAttachmentChunk(
+            choice_index=0, attachment_index=i, url="http://example.com"
+        ),
+        lambda i: AttachmentChunk(
+            choice_index=0, attachment_index=i, url="http://example.com"
+        ),
+    ]
+
+    print_table(
+        ["chunk", "count", "old KiB", "new KiB", "old us", "new us"],
+        [
+            [
+                "content",
+                CHUNKS,
+                *(retained(create, CHUNKS) for create in content),
+                *(construction(create, CHUNKS) for create in content),
+            ],
+            [
+                "attachment",
+                ATTACHMENTS,
+                *(retained(create, ATTACHMENTS) for create in attachment),
+                *(construction(create, ATTACHMENTS) for create in attachment),
+            ],
+        ],
+    )
+
+    print()
+    # NOTE: the streaming peak includes the SSE events
+    # collected by the benchmark client
+    print(f"Peak traced memory of a {CHUNKS}-chunk response")
+    print_table(
+        ["mode", "peak KiB"],
+        [await stream(False), await stream(True)],
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
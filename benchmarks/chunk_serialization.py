@@ -0,0 +1,62 @@
+"""
+Formatting of content chunks as SSE events:
+generic format_chunk vs pre-rendered templates of ChunkSerializer.
+
+Run: python -m benchmarks.chunk_serialization
+"""
+
+import timeit
+from typing import Any, Dict
+
+from aidial_sdk.chat_completion.chunks import (
+    BaseChunk,
+    ContentChunk,
+    ContentStageChunk,
+    FunctionToolCallChunk,
+)
+from aidial_sdk.utils._serializer import ChunkSerializer
+from aidial_sdk.utils.streaming import format_chunk
+from benchmarks.utils import print_table
+
+NUMBER = 100_000
+
+
+def add_default_fields(target: Dict[str, Any]) -> None:
+    target["id"] = "chatcmpl-0123456789"
+    target["model"] = "gpt-4"
+    target["created"] = 1700000000
+    target["object"] = "chat.completion.chunk"
+
+
+def generic(chunk: BaseChunk) -> str:
+    data = chunk.to_dict()
+    add_default_fields(data)
+    return format_chunk(data)
+
+
+def main():
+    serializer = ChunkSerializer(add_default_fields)
+
+    rows = []
+    for chunk in [
+        ContentChunk(" token", 0),
+        ContentStageChunk(0, 0, " token"),
+        FunctionToolCallChunk(0, 0, None, None, '"arg'),
+    ]:
+        generic_time = timeit.timeit(lambda: generic(chunk), number=NUMBER)
+        template_time = timeit.timeit(
+            lambda: serializer.format(chunk), number=NUMBER
+        )
+        rows.append(
+            [
+                type(chunk).__name__,
+                generic_time * 1e6 / NUMBER,
+                template_time * 1e6 / NUMBER,
+            ]
+        )
+
+    print_table(["chunk", "generic us", "template us"], rows)
+
+
+if __name__ == "__main__":
+    main()
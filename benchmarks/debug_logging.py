@@ -0,0 +1,47 @@
+"""
+Cost of the debug logging of a chunk when the debug level is disabled
+(the default) and enabled.
+
+Run: python -m benchmarks.debug_logging
+"""
+
+import logging
+import timeit
+
+from aidial_sdk.chat_completion.choice import Choice
+from aidial_sdk.chat_completion.chunks import ContentChunk
+from aidial_sdk.utils._channel import Channel
+from aidial_sdk.utils.logging import logger
+from benchmarks.utils import print_table
+
+NUMBER = 100_000
+
+
+def measure(level: int) -> float:
+    logger.setLevel(level)
+    choice = Choice(Channel(), 0)
+    chunk = ContentChunk(" token", 0)
+
+    def send():
+        choice.send_chunk(chunk)
+        choice._queue.get_nowait()
+
+    return timeit.timeit(send, number=NUMBER) * 1e6 / NUMBER
+
+
+def main():
+    # Drop the emitted records to measure only the cost of building them
+    logger.handlers = [logging.NullHandler()]
+    logger.propagate = False
+
+    print_table(
+        ["level", "send_chunk us"],
+        [
+            ["WARNING", measure(logging.WARNING)],
+            ["DEBUG", measure(logging.DEBUG)],
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
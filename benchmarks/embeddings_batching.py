@@ -0,0 +1,122 @@
+"""
+Throughput and latency of the embeddings endpoint serving concurrent
+clients with and without micro-batching.
+
+The fake local model runs one call at a time (like a model on a single
+accelerator) and a call costs a fixed overhead plus a small time per input,
+so the batches amortize the overhead.
+
+Run: python -m benchmarks.embeddings_batching
+"""
+
+import asyncio
+import time
+from typing import List, Optional
+
+from aidial_sdk import DIALApp
+from aidial_sdk.embeddings import (
+    BatchConfig,
+    BatchInput,
+    BatchResult,
+    Embeddings,
+    Request,
+    Response,
+)
+from benchmarks.utils import call_app, print_table
+
+CLIENTS = 64
+REQUESTS_PER_CLIENT = 20
+INPUTS_PER_REQUEST = 4
+DIMENSIONS = 256
+
+CALL_OVERHEAD = 0.002
+TIME_PER_INPUT = 0.00005
+
+PATH = "/openai/deployments/fake/embeddings"
+
+
+class FakeModel(Embeddings):
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.calls = 0
+
+    async def _embed(self, inputs: List[BatchInput]) -> List[List[float]]:
+        async with self.lock:
+            self.calls += 1
+            await asyncio.sleep(CALL_OVERHEAD + TIME_PER_INPUT * len(inputs))
+        return [[0.5] * DIMENSIONS for _ in inputs]
+
+    async def embeddings(self, request: Request) -> Response:
+        inputs = request.input if isinstance(request.input, list) else []
+        vectors = await self._embed(inputs)  # type: ignore
+        return Response(
+            data=[
+                {"embedding": vector, "index": index}
+                for index, vector in enumerate(vectors)
+            ],
+            model="fake",
+            usage={"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        )
+
+    async def embeddings_batch(
+        self, request: Request, inputs: List[BatchInput]
+    ) -> BatchResult:
+        return BatchResult(
+            embeddings=await self._embed(inputs),
+            prompt_tokens=[1] * len(inputs),
+            model="fake",
+        )
+
+
+async def measure(name: str, batch: Optional[BatchConfig]) -> List:
+    model = FakeModel()
+    app = DIALApp().add_embeddings("fake", model, batch=batch)
+    body = {"input": [f"text {i}" for i in range(INPUTS_PER_REQUEST)]}
+    latencies: List[float] = []
+
+    async def client() -> None:
+        for _ in range(REQUESTS_PER_CLIENT):
+            started_at = time.perf_counter()
+            status, _ = await call_app(app, PATH, body)
+            assert status == 200
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(CLIENTS)))
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return [
+        name,
+        model.calls,
+        len(latencies) / elapsed,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000,
+    ]
+
+
+async def main():
+    print(
+        f"{CLIENTS} concurrent clients, {REQUESTS_PER_CLIENT} requests each, "
+        f"{INPUTS_PER_REQUEST} inputs per request"
+    )
+    print_table(
+        ["batching", "model calls", "req/s", "p50 ms", "p99 ms"],
+        [
+            await measure("none", None),
+            await measure(
+                "max_wait=1ms", BatchConfig(max_batch_size=256, max_wait=0.001)
+            ),
+            await measure(
+                "max_wait=5ms", BatchConfig(max_batch_size=256, max_wait=0.005)
+            ),
+            await measure(
+                "max_batch_size=32",
+                BatchConfig(max_batch_size=32, max_wait=0.005),
+            ),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Time to build and serialize an embeddings response of 1000 vectors
+of 3072 dimensions: lists of Python floats validated by pydantic
+vs Float32Vector encoded as floats and as base64.
+
+Run: python -m benchmarks.embeddings_encoding
+"""
+
+import random
+import time
+from array import array
+from typing import Any, Callable, List
+
+from aidial_sdk.embeddings import Embedding, Response
+from aidial_sdk.embeddings.response import encode_response
+from aidial_sdk.utils.json import StdlibJSONCodec
+from benchmarks.utils import print_table
+
+VECTORS = 1000
+DIMENSIONS = 3072
+
+CODEC = StdlibJSONCodec()
+
+
+def create_response(vectors: List[Any]) -> Response:
+    return Response(
+        data=[
+            Embedding(embedding=vector, index=index)
+            for index, vector in enumerate(vectors)
+        ],
+        model="benchmark",
+        usage={"prompt_tokens": VECTORS, "total_tokens": VECTORS},
+    )
+
+
+def measure(name: str, fn: Callable[[], bytes]) -> List[Any]:
+    started_at = time.perf_counter()
+    body = fn()
+    elapsed = time.perf_counter() - started_at
+    return [name, elapsed * 1000, len(body) / 1e6]
+
+
+def main():
+    vectors = [
+        array("f", (random.uniform(-1, 1) for _ in range(DIMENSIONS)))
+        for _ in range(VECTORS)
+    ]
+    lists = [vector.tolist() for vector in vectors]
+
+    print(f"{VECTORS} vectors of {DIMENSIONS} dimensions")
+    print_table(
+        ["embeddings", "ms", "MB"],
+        [
+            measure(
+                "list[float], float",
+                lambda: CODEC.encode(create_response(lists).dict()),
+            ),
+            measure(
+                "Float32Vector, float",
+                lambda: encode_response(
+                    create_response(vectors), "float", CODEC
+                ),
+            ),
+            measure(
+                "Float32Vector, base64",
+                lambda: encode_response(
+                    create_response(vectors), "base64", CODEC
+                ),
+            ),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
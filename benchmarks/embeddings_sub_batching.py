@@ -0,0 +1,93 @@
+"""
+Latency of an embeddings request of 1024 inputs served by a fake upstream
+accepting at most 64 inputs per call with an artificial latency
+and transient failures of 10% of the calls, depending on the number
+of the concurrent upstream calls.
+
+Run: python -m benchmarks.embeddings_sub_batching
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, List
+
+from aidial_sdk.embeddings import (
+    Embedding,
+    Request,
+    Response,
+    SubBatchConfig,
+    embed_in_sub_batches,
+)
+from aidial_sdk.embeddings.batching import batch_inputs
+from aidial_sdk.embeddings.request import EmbeddingsRequest
+from aidial_sdk.exceptions import HTTPException as DIALException
+from benchmarks.utils import print_table
+
+INPUTS = 1024
+MAX_INPUTS = 64
+
+LATENCY = 0.05
+LATENCY_PER_INPUT = 0.0005
+FAILURE_RATE = 0.1
+
+
+class FakeUpstream:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.failures = 0
+        self.random = random.Random(1)
+
+    async def embeddings(self, request: Request) -> Response:
+        inputs = batch_inputs(request)
+        assert len(inputs) <= MAX_INPUTS
+
+        self.calls += 1
+        await asyncio.sleep(LATENCY + LATENCY_PER_INPUT * len(inputs))
+        if self.random.random() < FAILURE_RATE:
+            self.failures += 1
+            raise DIALException("Service unavailable", status_code=503)
+
+        return Response(
+            data=[
+                Embedding(embedding=[0.0] * 16, index=index)
+                for index in range(len(inputs))
+            ],
+            model="fake",
+            usage={"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        )
+
+
+async def measure(max_concurrency: int) -> List[Any]:
+    upstream = FakeUpstream()
+    request = EmbeddingsRequest(input=[f"text {i}" for i in range(INPUTS)])
+    config = SubBatchConfig(
+        max_inputs=MAX_INPUTS,
+        max_concurrency=max_concurrency,
+        max_retries=5,
+        retry_delay=0.02,
+    )
+
+    started_at = time.perf_counter()
+    response = await embed_in_sub_batches(
+        request, upstream.embeddings, config  # type: ignore
+    )
+    elapsed = time.perf_counter() - started_at
+
+    assert len(response.data) == INPUTS
+    return [max_concurrency, upstream.calls, upstream.failures, elapsed * 1000]
+
+
+async def main():
+    print(
+        f"{INPUTS} inputs, at most {MAX_INPUTS} per upstream call, "
+        f"{FAILURE_RATE:.0%} of the calls fail"
+    )
+    print_table(
+        ["concurrency", "calls", "retried", "ms"],
+        [await measure(n) for n in (1, 2, 4, 8, 16)],
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""
+JSON codecs on the heaviest payloads of the SDK:
+
+* encoding of a large embeddings response
+* decoding of a chat completion request with a long history
+* end-to-end embeddings and chat completion requests
+
+Run: python -m benchmarks.json_codecs
+"""
+
+import asyncio
+import random
+import timeit
+from typing import Any, List
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.embeddings import Embedding, Embeddings
+from aidial_sdk.embeddings import Request as EmbeddingsRequest
+from aidial_sdk.embeddings import Response as EmbeddingsResponse
+from aidial_sdk.embeddings import Usage
+from aidial_sdk.utils.json import create_json_codec
+from benchmarks.utils import Measurement, call_app, print_table
+
+CODECS = ["stdlib", "orjson", "msgspec"]
+
+EMBEDDINGS = 1000
+DIMENSIONS = 1536
+MESSAGES = 2000
+REPEAT = 5
+
+VECTORS = [
+    [random.uniform(-1, 1) for _ in range(DIMENSIONS)]
+    for _ in range(EMBEDDINGS)
+]
+
+CHAT_REQUEST = {
+    "messages": [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message number {i}. " * 20,
+        }
+        for i in range(MESSAGES)
+    ]
+}
+
+
+class VectorEmbeddings(Embeddings):
+    async def embeddings(
+        self, request: EmbeddingsRequest
+    ) -> EmbeddingsResponse:
+        return EmbeddingsResponse(
+            data=[
+                Embedding.construct(embedding=vector, index=i)
+                for i, vector in enumerate(VECTORS)
+            ],
+            model="dummy",
+            usage=Usage(prompt_tokens=1, total_tokens=1),
+        )
+
+
+class LastMessageApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            choice.append_content(request.messages[-1].text())
+
+
+async def end_to_end(app: DIALApp, path: str, body: Any) -> float:
+    with Measurement() as m:
+        for _ in range(REPEAT):
+            status, _parts = await call_app(app, path, body)
+            assert status == 200
+    return m.wall * 1e3 / REPEAT
+
+
+async def main():
+    embeddings_response = {
+        "data": [
+            {"embedding": vector, "index": i, "object": "embedding"}
+            for i, vector in enumerate(VECTORS)
+        ],
+        "model": "dummy",
+        "object": "list",
+        "usage": {"prompt_tokens": 1, "total_tokens": 1},
+    }
+    chat_request = create_json_codec("stdlib").encode(CHAT_REQUEST)
+
+    rows: List[List[Any]] = []
+    for name in CODECS:
+        try:
+            codec = create_json_codec(name)  # type: ignore
+        except ValueError:
+            rows.append([name, "n/a", "n/a", "n/a", "n/a"])
+            continue
+
+        encode_time = timeit.timeit(
+            lambda: codec.encode(embeddings_response), number=REPEAT
+        )
+        decode_time = timeit.timeit(
+            lambda: codec.loads(chat_request), number=REPEAT
+        )
+
+        app = DIALApp(json_codec=codec)
+        app.add_embeddings("embeddings", VectorEmbeddings())
+        app.add_chat_completion("chat", LastMessageApplication())
+
+        rows.append(
+            [
+                name,
+                encode_time * 1e3 / REPEAT,
+                decode_time * 1e3 / REPEAT,
+                await end_to_end(
+                    app,
+                    "/openai/deployments/embeddings/embeddings",
+                    {"input": "text"},
+                ),
+                await end_to_end(
+                    app,
+                    "/openai/deployments/chat/chat/completions",
+                    CHAT_REQUEST,
+                ),
+            ]
+        )
+
+    print(
+        f"{EMBEDDINGS}x{DIMENSIONS} embeddings response, "
+        f"{MESSAGES} messages chat history"
+    )
+    print_table(
+        [
+            "codec",
+            "encode embeddings ms",
+            "decode chat ms",
+            "embeddings request ms",
+            "chat request ms",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Building of a non-streaming response from the content chunks:
+generic merge of the chunk dictionaries vs ResponseAccumulator.
+
+Run: python -m benchmarks.non_streaming_merge
+"""
+
+import asyncio
+from typing import Any, List
+
+from aidial_sdk.chat_completion.chunks import (
+    BaseChunk,
+    ContentChunk,
+    EndChoiceChunk,
+    FunctionToolCallChunk,
+    StartChoiceChunk,
+)
+from aidial_sdk.chat_completion.enums import FinishReason
+from aidial_sdk.utils._accumulator import ResponseAccumulator
+from aidial_sdk.utils.streaming import merge_chunks
+from benchmarks.utils import Measurement, print_table
+
+SIZES = [1_000, 10_000, 50_000]
+
+
+def create_chunks(size: int) -> List[BaseChunk]:
+    return [
+        StartChoiceChunk(0),
+        *(ContentChunk(" token", 0) for _ in range(size)),
+        FunctionToolCallChunk(0, 0, "id", "name", ""),
+        *(FunctionToolCallChunk(0, 0, None, None, "ar") for _ in range(size)),
+        EndChoiceChunk(FinishReason.STOP, 0),
+    ]
+
+
+async def generic(chunks: List[BaseChunk]) -> Any:
+    async def generate():
+        for chunk in chunks:
+            yield chunk.to_dict()
+
+    return await merge_chunks(generate())
+
+
+async def typed(chunks: List[BaseChunk]) -> Any:
+    accumulator = ResponseAccumulator()
+    for chunk in chunks:
+        accumulator.add(chunk)
+    return accumulator.finish()
+
+
+async def main():
+    rows: List[List[Any]] = []
+    for size in SIZES:
+        chunks = create_chunks(size)
+        row: List[Any] = [len(chunks)]
+        for merge in [generic, typed]:
+            with Measurement() as m:
+                await merge(chunks)
+            row.append(m.wall * 1e3)
+        rows.append(row)
+
+    print_table(["chunks", "merge ms", "accumulator ms"], rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Memory and time per key of the per api key token buckets
+for 100k distinct keys: the flat array layout of RateLimiter
+vs an object per key in a dict keyed by the api key,
+measured with tracemalloc.
+
+Run: python -m benchmarks.rate_limiter_memory
+"""
+
+import asyncio
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from aidial_sdk.limits import RateLimit, RateLimiter
+from benchmarks.utils import print_table
+
+KEYS = 100_000
+
+
+class ObjectBucket:
+    """Token bucket as an object with a per-instance __dict__"""
+
+    def __init__(self, requests: float, tokens: float, updated_at: float):
+        self.requests = requests
+        self.tokens = tokens
+        self.updated_at = updated_at
+
+
+class ObjectRateLimiter:
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self.buckets: Dict[str, ObjectBucket] = {}
+
+    async def acquire(self, api_key: str) -> None:
+        bucket = self.buckets.get(api_key)
+        if bucket is None:
+            bucket = self.buckets[api_key] = ObjectBucket(
+                self.limit.requests_per_minute or 0.0,
+                self.limit.tokens_per_minute or 0.0,
+                time.monotonic(),
+            )
+        bucket.requests -= 1
+
+
+class KeyRequest:
+    """The only part of the request used by the limiter"""
+
+    def __init__(self, api_key: str):
+        self.headers = {"Api-Key": api_key}
+
+
+async def measure(
+    name: str, create_acquire: Callable[[], Any], requests: List[Any]
+) -> List[Any]:
+    """Retained memory and time of the first requests of all the keys"""
+
+    acquire = create_acquire()
+    tracemalloc.start()
+    for request in requests:
+        await acquire(request)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # NOTE: the time is measured separately, since tracing slows down
+    # the allocations
+    acquire = create_acquire()
+    started_at = time.perf_counter()
+    for request in requests:
+        await acquire(request)
+    elapsed = time.perf_counter() - started_at
+
+    return [name, size / KEYS, elapsed * 1e6 / KEYS]
+
+
+async def main():
+    limit = RateLimit(requests_per_minute=60, tokens_per_minute=100_000)
+    api_keys = [f"api-key-{i:032d}" for i in range(KEYS)]
+    requests = [KeyRequest(api_key) for api_key in api_keys]
+
+    print(f"Token buckets of {KEYS} api keys")
+    print_table(
+        ["layout", "bytes/key", "us/acquire"],
+        [
+            await measure(
+                "object per key",
+                lambda: ObjectRateLimiter(limit).acquire,
+                api_keys,
+            ),
+            await measure(
+                "hash table of arrays",
+                lambda: RateLimiter(per_key=limit).acquire,
+                requests,
+            ),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Compares the streaming of a chat completion with and without
+the coalescing of content chunks.
+
+Run: python -m benchmarks.streaming_coalescing
+"""
+
+import asyncio
+from typing import Optional
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import (
+    ChatCompletion,
+    CoalescingConfig,
+    Request,
+    Response,
+)
+from benchmarks.utils import Measurement, call_app, print_table
+
+TOKENS = 20_000
+CONCURRENCY = 10
+
+
+class TokenStreamApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            for i in range(TOKENS):
+                choice.append_content(f"tok{i} ")
+                # Emulate an upstream model producing tokens one by one
+                await asyncio.sleep(0)
+
+
+async def run(coalescing: Optional[CoalescingConfig]):
+    app = DIALApp().add_chat_completion(
+        "bench", TokenStreamApplication(), coalescing=coalescing
+    )
+
+    body = {"messages": [{"role": "user", "content": "hi"}], "stream": True}
+    path = "/openai/deployments/bench/chat/completions"
+
+    with Measurement() as m:
+        results = await asyncio.gather(
+            *(call_app(app, path, body) for _ in range(CONCURRENCY))
+        )
+
+    events = sum(b"".join(parts).count(b"\n\n") for _status, parts in results)
+    tokens = TOKENS * CONCURRENCY
+    return [
+        "on" if coalescing else "off",
+        events,
+        events / m.wall,
+        m.wall,
+        m.cpu * 1e6 / tokens,
+    ]
+
+
+async def main():
+    rows = [
+        await run(None),
+        await run(CoalescingConfig(max_delay=0.02)),
+    ]
+    print_table(
+        ["coalescing", "events", "events/s", "wall s", "cpu us/token"], rows
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
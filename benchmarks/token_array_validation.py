@@ -0,0 +1,74 @@
+"""
+Validation time of an embeddings request of token arrays:
+per-element validation of List[List[StrictInt]]
+vs the bulk checks of the token ids parsed into lists (the default)
+and into TokenArray (add_embeddings(token_arrays=True)).
+
+Run: python -m benchmarks.token_array_validation
+"""
+
+import json
+import random
+import time
+from typing import Any, List, Type, Union
+
+import fastapi
+
+from aidial_sdk.embeddings.request import EmbeddingsRequest, TokenArrayRequest
+from aidial_sdk.pydantic_v1 import BaseModel, SecretStr, StrictInt, StrictStr
+from benchmarks.utils import print_table
+
+INPUTS = 512
+TOKENS = 8192
+
+
+class ListEmbeddingsRequest(BaseModel):
+    """The input of EmbeddingsRequest validated element by element"""
+
+    input: Union[
+        StrictStr, List[StrictStr], List[StrictInt], List[List[StrictInt]]
+    ]
+
+
+def measure(
+    name: str, model: Type[BaseModel], body: Any, **kwargs: Any
+) -> List[Any]:
+    started_at = time.perf_counter()
+    model(**body, **kwargs)
+    elapsed = time.perf_counter() - started_at
+    return [name, elapsed * 1000]
+
+
+def main():
+    body = json.loads(
+        json.dumps(
+            {
+                "input": [
+                    [random.randrange(100_000) for _ in range(TOKENS)]
+                    for _ in range(INPUTS)
+                ]
+            }
+        )
+    )
+
+    print(f"{INPUTS} inputs of {TOKENS} tokens")
+    print_table(
+        ["input", "ms"],
+        [
+            measure("List[List[StrictInt]]", ListEmbeddingsRequest, body),
+            measure("List[List[int]], bulk", EmbeddingsRequest, body),
+            measure(
+                "List[TokenArray]",
+                TokenArrayRequest,
+                body,
+                headers={},
+                original_request=fastapi.Request({"type": "http"}),
+                api_key_secret=SecretStr("key"),
+                deployment_id="",
+            ),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+from fastapi import FastAPI
+
+
+async def call_app(
+    app: FastAPI,
+    path: str,
+    body: Any,
+    headers: Dict[str, str] = {"Api-Key": "BENCHMARK_API_KEY"},
+) -> Tuple[int, List[bytes]]:
+    """
+    Calls the ASGI application directly bypassing the HTTP stack.
+    Returns the status code and the list of the body parts sent by the app.
+    """
+
+    request_body = json.dumps(body).encode()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {
+                "type": "http.request",
+                "body": request_body,
+                "more_body": False,
+            }
+        # Never disconnect: wait until the app finishes the response
+        await asyncio.Event().wait()
+
+    status = 0
+    parts: List[bytes] = []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                parts.append(message["body"])
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            *((k.lower().encode(), v.encode()) for k, v in headers.items()),
+        ],
+        "client": ("127.0.0.1", 12345),
+        "server": ("127.0.0.1", 5000),
+    }
+
+    await app(scope, receive, send)
+    return status, parts
+
+
+class Measurement:
+    wall: float
+    cpu: float
+
+    def __enter__(self) -> "Measurement":
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.process_time() - self._cpu_start
+
+
+def print_table(header: List[str], rows: List[List[Any]]) -> None:
+    cells = [header, *[[_format(cell) for cell in row] for row in rows]]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(header))]
+    for row in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def _format(cell: Any) -> str:
+    if isinstance(cell, float):
+        return f"{cell:.3f}"
+    return str(cell)
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any, Dict, List
+
+from aidial_sdk.chat_completion.chunks import (
+    AttachmentChunk,
+    AttachmentStageChunk,
+    BaseChunk,
+    ContentChunk,
+    ContentStageChunk,
+    DiscardedMessagesChunk,
+    EndChoiceChunk,
+    FinishStageChunk,
+    FunctionCallChunk,
+    FunctionToolCallChunk,
+    NameStageChunk,
+    StartChoiceChunk,
+    StartStageChunk,
+    StateChunk,
+    UsageChunk,
+    UsagePerModelChunk,
+)
+from aidial_sdk.chat_completion.enums import FinishReason, Status
+from aidial_sdk.utils._accumulator import ResponseAccumulator
+from aidial_sdk.utils.streaming import merge_chunks
+
+
+class CustomChunk(BaseChunk):
+    def to_dict(self):
+        return {"choices": [{"index": 1, "delta": {"content": " custom"}}]}
+
+
+CHUNKS: List[BaseChunk] = [
+    StartChoiceChunk(0),
+    ContentChunk("Hello", 0),
+    ContentChunk(", ", 0),
+    StartStageChunk(0, 0, "Stage"),
+    NameStageChunk(0, 0, " name"),
+    ContentStageChunk(0, 0, "stage "),
+    ContentStageChunk(0, 0, "content"),
+    AttachmentStageChunk(
+        choice_index=0,
+        stage_index=0,
+        attachment_index=0,
+        type="text/plain",
+        data="data",
+    ),
+    FinishStageChunk(0, 0, Status.COMPLETED),
+    ContentChunk("world", 0),
+    AttachmentChunk(
+        choice_index=0,
+        attachment_index=0,
+        title="title",
+        url="http://example.com",
+    ),
+    StateChunk(0, {"key": ["value"]}),
+    EndChoiceChunk(FinishReason.STOP, 0),
+    StartChoiceChunk(1),
+    FunctionCallChunk(1, "function", "{"),
+    FunctionCallChunk(1, None, "}"),
+    ContentChunk("text", 1),
+    CustomChunk(),
+    ContentChunk(" more", 1),
+    EndChoiceChunk(FinishReason.FUNCTION_CALL, 1),
+    StartChoiceChunk(2),
+    FunctionToolCallChunk(2, 0, "id0", "f0", None),
+    FunctionToolCallChunk(2, 0, None, None, '{"a":'),
+    FunctionToolCallChunk(2, 0, None, None, " 1}"),
+    FunctionToolCallChunk(2, 1, "id1", "f1", "{}"),
+    EndChoiceChunk(FinishReason.TOOL_CALLS, 2),
+    UsagePerModelChunk(0, "model", 1, 2),
+    UsagePerModelChunk(1, "model", 3, 4),
+    DiscardedMessagesChunk([0, 1]),
+    UsageChunk(4, 6),
+]
+
+
+def add_default_fields(target: Dict[str, Any]) -> None:
+    target["id"] = "id"
+    target["created"] = 0
+    target["object"] = "chat.completion"
+
+
+def merge_dicts(chunks: List[BaseChunk]) -> Dict[str, Any]:
+    async def generate():
+        for index, chunk in enumerate(chunks):
+            data = chunk.to_dict()
+            if index == 0:
+                add_default_fields(data)
+            yield data
+
+    return asyncio.run(merge_chunks(generate()))
+
+
+def accumulate(chunks: List[BaseChunk]) -> Dict[str, Any]:
+    accumulator = ResponseAccumulator(add_default_fields)
+    for chunk in chunks:
+        accumulator.add(chunk)
+    return accumulator.finish()
+
+
+def test_accumulator_matches_merge():
+    expected = merge_dicts(CHUNKS)
+    # The generic merge concatenates "type" of the tool call deltas
+    for tool_call in expected["choices"][2]["message"]["tool_calls"]:
+        tool_call["type"] = "function"
+
+    actual = accumulate(CHUNKS)
+
+    assert actual == expected
+    assert list(actual.keys()) == list(expected.keys())
+    assert actual["choices"][0]["message"]["content"] == "Hello, world"
+    assert actual["choices"][1]["message"]["content"] == "text custom more"
+
+
+def test_accumulator_long_content():
+    chunks: List[BaseChunk] = [StartChoiceChunk(0)]
+    chunks.extend(ContentChunk(str(i % 10), 0) for i in range(100_000))
+    chunks.append(EndChoiceChunk(FinishReason.STOP, 0))
+
+    response = accumulate(chunks)
+
+    content = response["choices"][0]["message"]["content"]
+    assert content == "0123456789" * 10_000
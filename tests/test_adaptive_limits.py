@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.limits import (
+    AdaptiveConcurrencyLimiter,
+    AIMDLimit,
+    GradientLimit,
+    LimitAlgorithm,
+)
+
+CAPACITY = 4
+SERVICE_TIME = 0.02
+
+
+class FakeUpstream:
+    """Serves CAPACITY requests at a time, the rest wait in a queue"""
+
+    def __init__(self) -> None:
+        self._slots = asyncio.Semaphore(CAPACITY)
+
+    async def call(self) -> None:
+        async with self._slots:
+            await asyncio.sleep(SERVICE_TIME)
+
+
+class UpstreamApplication(ChatCompletion):
+    def __init__(self, upstream: FakeUpstream) -> None:
+        self.upstream = upstream
+
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        await self.upstream.call()
+        with response.create_single_choice() as choice:
+            choice.append_content("Test content")
+
+
+async def simulate(algorithm: LimitAlgorithm, clients: int = 32) -> None:
+    limiter = AdaptiveConcurrencyLimiter(algorithm, max_queue_size=clients)
+    upstream = FakeUpstream()
+    app = (
+        DIALApp()
+        .add_chat_completion("warmup", UpstreamApplication(upstream))
+        .add_chat_completion(
+            "test_app", UpstreamApplication(upstream), limiter=limiter
+        )
+    )
+
+    async def post(http: httpx.AsyncClient, deployment: str) -> None:
+        response = await http.post(
+            f"/openai/deployments/{deployment}/chat/completions",
+            json={"messages": [{"role": "user", "content": "Test"}]},
+            headers={"Api-Key": "TEST_API_KEY"},
+        )
+        assert response.status_code == 200
+
+    async def client(http: httpx.AsyncClient, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            await post(http, "test_app")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as http:
+        # The first request is slow regardless of the load
+        await post(http, "warmup")
+
+        deadline = time.monotonic() + 1.0
+        await asyncio.gather(*(client(http, deadline) for _ in range(clients)))
+
+    assert limiter.in_flight == 0
+    assert limiter.queue_size == 0
+
+
+@pytest.mark.parametrize(
+    "algorithm",
+    [
+        GradientLimit(initial_limit=CAPACITY, max_limit=64),
+        AIMDLimit(
+            max_latency=3 * SERVICE_TIME, initial_limit=CAPACITY, max_limit=64
+        ),
+    ],
+    ids=["gradient", "aimd"],
+)
+def test_limit_converges_to_upstream_capacity(algorithm: LimitAlgorithm):
+    asyncio.run(simulate(algorithm))
+
+    # The demand of 32 clients is limited to a few times the capacity
+    assert CAPACITY <= algorithm.limit <= 5 * CAPACITY
+
+
+def test_gradient_limit_grows_without_latency_increase():
+    algorithm = GradientLimit(initial_limit=4, max_limit=64)
+
+    for _ in range(200):
+        algorithm.update(latency=1.0, in_flight=algorithm.limit)
+
+    assert algorithm.limit == 64
+
+
+def test_gradient_limit_is_not_grown_without_demand():
+    algorithm = GradientLimit(initial_limit=10)
+
+    for _ in range(50):
+        algorithm.update(latency=1.0, in_flight=1)
+
+    assert algorithm.limit == 10
+
+
+def test_aimd_limit_backoff():
+    algorithm = AIMDLimit(max_latency=1.0, initial_limit=10)
+
+    algorithm.update(latency=2.0, in_flight=10)
+    assert algorithm.limit == 9
+
+    # The requests admitted before the backoff don't repeat it
+    algorithm.update(latency=2.0, in_flight=9)
+    assert algorithm.limit == 9
+
+    algorithm.update(latency=0.5, in_flight=9)
+    assert algorithm.limit == 10
+
+
+def test_waiters_granted_when_limit_grows():
+    async def run():
+        algorithm = AIMDLimit(max_latency=1.0, initial_limit=1)
+        limiter = AdaptiveConcurrencyLimiter(algorithm, max_queue_size=2)
+
+        permit = await limiter.acquire()
+        waiters = [asyncio.create_task(limiter.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        permit.release()
+        permits = await asyncio.gather(*waiters)
+
+        assert limiter.max_concurrency == 2
+        assert limiter.in_flight == 2
+        for permit in permits:
+            permit.release()
+
+    asyncio.run(run())
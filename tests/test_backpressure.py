@@ -0,0 +1,116 @@
+import json
+from typing import List
+
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import (
+    BufferConfig,
+    ChatCompletion,
+    FinishReason,
+    Request,
+    Response,
+)
+from aidial_sdk.chat_completion.buffering import chunk_size
+from aidial_sdk.chat_completion.chunks import (
+    AttachmentChunk,
+    ContentChunk,
+    EndChoiceChunk,
+)
+
+MAX_CHUNKS = 3
+
+
+class AsyncProducerApplication(ChatCompletion):
+    queue_sizes: List[int]
+
+    def __init__(self):
+        self.queue_sizes = []
+
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        response.set_response_id("test_id")
+        response.set_created(0)
+
+        with response.create_single_choice() as choice:
+            for i in range(20):
+                await choice.aappend_content(str(i))
+                self.queue_sizes.append(response._queue.qsize())
+
+            with choice.create_stage("stage") as stage:
+                await stage.aappend_content("stage content")
+                await stage.aadd_attachment(title="stage", data="data")
+
+            await choice.aadd_attachment(url="http://example.com/image.png")
+            self.queue_sizes.append(response._queue.qsize())
+
+
+def create_app(impl: ChatCompletion, **kwargs) -> TestClient:
+    app = DIALApp(**kwargs).add_chat_completion(
+        "test_app", impl, buffer=BufferConfig(max_chunks=MAX_CHUNKS)
+    )
+    return TestClient(app)
+
+
+def test_async_producer_non_streaming():
+    impl = AsyncProducerApplication()
+    client = create_app(impl)
+
+    response = client.post(
+        "/openai/deployments/test_app/chat/completions",
+        json={"messages": [{"role": "user", "content": "Test"}]},
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"] == {
+        "role": "assistant",
+        "content": "".join(str(i) for i in range(20)),
+        "custom_content": {
+            "stages": [
+                {
+                    "name": "stage",
+                    "content": "stage content",
+                    "attachments": [{"title": "stage", "data": "data"}],
+                    "status": "completed",
+                }
+            ],
+            "attachments": [{"url": "http://example.com/image.png"}],
+        },
+    }
+    assert max(impl.queue_sizes) <= MAX_CHUNKS
+
+
+def test_async_producer_streaming_with_memory_cap():
+    impl = AsyncProducerApplication()
+    client = create_app(impl, max_buffered_bytes=4)
+
+    response = client.post(
+        "/openai/deployments/test_app/chat/completions",
+        json={
+            "messages": [{"role": "user", "content": "Test"}],
+            "stream": True,
+        },
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    assert response.status_code == 200
+
+    content = ""
+    for line in response.iter_lines():
+        if line.startswith("data: {"):
+            delta = json.loads(line[len("data: ") :])["choices"][0]["delta"]
+            content += delta.get("content") or ""
+
+    assert content == "".join(str(i) for i in range(20))
+    assert max(impl.queue_sizes) <= MAX_CHUNKS
+    assert client.app.memory_budget.used == 0  # type: ignore
+
+
+def test_chunk_size_in_utf8_bytes():
+    assert chunk_size(ContentChunk("abc", 0)) == 3
+    assert chunk_size(ContentChunk("привет", 0)) == 12
+    assert chunk_size(ContentChunk("🙂", 0)) == 4
+    assert chunk_size(AttachmentChunk(0, 0, title="é", data="data")) == 6
+    assert chunk_size(EndChoiceChunk(FinishReason.STOP, 0)) == 0
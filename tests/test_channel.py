@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+
+from aidial_sdk.utils._channel import Channel, MemoryBudget
+
+
+def test_single_wakeup_drains_all_items():
+    async def run():
+        channel: Channel[int] = Channel()
+
+        def produce():
+            for i in range(5):
+                channel.put_nowait(i)
+            channel.close()
+
+        asyncio.get_running_loop().call_soon(produce)
+
+        assert await channel.wait()
+
+        items = []
+        while not channel.empty():
+            items.append(channel.get_nowait())
+
+        assert items == [0, 1, 2, 3, 4]
+        assert channel.closed
+
+    asyncio.run(run())
+
+
+def test_wait_timeout():
+    async def run():
+        channel: Channel[int] = Channel()
+
+        assert not await channel.wait(timeout=0.01)
+
+        channel.put_nowait(1)
+        assert await channel.wait(timeout=0.01)
+
+    asyncio.run(run())
+
+
+def test_wait_is_woken_by_close():
+    async def run():
+        channel: Channel[int] = Channel()
+        asyncio.get_running_loop().call_later(0.01, channel.close)
+
+        assert await channel.wait(timeout=10)
+        assert channel.empty()
+
+    asyncio.run(run())
+
+
+def test_join():
+    async def run():
+        channel: Channel[int] = Channel()
+        await channel.join()
+
+        channel.put_nowait(1)
+        channel.put_nowait(2)
+
+        join_task = asyncio.create_task(channel.join())
+        await asyncio.sleep(0)
+        assert not join_task.done()
+
+        channel.task_done(2)
+        await asyncio.wait_for(join_task, timeout=1)
+
+        with pytest.raises(ValueError):
+            channel.task_done()
+
+    asyncio.run(run())
+
+
+def test_clear_finishes_join():
+    async def run():
+        budget = MemoryBudget(max_bytes=10)
+        channel: Channel[str] = Channel(budget=budget, size=len)
+        channel.put_nowait("abc")
+        channel.put_nowait("de")
+
+        join_task = asyncio.create_task(channel.join())
+        await asyncio.sleep(0)
+        assert not join_task.done()
+
+        channel.clear()
+        await asyncio.wait_for(join_task, timeout=1)
+
+        assert channel.empty()
+        assert budget.used == 0
+
+    asyncio.run(run())
+
+
+def test_put_waits_for_room():
+    async def run():
+        channel: Channel[int] = Channel(max_items=2)
+
+        await channel.put(1)
+        await channel.put(2)
+
+        put_task = asyncio.create_task(channel.put(3))
+        await asyncio.sleep(0)
+        assert not put_task.done()
+        assert channel.full()
+
+        assert channel.get_nowait() == 1
+        await asyncio.wait_for(put_task, timeout=1)
+        assert channel.qsize() == 2
+
+    asyncio.run(run())
+
+
+def test_put_respects_max_bytes():
+    async def run():
+        channel: Channel[str] = Channel(max_bytes=10, size=len)
+
+        # An item exceeding the bound is accepted by an empty channel
+        await channel.put("x" * 20)
+        assert channel.nbytes == 20
+
+        put_task = asyncio.create_task(channel.put("y"))
+        await asyncio.sleep(0)
+        assert not put_task.done()
+
+        channel.get_nowait()
+        await asyncio.wait_for(put_task, timeout=1)
+        assert channel.nbytes == 1
+
+    asyncio.run(run())
+
+
+def test_memory_budget_is_shared():
+    async def run():
+        budget = MemoryBudget(10)
+        first: Channel[str] = Channel(size=len, budget=budget)
+        second: Channel[str] = Channel(size=len, budget=budget)
+
+        first.put_nowait("x" * 8)
+        await second.put("y" * 2)
+        assert budget.used == 10
+
+        put_task = asyncio.create_task(second.put("z"))
+        await asyncio.sleep(0)
+        assert not put_task.done()
+
+        first.clear()
+        assert budget.used == 2
+        await asyncio.wait_for(put_task, timeout=1)
+        assert budget.used == 3
+
+    asyncio.run(run())
+
+
+def test_size_is_required_for_byte_bounds():
+    with pytest.raises(ValueError):
+        Channel(max_bytes=10)
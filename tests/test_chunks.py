@@ -0,0 +1,102 @@
+import inspect
+
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response, chunks
+from aidial_sdk.chat_completion.chunks import (
+    AttachmentStageChunk,
+    BaseAttachmentChunk,
+    BaseChunk,
+    EndChunk,
+)
+
+CHUNK_CLASSES = [
+    cls
+    for _, cls in inspect.getmembers(chunks, inspect.isclass)
+    if issubclass(cls, BaseChunk) and not inspect.isabstract(cls)
+]
+
+
+@pytest.mark.parametrize("cls", CHUNK_CLASSES, ids=lambda cls: cls.__name__)
+def test_chunks_have_no_instance_dict(cls):
+    for base in cls.__mro__[:-1]:
+        if base.__module__ == chunks.__name__:
+            assert "__slots__" in base.__dict__, base.__name__
+
+
+def test_end_chunk_has_no_instance_dict():
+    assert not hasattr(EndChunk(), "__dict__")
+
+
+def test_deprecated_attachment_alias():
+    with pytest.warns(DeprecationWarning):
+        from aidial_sdk.chat_completion.chunks import Attachment
+
+    assert Attachment is BaseAttachmentChunk
+    assert issubclass(AttachmentStageChunk, Attachment)
+
+
+def test_attachment_stage_chunk():
+    chunk = AttachmentStageChunk(
+        choice_index=0,
+        stage_index=1,
+        attachment_index=2,
+        title="title",
+        url="http://example.com",
+    )
+
+    assert not hasattr(chunk, "__dict__")
+    assert chunk.to_dict()["choices"][0]["delta"]["custom_content"] == {
+        "stages": [
+            {
+                "index": 1,
+                "attachments": [
+                    {"index": 2, "title": "title", "url": "http://example.com"}
+                ],
+                "status": None,
+            }
+        ]
+    }
+
+
+class InvalidAttachmentApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            kind = request.messages[-1].content
+            if kind == "none":
+                choice.add_attachment(title="title")
+            elif kind == "both":
+                choice.add_attachment(data="data", url="http://example.com")
+            elif kind == "type":
+                choice.add_attachment(data=1)  # type: ignore
+            else:
+                with choice.create_stage("stage") as stage:
+                    stage.add_attachment(title="title")
+
+
+@pytest.mark.parametrize("kind", ["none", "both", "type", "stage"])
+def test_attachment_is_validated(kind: str):
+    client = TestClient(
+        DIALApp().add_chat_completion(
+            "test_app", InvalidAttachmentApplication()
+        )
+    )
+
+    response = client.post(
+        "/openai/deployments/test_app/chat/completions",
+        json={"messages": [{"role": "user", "content": kind}]},
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    assert response.status_code == 500
+    assert response.json() == {
+        "error": {
+            "message": "Error during processing the request",
+            "type": "runtime_error",
+            "code": "500",
+        }
+    }
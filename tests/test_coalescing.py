@@ -0,0 +1,123 @@
+import asyncio
+import json
+from typing import List, Optional
+
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import (
+    ChatCompletion,
+    CoalescingConfig,
+    Request,
+    Response,
+)
+
+TOKENS = [f"token{i} " for i in range(20)]
+
+
+class TokenApplication(ChatCompletion):
+    tokens: List[str]
+
+    def __init__(self, tokens: List[str] = TOKENS):
+        self.tokens = tokens
+
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            for token in self.tokens[:10]:
+                choice.append_content(token)
+                await asyncio.sleep(0)
+
+            with choice.create_stage("stage") as stage:
+                stage.append_content("stage ")
+                stage.append_content("content")
+
+            for token in self.tokens[10:]:
+                choice.append_content(token)
+                await asyncio.sleep(0)
+
+            tool_call = choice.create_function_tool_call("id", "name", "{")
+            tool_call.append_arguments('"a"')
+            tool_call.append_arguments(": 1}")
+
+
+def get_deltas(
+    coalescing: Optional[CoalescingConfig], tokens: List[str] = TOKENS
+) -> List[dict]:
+    dial_app = DIALApp()
+    dial_app.add_chat_completion(
+        "test_app", TokenApplication(tokens), coalescing=coalescing
+    )
+
+    response = TestClient(dial_app).post(
+        "/openai/deployments/test_app/chat/completions",
+        json={
+            "messages": [{"role": "user", "content": "Test content"}],
+            "stream": True,
+        },
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    deltas = []
+    for line in response.iter_lines():
+        if not line or line == "data: [DONE]":
+            continue
+        deltas.append(json.loads(line[6:])["choices"][0]["delta"])
+    return deltas
+
+
+def get_contents(deltas: List[dict]) -> List[str]:
+    return [delta["content"] for delta in deltas if delta.get("content")]
+
+
+def test_coalescing_merges_content():
+    deltas = get_deltas(CoalescingConfig(max_delay=1.0))
+
+    assert get_contents(deltas) == ["".join(TOKENS[:10]), "".join(TOKENS[10:])]
+    assert [
+        delta["custom_content"]["stages"][0]
+        for delta in deltas
+        if "custom_content" in delta
+    ] == [
+        {"index": 0, "name": "stage", "status": None},
+        {"index": 0, "content": "stage content", "status": None},
+        {"index": 0, "status": "completed"},
+    ]
+    assert [
+        delta["tool_calls"][0] for delta in deltas if "tool_calls" in delta
+    ] == [
+        {
+            "index": 0,
+            "id": "id",
+            "type": "function",
+            "function": {"name": "name", "arguments": '{"a": 1}'},
+        }
+    ]
+
+
+def test_coalescing_respects_max_bytes():
+    max_bytes = 2 * len(TOKENS[0])
+    deltas = get_deltas(CoalescingConfig(max_delay=1.0, max_bytes=max_bytes))
+
+    assert get_contents(deltas) == [
+        TOKENS[i] + TOKENS[i + 1] for i in range(0, len(TOKENS), 2)
+    ]
+
+
+def test_max_bytes_counts_utf8_bytes():
+    tokens = [f"токен{i % 10} " for i in range(20)]
+    max_bytes = 2 * len(tokens[0].encode("utf-8"))
+    deltas = get_deltas(
+        CoalescingConfig(max_delay=1.0, max_bytes=max_bytes), tokens
+    )
+
+    assert get_contents(deltas) == [
+        tokens[i] + tokens[i + 1] for i in range(0, len(tokens), 2)
+    ]
+
+
+def test_no_coalescing_by_default():
+    deltas = get_deltas(None)
+
+    assert get_contents(deltas) == TOKENS
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.limits import ConcurrencyLimiter
+from aidial_sdk.telemetry.metrics import metrics
+
+
+class EndlessApplication(ChatCompletion):
+    started: asyncio.Event
+    cancelled: bool
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.cancelled = False
+
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            try:
+                while True:
+                    choice.append_content("token")
+                    self.started.set()
+                    await asyncio.sleep(0.01)
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+
+
+async def stream_and_disconnect(
+    app: DIALApp,
+    impl: EndlessApplication,
+    spec_version: str,
+    fail_on_start: bool = False,
+):
+    body = json.dumps(
+        {"messages": [{"role": "user", "content": "Test"}], "stream": True}
+    ).encode()
+
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await impl.started.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # ASGI servers of spec 2.4+ raise OSError
+        # when sending to a disconnected client
+        if fail_on_start and message["type"] == "http.response.start":
+            await impl.started.wait()
+            raise OSError("Client disconnected")
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": spec_version},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/openai/deployments/test_app/chat/completions",
+        "raw_path": b"/openai/deployments/test_app/chat/completions",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"api-key", b"TEST_API_KEY")],
+    }
+
+    await asyncio.wait_for(app(scope, receive, send), timeout=5)
+    return sent
+
+
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+def test_user_task_is_cancelled_on_disconnect(spec_version: str):
+    counter = metrics.counter("aidial_sdk.chat_completion.cancelled")
+    attributes = {"deployment": "test_app"}
+    before = counter.value(attributes)
+
+    async def run():
+        impl = EndlessApplication()
+        app = DIALApp().add_chat_completion("test_app", impl)
+
+        sent = await stream_and_disconnect(app, impl, spec_version)
+        await asyncio.sleep(0.05)
+
+        assert sent[0]["status"] == 200
+        assert impl.cancelled
+
+    asyncio.run(run())
+
+    assert counter.value(attributes) == before + 1
+
+
+def test_permit_is_released_when_response_start_fails():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrency=2)
+        for _ in range(2):
+            impl = EndlessApplication()
+            app = DIALApp().add_chat_completion(
+                "test_app", impl, limiter=limiter
+            )
+
+            with pytest.raises(ClientDisconnect):
+                await stream_and_disconnect(
+                    app, impl, "2.4", fail_on_start=True
+                )
+            await asyncio.sleep(0.05)
+
+            assert impl.cancelled
+
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
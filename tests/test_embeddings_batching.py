@@ -0,0 +1,216 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import httpx
+import pytest
+
+from aidial_sdk import DIALApp
+from aidial_sdk.embeddings import (
+    BatchConfig,
+    BatchInput,
+    BatchResult,
+    Embeddings,
+)
+from aidial_sdk.embeddings import Request as EmbeddingsRequest
+from aidial_sdk.embeddings import Response as EmbeddingsResponse
+from aidial_sdk.exceptions import InvalidRequestError
+from tests.applications.simple_embeddings import SimpleEmbeddings
+
+
+class BatchEmbeddings(Embeddings):
+    """Embedding of an input is its length"""
+
+    batches: List[List[BatchInput]]
+    error: Optional[Exception]
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.error = None
+
+    async def embeddings(
+        self, request: EmbeddingsRequest
+    ) -> EmbeddingsResponse:
+        return EmbeddingsResponse(
+            data=[{"embedding": [-1.0], "index": 0}],
+            model="single",
+            usage={"prompt_tokens": 1, "total_tokens": 1},
+        )
+
+    async def embeddings_batch(
+        self, request: EmbeddingsRequest, inputs: List[BatchInput]
+    ) -> BatchResult:
+        self.batches.append(inputs)
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return BatchResult(
+            embeddings=[[float(len(value))] for value in inputs],
+            prompt_tokens=[len(value) for value in inputs],
+            model="batch",
+        )
+
+
+PATH = "/openai/deployments/test_app/embeddings"
+
+
+async def post_concurrently(
+    app: DIALApp,
+    bodies: List[dict],
+    api_keys: Optional[List[str]] = None,
+    headers: Optional[List[Dict[str, str]]] = None,
+) -> List[httpx.Response]:
+    api_keys = api_keys or ["TEST_API_KEY"] * len(bodies)
+    headers = headers or [{} for _ in bodies]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        return await asyncio.gather(
+            *(
+                client.post(
+                    PATH, json=body, headers={"Api-Key": api_key, **extra}
+                )
+                for body, api_key, extra in zip(bodies, api_keys, headers)
+            )
+        )
+
+
+def create_app(impl: Embeddings, **kwargs) -> DIALApp:
+    return DIALApp().add_embeddings(
+        "test_app", impl, batch=BatchConfig(**kwargs)
+    )
+
+
+def embeddings(response: httpx.Response) -> List[Dict]:
+    return [
+        {"index": item["index"], "embedding": item["embedding"]}
+        for item in response.json()["data"]
+    ]
+
+
+def test_concurrent_requests_are_batched():
+    impl = BatchEmbeddings()
+    app = create_app(impl, max_wait=0.05)
+
+    responses = asyncio.run(
+        post_concurrently(
+            app,
+            [
+                {"input": "a"},
+                {"input": ["bb", "ccc"]},
+                {"input": [1, 2, 3, 4]},
+                {"input": [[1], [1, 2]]},
+            ],
+        )
+    )
+
+    assert impl.batches == [["a", "bb", "ccc", [1, 2, 3, 4], [1], [1, 2]]]
+    assert [embeddings(response) for response in responses] == [
+        [{"index": 0, "embedding": [1.0]}],
+        [{"index": 0, "embedding": [2.0]}, {"index": 1, "embedding": [3.0]}],
+        [{"index": 0, "embedding": [4.0]}],
+        [{"index": 0, "embedding": [1.0]}, {"index": 1, "embedding": [2.0]}],
+    ]
+    assert [response.json()["usage"] for response in responses] == [
+        {"prompt_tokens": 1, "total_tokens": 1},
+        {"prompt_tokens": 5, "total_tokens": 5},
+        {"prompt_tokens": 4, "total_tokens": 4},
+        {"prompt_tokens": 3, "total_tokens": 3},
+    ]
+    assert responses[0].json()["model"] == "batch"
+
+
+def test_batch_is_bounded_by_size():
+    impl = BatchEmbeddings()
+    app = create_app(impl, max_batch_size=3, max_wait=0.05)
+
+    responses = asyncio.run(
+        post_concurrently(app, [{"input": ["a", "b"]} for _ in range(4)])
+    )
+
+    assert [len(batch) for batch in impl.batches] == [2, 2, 2, 2]
+    assert all(response.status_code == 200 for response in responses)
+
+
+def test_batch_is_bounded_by_tokens():
+    impl = BatchEmbeddings()
+    app = create_app(impl, max_batch_tokens=5, max_wait=0.05)
+
+    asyncio.run(
+        post_concurrently(app, [{"input": [1, 2, 3]} for _ in range(3)])
+    )
+
+    assert [len(batch) for batch in impl.batches] == [1, 1, 1]
+
+
+def test_requests_with_different_parameters_are_not_batched():
+    impl = BatchEmbeddings()
+    app = create_app(impl, max_wait=0.05)
+
+    asyncio.run(
+        post_concurrently(
+            app,
+            [
+                {"input": "a"},
+                {"input": "b", "dimensions": 8},
+                {"input": "c"},
+                {"input": "d"},
+            ],
+            ["KEY_1", "KEY_1", "KEY_1", "KEY_2"],
+        )
+    )
+
+    assert sorted(impl.batches) == [["a", "c"], ["b"], ["d"]]
+
+
+def test_requests_of_different_clients_are_not_batched():
+    impl = BatchEmbeddings()
+    app = create_app(impl, max_wait=0.05)
+
+    asyncio.run(
+        post_concurrently(
+            app,
+            [{"input": value} for value in "abcde"],
+            headers=[
+                {"Authorization": "Bearer JWT_1"},
+                {"Authorization": "Bearer JWT_2"},
+                {"Authorization": "Bearer JWT_1"},
+                {"Authorization": "Bearer JWT_1", "X-Project": "1"},
+                {"Authorization": "Bearer JWT_1", "X-Request-Id": "1"},
+            ],
+        )
+    )
+
+    assert sorted(impl.batches) == [["a", "c", "e"], ["b"], ["d"]]
+
+
+def test_custom_input_is_not_batched():
+    impl = BatchEmbeddings()
+    app = create_app(impl)
+
+    (response,) = asyncio.run(
+        post_concurrently(app, [{"input": [], "custom_input": ["a"]}])
+    )
+
+    assert impl.batches == []
+    assert response.json()["model"] == "single"
+
+
+def test_batch_error_is_returned_to_all_requests():
+    impl = BatchEmbeddings()
+    impl.error = InvalidRequestError("Input is too long")
+    app = create_app(impl, max_wait=0.05)
+
+    responses = asyncio.run(
+        post_concurrently(app, [{"input": "a"}, {"input": "b"}])
+    )
+
+    assert len(impl.batches) == 1
+    assert [response.status_code for response in responses] == [400, 400]
+
+
+def test_batching_requires_batch_implementation():
+    with pytest.raises(ValueError, match="embeddings_batch"):
+        DIALApp().add_embeddings(
+            "test_app", SimpleEmbeddings(), batch=BatchConfig()
+        )
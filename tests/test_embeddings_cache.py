@@ -0,0 +1,229 @@
+import asyncio
+import base64
+import os
+import struct
+from typing import List, Tuple
+
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.embeddings import (
+    Attachment,
+    Embedding,
+    Embeddings,
+    EmbeddingsCache,
+    Request,
+    Response,
+)
+from aidial_sdk.embeddings.vector import Float32Vector
+from aidial_sdk.telemetry.metrics import metrics
+
+
+class LengthEmbeddings(Embeddings):
+    """Embedding of an input is its length (of the url of an attachment)
+    and the requested dimensions"""
+
+    requests: List[Request]
+
+    def __init__(self) -> None:
+        self.requests = []
+
+    async def embeddings(self, request: Request) -> Response:
+        self.requests.append(request)
+
+        inputs: List = (
+            [request.input]
+            if isinstance(request.input, str)
+            or (request.input and isinstance(request.input[0], int))
+            else list(request.input)
+        )
+        inputs += request.custom_input or []
+
+        return Response(
+            data=[
+                Embedding(
+                    embedding=[_length(value), request.dimensions or 0.0],
+                    index=index,
+                )
+                for index, value in enumerate(inputs)
+            ],
+            model="length",
+            usage={"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        )
+
+
+def _length(value) -> float:
+    if isinstance(value, Attachment):
+        return float(len(value.url or ""))
+    return float(len(value))
+
+
+PATH = "/openai/deployments/test_app/embeddings"
+
+
+def create_client(
+    cache: EmbeddingsCache,
+) -> Tuple[TestClient, LengthEmbeddings]:
+    impl = LengthEmbeddings()
+    app = DIALApp().add_embeddings("test_app", impl, cache=cache)
+    return TestClient(app), impl
+
+
+def post(client: TestClient, body: dict) -> dict:
+    response = client.post(PATH, json=body, headers={"Api-Key": "TEST_KEY"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def vectors(response: dict) -> List[List[float]]:
+    return [item["embedding"] for item in response["data"]]
+
+
+def test_only_missing_inputs_reach_implementation(tmp_path):
+    hits = metrics.counter("aidial_sdk.embeddings.cache.hits")
+    before = hits.value({"deployment": "test_app"})
+
+    cache = EmbeddingsCache(str(tmp_path), max_bytes=1 << 20)
+    client, impl = create_client(cache)
+
+    post(client, {"input": ["a", "bb"]})
+    response = post(client, {"input": ["bb", "ccc", "a"]})
+
+    assert [request.input for request in impl.requests] == [
+        ["a", "bb"],
+        ["ccc"],
+    ]
+    assert vectors(response) == [[2.0, 0.0], [3.0, 0.0], [1.0, 0.0]]
+    assert [item["index"] for item in response["data"]] == [0, 1, 2]
+    assert response["usage"] == {"prompt_tokens": 1, "total_tokens": 1}
+    assert hits.value({"deployment": "test_app"}) - before == 2
+
+    response = post(client, {"input": "a"})
+    assert len(impl.requests) == 2
+    assert response["model"] == "length"
+    assert response["usage"] == {"prompt_tokens": 0, "total_tokens": 0}
+    cache.close()
+
+
+def test_token_arrays_and_custom_input(tmp_path):
+    cache = EmbeddingsCache(str(tmp_path), max_bytes=1 << 20)
+    client, impl = create_client(cache)
+    attachment = {"type": "image/png", "url": "files/image.png"}
+
+    post(client, {"input": [[1, 2], [3]], "custom_input": ["abcd"]})
+    response = post(
+        client,
+        {"input": [[3], [4, 5, 6]], "custom_input": ["abcd", attachment]},
+    )
+
+    assert impl.requests[1].input == [[4, 5, 6]]
+    assert impl.requests[1].dict(exclude_none=True)["custom_input"] == [
+        attachment
+    ]
+    assert vectors(response) == [
+        [1.0, 0.0],
+        [3.0, 0.0],
+        [4.0, 0.0],
+        [float(len("files/image.png")), 0.0],
+    ]
+    cache.close()
+
+
+def test_parameters_are_part_of_key(tmp_path):
+    cache = EmbeddingsCache(str(tmp_path), max_bytes=1 << 20)
+    client, impl = create_client(cache)
+
+    post(client, {"input": "a"})
+    response = post(client, {"input": "a", "dimensions": 8})
+    post(client, {"input": "a", "custom_fields": {"type": "query"}})
+
+    assert len(impl.requests) == 3
+    assert vectors(response) == [[1.0, 8.0]]
+
+
+def test_base64_from_cache(tmp_path):
+    cache = EmbeddingsCache(str(tmp_path), max_bytes=1 << 20)
+    client, _ = create_client(cache)
+
+    post(client, {"input": "abc"})
+    response = post(client, {"input": "abc", "encoding_format": "base64"})
+
+    (embedding,) = vectors(response)
+    assert struct.unpack("<2f", base64.b64decode(embedding)) == (3.0, 0.0)
+    cache.close()
+
+
+def test_cache_is_shared_and_persistent(tmp_path):
+    async def _test():
+        first = EmbeddingsCache(str(tmp_path), max_bytes=1 << 20)
+        second = EmbeddingsCache(str(tmp_path), max_bytes=1 << 20)
+
+        await first.set(
+            [(b"a", Float32Vector.frombytes(b"\0" * 4096))], "model"
+        )
+        await second.set([(b"b", Float32Vector.frombytes(b"\1" * 8))], "model")
+        assert await first.get([b"b"]) == [
+            (Float32Vector.frombytes(b"\1" * 8), "model")
+        ]
+        assert await second.get([b"a", b"c"]) == [
+            (Float32Vector.frombytes(b"\0" * 4096), "model"),
+            None,
+        ]
+        first.close()
+        second.close()
+
+        restarted = EmbeddingsCache(str(tmp_path), max_bytes=1 << 20)
+        assert restarted.size == 4104
+        assert await restarted.get([b"b"]) == [
+            (Float32Vector.frombytes(b"\1" * 8), "model")
+        ]
+        restarted.close()
+
+    asyncio.run(_test())
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path):
+    def vector(value: int) -> Float32Vector:
+        return Float32Vector.frombytes(bytes([value]) * 400)
+
+    async def _test():
+        cache = EmbeddingsCache(str(tmp_path), max_bytes=1200)
+        await cache.set([(b"a", vector(1)), (b"b", vector(2))], "model")
+        await cache.set([(b"c", vector(3))], "model")
+        assert (await cache.get([b"a"]))[0] is not None
+
+        await cache.set([(b"d", vector(4))], "model")
+
+        assert await cache.get([b"a", b"b", b"c", b"d"]) == [
+            (vector(1), "model"),
+            None,
+            (vector(3), "model"),
+            (vector(4), "model"),
+        ]
+        assert cache.size == 1200
+
+        # The space of the evicted vectors is reused
+        for i in range(10):
+            await cache.set([(b"e%d" % i, vector(i))], "model")
+        assert os.path.getsize(tmp_path / "vectors.f32") == 1 << 20
+        assert await cache.get([b"e9"]) == [(vector(9), "model")]
+        cache.close()
+
+    asyncio.run(_test())
+
+
+def test_eviction_of_empty_index(tmp_path):
+    async def _test():
+        cache = EmbeddingsCache(str(tmp_path), max_bytes=1000)
+        # The total is out of sync with the index,
+        # e.g. after the index has been removed
+        cache._set_meta("total", 1000)
+
+        vector = Float32Vector.frombytes(b"\1" * 400)
+        await cache.set([(b"a", vector)], "model")
+
+        assert await cache.get([b"a"]) == [(vector, "model")]
+        assert cache.size == 400
+        cache.close()
+
+    asyncio.run(_test())
@@ -0,0 +1,290 @@
+import asyncio
+import sys
+import types
+from typing import List, Optional
+
+import aiohttp
+import httpx
+import pytest
+
+from aidial_sdk.embeddings import (
+    Attachment,
+    Embedding,
+    Request,
+    Response,
+    SubBatchConfig,
+    embed_in_sub_batches,
+    is_transient_error,
+)
+from aidial_sdk.embeddings.batching import batch_inputs
+from aidial_sdk.embeddings.request import EmbeddingsRequest
+from aidial_sdk.embeddings.sub_batching import _retry_delay
+from aidial_sdk.exceptions import HTTPException as DIALException
+from aidial_sdk.exceptions import InvalidRequestError, RateLimitExceededError
+
+
+class FakeUpstream:
+    """Embedding of an input is its length (of the url of an attachment)"""
+
+    calls: List[List]
+    in_flight: int
+    max_in_flight: int
+    failures: List[Exception]
+
+    def __init__(self, failures: Optional[List[Exception]] = None) -> None:
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failures = failures or []
+
+    async def embeddings(self, request: Request) -> Response:
+        inputs: List = batch_inputs(request)
+        inputs += request.custom_input or []
+        self.calls.append(inputs)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures:
+                raise self.failures.pop(0)
+        finally:
+            self.in_flight -= 1
+
+        # The upstream may return the embeddings in any order
+        return Response(
+            data=[
+                Embedding(embedding=[_length(value)], index=index)
+                for index, value in reversed(list(enumerate(inputs)))
+            ],
+            model="upstream",
+            usage={
+                "prompt_tokens": len(inputs),
+                "total_tokens": 2 * len(inputs),
+            },
+        )
+
+
+def _length(value) -> float:
+    if isinstance(value, Attachment):
+        return float(len(value.url or ""))
+    return float(len(value))
+
+
+def embed(request: EmbeddingsRequest, upstream: FakeUpstream, **kwargs):
+    config = SubBatchConfig(retry_delay=0.001, **kwargs)
+    return asyncio.run(
+        embed_in_sub_batches(request, upstream.embeddings, config)  # type: ignore
+    )
+
+
+def embeddings(response: Response) -> List:
+    return [(item.index, item.embedding) for item in response.data]
+
+
+def test_inputs_are_split_and_reassembled():
+    upstream = FakeUpstream()
+    request = EmbeddingsRequest(input=["a", "bb", "ccc", "dddd", "eeeee"])
+
+    response = embed(request, upstream, max_inputs=2, max_concurrency=2)
+
+    assert upstream.calls == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+    assert upstream.max_in_flight == 2
+    assert embeddings(response) == [
+        (0, [1.0]),
+        (1, [2.0]),
+        (2, [3.0]),
+        (3, [4.0]),
+        (4, [5.0]),
+    ]
+    assert response.usage.prompt_tokens == 5
+    assert response.usage.total_tokens == 10
+    assert response.model == "upstream"
+
+
+def test_inputs_are_split_by_tokens():
+    upstream = FakeUpstream()
+    request = EmbeddingsRequest(input=[[1] * 3, [2] * 3, [3] * 5, [4] * 2])
+
+    response = embed(request, upstream, max_tokens=6)
+
+    assert [len(call) for call in upstream.calls] == [2, 1, 1]
+    assert [embedding for _, embedding in embeddings(response)] == [
+        [3.0],
+        [3.0],
+        [5.0],
+        [2.0],
+    ]
+
+
+def test_custom_input_follows_input():
+    upstream = FakeUpstream()
+    attachment = Attachment(type="image/png", url="image.png")
+    request = EmbeddingsRequest(
+        input=["a", "bb"], custom_input=["ccc", attachment]
+    )
+
+    response = embed(request, upstream, max_inputs=3)
+
+    assert upstream.calls == [["a", "bb", "ccc"], [attachment]]
+    assert [embedding for _, embedding in embeddings(response)] == [
+        [1.0],
+        [2.0],
+        [3.0],
+        [9.0],
+    ]
+
+
+def test_single_batch_is_passed_as_is():
+    upstream = FakeUpstream()
+
+    response = embed(EmbeddingsRequest(input="text"), upstream)
+
+    assert upstream.calls == [["text"]]
+    assert embeddings(response) == [(0, [4.0])]
+
+
+def test_transient_failures_are_retried():
+    upstream = FakeUpstream(
+        failures=[
+            RateLimitExceededError("Too many requests", retry_after=0),
+            DIALException("Overloaded", status_code=503),
+        ]
+    )
+    request = EmbeddingsRequest(input=["a", "b", "c", "d"])
+
+    response = embed(request, upstream, max_inputs=2, max_concurrency=1)
+
+    assert len(upstream.calls) == 4
+    assert len(response.data) == 4
+
+
+def test_retries_are_limited():
+    upstream = FakeUpstream(
+        failures=[DIALException("Overloaded", status_code=503)] * 3
+    )
+
+    with pytest.raises(DIALException, match="Overloaded"):
+        embed(EmbeddingsRequest(input=["a"]), upstream, max_retries=2)
+
+    assert len(upstream.calls) == 3
+
+
+def test_non_transient_failure_cancels_other_batches():
+    upstream = FakeUpstream(failures=[InvalidRequestError("Invalid input")])
+    request = EmbeddingsRequest(input=["a", "b", "c", "d"])
+
+    with pytest.raises(InvalidRequestError, match="Invalid input"):
+        embed(request, upstream, max_inputs=1, max_concurrency=2)
+
+    assert len(upstream.calls) == 2
+
+
+def test_cancellation_cancels_all_batches():
+    upstream = FakeUpstream()
+    request = EmbeddingsRequest(input=["a", "b", "c", "d"])
+
+    async def run():
+        task = asyncio.create_task(
+            embed_in_sub_batches(
+                request,
+                upstream.embeddings,
+                SubBatchConfig(max_inputs=1, max_concurrency=2),
+            )
+        )
+        await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert upstream.in_flight == 0
+        await asyncio.sleep(0.02)
+        assert len(upstream.calls) == 2
+
+    asyncio.run(run())
+
+
+class FakeOpenAIError(Exception):
+    def __init__(self, status_code: int, headers: dict):
+        self.status_code = status_code
+        self.response = httpx.Response(status_code, headers=headers)
+
+
+class FakeOpenAIConnectionError(Exception):
+    pass
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    module = types.ModuleType("openai")
+    module.APIStatusError = FakeOpenAIError  # type: ignore
+    module.APIConnectionError = FakeOpenAIConnectionError  # type: ignore
+    monkeypatch.setitem(sys.modules, "openai", module)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        RateLimitExceededError("Too many requests", retry_after=2),
+        httpx.HTTPStatusError(
+            "Too many requests",
+            request=httpx.Request("POST", "http://upstream"),
+            response=httpx.Response(429, headers={"retry-after": "2"}),
+        ),
+        aiohttp.ClientResponseError(
+            request_info=None,  # type: ignore
+            history=(),
+            status=429,
+            headers={"Retry-After": "2"},  # type: ignore
+        ),
+        FakeOpenAIError(429, {"Retry-After": "2"}),
+    ],
+)
+def test_retry_after_of_upstream_clients(fake_openai, error: Exception):
+    assert is_transient_error(error)
+    assert _retry_delay(error, 0.01) == 2.0
+
+
+def test_openai_errors_are_transient(fake_openai):
+    assert is_transient_error(FakeOpenAIError(503, {}))
+    assert not is_transient_error(FakeOpenAIError(400, {}))
+    assert is_transient_error(FakeOpenAIConnectionError())
+
+
+@pytest.mark.parametrize(
+    "error, transient",
+    [
+        (DIALException("Overloaded", status_code=503), True),
+        (InvalidRequestError("Invalid input"), False),
+        (asyncio.TimeoutError(), True),
+        (ConnectionResetError(), True),
+        (httpx.ConnectTimeout("Timeout"), True),
+        (httpx.ReadError("Connection reset"), True),
+        (
+            httpx.HTTPStatusError(
+                "Too many requests",
+                request=httpx.Request("POST", "http://upstream"),
+                response=httpx.Response(429),
+            ),
+            True,
+        ),
+        (
+            httpx.HTTPStatusError(
+                "Bad request",
+                request=httpx.Request("POST", "http://upstream"),
+                response=httpx.Response(400),
+            ),
+            False,
+        ),
+        (aiohttp.ServerDisconnectedError(), True),
+        (
+            aiohttp.ClientResponseError(
+                request_info=None, history=(), status=502  # type: ignore
+            ),
+            True,
+        ),
+        (ValueError("Invalid"), False),
+    ],
+)
+def test_transient_errors(error: Exception, transient: bool):
+    assert is_transient_error(error) == transient
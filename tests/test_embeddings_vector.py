@@ -0,0 +1,99 @@
+import base64
+import math
+import struct
+from array import array
+
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.embeddings import (
+    Embedding,
+    Embeddings,
+    Float32Vector,
+    Request,
+    Response,
+)
+from aidial_sdk.pydantic_v1 import ValidationError
+
+VALUES = [0.1, -2.5, 1e-5, 3.0]
+
+
+class VectorEmbeddings(Embeddings):
+    async def embeddings(self, request: Request) -> Response:
+        return Response(
+            data=[
+                Embedding(embedding=array("f", VALUES), index=0),
+                Embedding(embedding=array("d", VALUES[::-1]), index=1),
+            ],
+            model="vector",
+            usage={"prompt_tokens": 2, "total_tokens": 2},
+        )
+
+
+def post(encoding_format: str) -> dict:
+    app = DIALApp().add_embeddings("test_app", VectorEmbeddings())
+    response = TestClient(app).post(
+        "/openai/deployments/test_app/embeddings",
+        json={"input": ["a", "b"], "encoding_format": encoding_format},
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def float32(values):
+    return list(array("f", values))
+
+
+def test_float_encoding():
+    response = post("float")
+
+    assert [float32(item["embedding"]) for item in response["data"]] == [
+        float32(VALUES),
+        float32(VALUES[::-1]),
+    ]
+    assert [item["index"] for item in response["data"]] == [0, 1]
+    assert response["usage"] == {"prompt_tokens": 2, "total_tokens": 2}
+
+
+def test_base64_encoding():
+    response = post("base64")
+
+    decoded = [
+        list(struct.unpack("<4f", base64.b64decode(item["embedding"])))
+        for item in response["data"]
+    ]
+    assert decoded == [float32(VALUES), float32(VALUES[::-1])]
+
+
+def test_float_values_round_trip():
+    values = array("f", [math.pi, -1 / 3, 1e-30, 3.4e38, 0.0])
+    vector = Float32Vector(values)
+
+    assert float32(eval(vector.to_json())) == list(values)
+
+
+def test_non_finite_values_are_rejected():
+    with pytest.raises(ValueError, match="not JSON compliant"):
+        Float32Vector(array("f", [1.0, math.nan])).to_json()
+
+
+def test_multidimensional_buffer():
+    view = memoryview(array("f", VALUES)).cast("B").cast("f", (2, 2))
+
+    assert Float32Vector(view).tolist() == float32(VALUES)
+
+
+def test_non_float_buffer_is_rejected():
+    with pytest.raises(ValidationError):
+        Embedding(embedding=array("i", [1, 2]), index=0)
+
+
+def test_numpy_array():
+    np = pytest.importorskip("numpy")
+
+    vector = Float32Vector(np.array(VALUES, dtype=np.float32))
+
+    assert vector.tolist() == float32(VALUES)
+    assert Embedding(embedding=np.array(VALUES), index=0).embedding == vector
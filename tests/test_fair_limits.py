@@ -0,0 +1,156 @@
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+import pytest
+from fastapi import Request as FastAPIRequest
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.exceptions import RateLimitExceededError
+from aidial_sdk.limits import ConcurrencyLimiter, FairConcurrencyLimiter
+from aidial_sdk.limits.base import Limiter
+
+SERVICE_TIME = 0.01
+
+
+def request_with_api_key(api_key: str) -> FastAPIRequest:
+    return FastAPIRequest(
+        {"type": "http", "headers": [(b"api-key", api_key.encode())]}
+    )
+
+
+async def admission_order(
+    limiter: FairConcurrencyLimiter, api_keys: List[str]
+) -> List[str]:
+    """Queues the requests behind a busy slot and returns the order of their admission"""
+
+    busy = await limiter.acquire(request_with_api_key("busy"))
+    order: List[str] = []
+
+    async def serve(api_key: str) -> None:
+        permit = await limiter.acquire(request_with_api_key(api_key))
+        order.append(api_key)
+        permit.release()
+
+    tasks = [asyncio.create_task(serve(api_key)) for api_key in api_keys]
+    await asyncio.sleep(0)
+    assert limiter.queue_size == len(api_keys)
+
+    busy.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_round_robin_between_api_keys():
+    limiter = FairConcurrencyLimiter(max_concurrency=1, max_queue_size=10)
+    order = asyncio.run(admission_order(limiter, ["a"] * 4 + ["b"] * 2))
+
+    assert order == ["a", "b", "a", "b", "a", "a"]
+    assert limiter.queue_size == 0
+
+
+def test_weighted_round_robin():
+    limiter = FairConcurrencyLimiter(
+        max_concurrency=1, max_queue_size=10, weights={"a": 2}
+    )
+    order = asyncio.run(admission_order(limiter, ["a"] * 4 + ["b"] * 4))
+
+    assert order == ["a", "a", "b", "a", "a", "b", "b", "b"]
+
+
+def test_full_queue_evicts_heaviest_client():
+    async def run():
+        limiter = FairConcurrencyLimiter(max_concurrency=1, max_queue_size=3)
+        await limiter.acquire(request_with_api_key("a"))
+
+        heavy = [
+            asyncio.create_task(limiter.acquire(request_with_api_key("a")))
+            for _ in range(3)
+        ]
+        light = asyncio.create_task(limiter.acquire(request_with_api_key("b")))
+        await asyncio.sleep(0)
+
+        with pytest.raises(RateLimitExceededError):
+            await heavy[-1]
+        assert not light.done()
+        assert limiter.queue_size == 3
+
+        # The queue of the light client isn't longer than the others
+        with pytest.raises(RateLimitExceededError):
+            await limiter.acquire(request_with_api_key("b"))
+
+        for task in [*heavy[:-1], light]:
+            task.cancel()
+        await asyncio.gather(*heavy[:-1], light, return_exceptions=True)
+        assert limiter.queue_size == 0
+
+    asyncio.run(run())
+
+
+class UpstreamApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        await asyncio.sleep(SERVICE_TIME)
+        with response.create_single_choice() as choice:
+            choice.append_content("Test content")
+
+
+async def light_client_latencies(limiter: Limiter) -> List[float]:
+    """
+    Latencies of a client sending a request at a time
+    while another client floods the deployment.
+    """
+
+    app = DIALApp().add_chat_completion(
+        "test_app", UpstreamApplication(), limiter=limiter
+    )
+    deadline = time.monotonic() + 0.5
+
+    async def post(http: httpx.AsyncClient, api_key: str) -> float:
+        started_at = time.monotonic()
+        response = await http.post(
+            "/openai/deployments/test_app/chat/completions",
+            json={"messages": [{"role": "user", "content": "Test"}]},
+            headers={"Api-Key": api_key},
+        )
+        assert response.status_code == 200
+        return time.monotonic() - started_at
+
+    async def heavy_client(http: httpx.AsyncClient) -> None:
+        while time.monotonic() < deadline:
+            await post(http, "heavy")
+
+    async def light_client(http: httpx.AsyncClient) -> List[float]:
+        latencies = []
+        while time.monotonic() < deadline:
+            latencies.append(await post(http, "light"))
+        return latencies
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as http:
+        heavy = [heavy_client(http) for _ in range(20)]
+        *_, latencies = await asyncio.gather(*heavy, light_client(http))
+
+    return latencies
+
+
+def test_heavy_client_does_not_delay_light_client():
+    fifo = asyncio.run(
+        light_client_latencies(
+            ConcurrencyLimiter(max_concurrency=2, max_queue_size=32)
+        )
+    )
+    fair = asyncio.run(
+        light_client_latencies(
+            FairConcurrencyLimiter(max_concurrency=2, max_queue_size=32)
+        )
+    )
+
+    # The light client waits for a slot instead of the whole queue
+    assert max(fair) < statistics.median(fifo)
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import time
+from typing import List
+
+import fastapi
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import (
+    BufferConfig,
+    ChatCompletion,
+    Choice,
+    Request,
+    Response,
+)
+from aidial_sdk.pydantic_v1 import SecretStr
+from aidial_sdk.utils._channel import MemoryBudget
+
+
+class ConcurrentApplication(ChatCompletion):
+    delay: float
+    max_concurrency: int
+    running: int
+    max_running: int
+
+    def __init__(self, delay: float = 0.0, max_concurrency: int = 128):
+        self.delay = delay
+        self.max_concurrency = max_concurrency
+        self.running = 0
+        self.max_running = 0
+
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        response.set_response_id("test_id")
+        response.set_created(0)
+
+        async def generate(choice: Choice) -> None:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            try:
+                await asyncio.sleep(self.delay)
+                # A burst of chunks without suspensions
+                for i in range(3):
+                    choice.append_content(f"{choice.index}:{i};")
+            finally:
+                self.running -= 1
+
+        await response.generate_choices(
+            request.n or 1, generate, self.max_concurrency
+        )
+        response.set_usage(1, 2)
+
+
+class FailingApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        async def generate(choice: Choice) -> None:
+            if choice.index == 1:
+                raise ValueError("Failed")
+            await asyncio.sleep(10)
+
+        await response.generate_choices(request.n or 1, generate)
+
+
+def post(impl: ChatCompletion, n: int, stream: bool):
+    client = TestClient(DIALApp().add_chat_completion("test_app", impl))
+    return client.post(
+        "/openai/deployments/test_app/chat/completions",
+        json={
+            "messages": [{"role": "user", "content": "Test"}],
+            "n": n,
+            "stream": stream,
+        },
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+
+def parse_stream(lines: List[str]) -> List[dict]:
+    return [
+        json.loads(line[len("data: ") :])
+        for line in lines
+        if line.startswith("data: {")
+    ]
+
+
+def test_choices_are_interleaved():
+    response = post(ConcurrentApplication(), n=3, stream=True)
+    assert response.status_code == 200
+
+    chunks = parse_stream(list(response.iter_lines()))
+    contents = [
+        chunk["choices"][0]["delta"]["content"]
+        for chunk in chunks
+        if chunk["choices"] and chunk["choices"][0]["delta"].get("content")
+    ]
+
+    assert contents == [f"{c}:{i};" for i in range(3) for c in range(3)]
+
+    finish_reasons = {
+        chunk["choices"][0]["index"]: chunk["choices"][0]["finish_reason"]
+        for chunk in chunks
+        if chunk["choices"] and chunk["choices"][0]["finish_reason"]
+    }
+    assert finish_reasons == {0: "stop", 1: "stop", 2: "stop"}
+    assert chunks[-1]["usage"] == {
+        "prompt_tokens": 1,
+        "completion_tokens": 2,
+        "total_tokens": 3,
+    }
+
+
+def test_choices_are_generated_concurrently():
+    impl = ConcurrentApplication(delay=0.2)
+
+    start = time.perf_counter()
+    response = post(impl, n=128, stream=False)
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    choices = response.json()["choices"]
+    assert [choice["index"] for choice in choices] == list(range(128))
+    assert choices[5]["message"]["content"] == "5:0;5:1;5:2;"
+    assert impl.max_running == 128
+    assert elapsed < 2
+
+
+def test_concurrency_cap():
+    impl = ConcurrentApplication(delay=0.01, max_concurrency=2)
+
+    response = post(impl, n=5, stream=False)
+
+    assert response.status_code == 200
+    assert len(response.json()["choices"]) == 5
+    assert impl.max_running == 2
+
+
+def test_more_choices_than_requested():
+    class Application(ChatCompletion):
+        async def chat_completion(
+            self, request: Request, response: Response
+        ) -> None:
+            async def generate(choice: Choice) -> None:
+                choice.append_content("Test")
+
+            await response.generate_choices(3, generate)
+
+    response = post(Application(), n=2, stream=False)
+    assert response.status_code == 500
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_failed_choice(stream: bool):
+    response = post(FailingApplication(), n=3, stream=stream)
+
+    if stream:
+        assert '"Error during processing the request"' in response.text
+        assert response.text.endswith("data: [DONE]\n\n")
+    else:
+        assert response.status_code == 500
+
+
+def test_cancelled_generation_releases_memory_budget():
+    request = Request(
+        headers={},
+        original_request=fastapi.Request({"type": "http"}),
+        api_key_secret=SecretStr("dummy_key"),
+        deployment_id="",
+        messages=[],
+        n=2,
+    )
+    budget = MemoryBudget(1 << 20)
+
+    async def _test():
+        response = Response(
+            request, buffer=BufferConfig(max_chunks=5), memory_budget=budget
+        )
+
+        async def generate(choice: Choice) -> None:
+            for _ in range(100):
+                choice.append_content("x" * 100)
+            await asyncio.sleep(10)
+
+        task = asyncio.create_task(response.generate_choices(2, generate))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        response._queue.clear()
+        assert budget.used == 0
+
+    asyncio.run(_test())
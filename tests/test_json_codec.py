@@ -0,0 +1,94 @@
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.utils.json import StdlibJSONCodec, create_json_codec
+from tests.applications.echo import EchoApplication
+from tests.applications.simple_embeddings import SimpleEmbeddings
+
+CODECS = ["stdlib", "orjson", "msgspec"]
+
+
+def create_app(codec: str) -> DIALApp:
+    try:
+        app = DIALApp(json_codec=codec)  # type: ignore
+    except ValueError:
+        pytest.skip(f"{codec} isn't installed")
+
+    app.add_chat_completion("chat", EchoApplication(0))
+    app.add_embeddings("embeddings", SimpleEmbeddings())
+    return app
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_chat_completion(codec: str):
+    client = TestClient(create_app(codec))
+    content = 'Unicode "привет" 😀'
+
+    for stream in [False, True]:
+        response = client.post(
+            "/openai/deployments/chat/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": content}],
+                "stream": stream,
+            },
+            headers={"Api-Key": "TEST_API_KEY"},
+        )
+        assert response.status_code == 200
+
+        if stream:
+            events = [
+                json.loads(line[6:])
+                for line in response.iter_lines()
+                if line.startswith("data: {")
+            ]
+            assert events[1]["choices"][0]["delta"]["content"] == content
+        else:
+            message = response.json()["choices"][0]["message"]
+            assert message["content"] == content
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_embeddings(codec: str):
+    client = TestClient(create_app(codec))
+
+    response = client.post(
+        "/openai/deployments/embeddings/embeddings",
+        json={"input": ["a", "b"]},
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    assert response.status_code == 200
+    assert [item["embedding"] for item in response.json()["data"]] == [
+        [0.0],
+        [1.0],
+    ]
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_invalid_request_body(codec: str):
+    client = TestClient(create_app(codec))
+
+    response = client.post(
+        "/openai/deployments/chat/chat/completions",
+        content=b"{not json",
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    assert response.status_code == 400
+    error = response.json()["error"]
+    assert error["message"].startswith("The request body isn't valid JSON: ")
+
+
+def test_stdlib_codec_matches_starlette():
+    from starlette.responses import JSONResponse
+
+    content = {"text": "привет", "values": [1.5, None, True]}
+    assert StdlibJSONCodec().encode(content) == JSONResponse(content).body
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        create_json_codec("unknown")  # type: ignore
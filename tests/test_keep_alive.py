@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.exceptions import InvalidRequestError
+
+
+class SlowApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        response.set_response_id("test_id")
+        response.set_created(0)
+
+        with response.create_single_choice() as choice:
+            choice.append_content("Before")
+            await asyncio.sleep(0.2)
+            choice.append_content(" after")
+
+
+class SlowStartApplication(ChatCompletion):
+    def __init__(self, error: bool = False):
+        self.error = error
+
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        await asyncio.sleep(0.2)
+        if self.error:
+            raise InvalidRequestError("Invalid request")
+
+        with response.create_single_choice() as choice:
+            choice.append_content("Test content")
+
+
+def post(client: TestClient, stream: bool):
+    return client.post(
+        "/openai/deployments/test_app/chat/completions",
+        json={
+            "messages": [{"role": "user", "content": "Test"}],
+            "stream": stream,
+        },
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+
+@pytest.mark.parametrize("per_deployment", [False, True])
+def test_keep_alive_comments(per_deployment: bool):
+    if per_deployment:
+        app = DIALApp().add_chat_completion(
+            "test_app", SlowApplication(), keep_alive_interval=0.05
+        )
+    else:
+        app = DIALApp(keep_alive_interval=0.05).add_chat_completion(
+            "test_app", SlowApplication()
+        )
+
+    response = post(TestClient(app), stream=True)
+    assert response.status_code == 200
+
+    lines = [line for line in response.iter_lines() if line]
+    keep_alive_lines = [line for line in lines if line == ": keep-alive"]
+
+    assert len(keep_alive_lines) >= 2
+    assert lines[-1] == "data: [DONE]"
+
+    # The comments are sent only between the chunks
+    first_keep_alive = lines.index(": keep-alive")
+    assert '"content":"Before"' in lines[first_keep_alive - 1]
+
+
+def test_keep_alive_before_first_chunk():
+    app = DIALApp(keep_alive_interval=0.05).add_chat_completion(
+        "test_app", SlowStartApplication()
+    )
+
+    response = post(TestClient(app), stream=True)
+    assert response.status_code == 200
+
+    lines = [line for line in response.iter_lines() if line]
+    first_chunk = next(
+        index for index, line in enumerate(lines) if line.startswith("data:")
+    )
+
+    assert first_chunk >= 2
+    assert all(line == ": keep-alive" for line in lines[:first_chunk])
+    assert '"content":"Test content"' in "".join(lines)
+    assert lines[-1] == "data: [DONE]"
+
+
+def test_error_after_keep_alive():
+    app = DIALApp(keep_alive_interval=0.05).add_chat_completion(
+        "test_app", SlowStartApplication(error=True)
+    )
+
+    response = post(TestClient(app), stream=True)
+
+    # The status has been sent with the first keep-alive comment,
+    # so the error is reported in the stream
+    assert response.status_code == 200
+
+    lines = [line for line in response.iter_lines() if line]
+    assert lines[0] == ": keep-alive"
+    assert '"message":"Invalid request"' in lines[-2]
+    assert lines[-1] == "data: [DONE]"
+
+
+def test_no_keep_alive_in_non_streaming_mode():
+    app = DIALApp(keep_alive_interval=0.05).add_chat_completion(
+        "test_app", SlowApplication()
+    )
+
+    response = post(TestClient(app), stream=False)
+
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"] == {
+        "role": "assistant",
+        "content": "Before after",
+    }
+
+
+def test_invalid_interval():
+    with pytest.raises(ValueError):
+        DIALApp().add_chat_completion(
+            "test_app", SlowApplication(), keep_alive_interval=0
+        )
@@ -0,0 +1,197 @@
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.exceptions import RateLimitExceededError
+from aidial_sdk.limits import (
+    CompositeLimiter,
+    ConcurrencyLimiter,
+    RateLimit,
+    RateLimiter,
+)
+from aidial_sdk.telemetry.metrics import metrics
+
+
+class EchoApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            choice.append_content("Test content")
+
+
+def post(client: TestClient, stream: bool = False):
+    return client.post(
+        "/openai/deployments/test_app/chat/completions",
+        json={
+            "messages": [{"role": "user", "content": "Test"}],
+            "stream": stream,
+        },
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+
+def test_fifo_handoff():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue_size=2)
+        first = await limiter.acquire()
+
+        order = []
+
+        async def wait(name: str):
+            permit = await limiter.acquire()
+            order.append(name)
+            permit.release()
+
+        tasks = [asyncio.create_task(wait(name)) for name in ("a", "b")]
+        await asyncio.sleep(0)
+        assert limiter.queue_size == 2
+
+        first.release()
+        await asyncio.gather(*tasks)
+
+        assert order == ["a", "b"]
+        assert limiter.in_flight == 0
+        assert limiter.queue_size == 0
+
+    asyncio.run(run())
+
+
+def test_queue_full():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue_size=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(RateLimitExceededError) as exc_info:
+            await limiter.acquire()
+
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.headers == {"Retry-After": "1"}
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.queue_size == 0
+
+    asyncio.run(run())
+
+
+def test_queue_timeout():
+    async def run():
+        limiter = ConcurrencyLimiter(
+            max_concurrency=1, max_queue_size=1, queue_timeout=0.01
+        )
+        await limiter.acquire()
+
+        with pytest.raises(RateLimitExceededError):
+            await limiter.acquire()
+
+        assert limiter.queue_size == 0
+        assert limiter.in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_retry_after_estimate():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrency=2)
+
+        permit = await limiter.acquire()
+        permit._acquired_at -= 3
+        permit.release()
+
+        assert limiter.retry_after() == 2
+
+    asyncio.run(run())
+
+
+def test_rejected_request():
+    limiter = ConcurrencyLimiter(max_concurrency=1)
+    app = DIALApp().add_chat_completion(
+        "test_app", EchoApplication(), limiter=limiter
+    )
+    client = TestClient(app)
+
+    rejected = metrics.counter("aidial_sdk.limits.rejected")
+    attributes = {"deployment": "test_app", "reason": "queue_full"}
+    rejected_before = rejected.value(attributes)
+
+    permit = asyncio.run(limiter.acquire())
+    response = post(client)
+    permit.release()
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert response.json()["error"]["type"] == "rate_limit_error"
+    assert rejected.value(attributes) == rejected_before + 1
+
+    assert post(client).status_code == 200
+    assert limiter.in_flight == 0
+
+
+def test_permit_released_after_stream():
+    limiter = ConcurrencyLimiter(max_concurrency=1)
+    app = DIALApp().add_chat_completion(
+        "test_app", EchoApplication(), limiter=limiter
+    )
+
+    response = post(TestClient(app), stream=True)
+
+    assert response.status_code == 200
+    assert response.text.endswith("data: [DONE]\n\n")
+    assert limiter.in_flight == 0
+
+
+def test_stacked_concurrency_and_rate_limits():
+    concurrency = ConcurrencyLimiter(max_concurrency=1)
+    limiter = CompositeLimiter(
+        [
+            concurrency,
+            RateLimiter(deployment=RateLimit(requests_per_minute=2)),
+        ]
+    )
+    app = DIALApp().add_chat_completion(
+        "test_app", EchoApplication(), limiter=limiter
+    )
+    client = TestClient(app)
+
+    assert post(client).status_code == 200
+    assert post(client, stream=True).status_code == 200
+
+    response = post(client)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert concurrency.in_flight == 0
+
+
+def test_composite_releases_in_reverse_on_rejection():
+    async def run():
+        concurrency = ConcurrencyLimiter(max_concurrency=1)
+        rate = RateLimiter(deployment=RateLimit(requests_per_minute=1))
+        limiter = CompositeLimiter([rate, concurrency])
+
+        permit = await limiter.acquire()
+        assert concurrency.in_flight == 1
+
+        with pytest.raises(RateLimitExceededError):
+            await limiter.acquire()
+        assert concurrency.in_flight == 1
+
+        permit.tokens = 5
+        permit.first_chunk()
+        permit.release()
+        assert concurrency.in_flight == 0
+        assert all(inner.released for inner in permit.permits)
+        assert all(inner.tokens == 5 for inner in permit.permits)
+
+        limiter = CompositeLimiter([concurrency, rate])
+        with pytest.raises(RateLimitExceededError):
+            await limiter.acquire()
+        assert concurrency.in_flight == 0
+
+    asyncio.run(run())
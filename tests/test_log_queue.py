@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from typing import List
+
+import pytest
+
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.log_queue import disable_log_queue, enable_log_queue
+from aidial_sdk.utils.logging import deployment_id, log_info, logger
+
+
+class BlockingHandler(logging.Handler):
+    released: threading.Event
+    messages: List[str]
+    deployments: List[str]
+
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+        self.messages = []
+        self.deployments = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.released.wait()
+        self.messages.append(record.getMessage())
+        self.deployments.append(getattr(record, "deployment_id", None))
+
+
+@pytest.fixture
+def blocking_handler():
+    handlers, level = logger.handlers, logger.level
+    handler = BlockingHandler()
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    token = deployment_id.set("test_app")
+    try:
+        yield handler
+    finally:
+        handler.released.set()
+        disable_log_queue()
+        logger.handlers, logger.level = handlers, level
+        deployment_id.reset(token)
+
+
+def test_records_are_dropped_instead_of_blocking(blocking_handler):
+    dropped = metrics.counter("aidial_sdk.logging.dropped_records")
+    dropped_before = dropped.value()
+
+    enable_log_queue(3)
+
+    start = time.perf_counter()
+    for i in range(10):
+        log_info("message %d", i)
+    assert time.perf_counter() - start < 1
+
+    # The queue holds three records and the listener thread
+    # may have taken one more
+    assert 6 <= dropped.value() - dropped_before <= 7
+
+    blocking_handler.released.set()
+    # Wait for the queue to have room for the report of the dropped records
+    deadline = time.perf_counter() + 5
+    while len(blocking_handler.messages) < 3:
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+    log_info("after release")
+    disable_log_queue()
+
+    messages = blocking_handler.messages
+    assert messages[0] == "message 0"
+    assert any(
+        message.startswith("Dropped ")
+        and message.endswith(" log records")
+        or "because the log queue is full" in message
+        for message in messages
+    )
+    assert messages[-1] == "after release"
+    assert blocking_handler.deployments[0] == "test_app"
+
+
+def test_disable_restores_handlers(blocking_handler):
+    enable_log_queue(10)
+    enable_log_queue(10)
+    assert logger.handlers != [blocking_handler]
+
+    disable_log_queue()
+    assert logger.handlers == [blocking_handler]
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        enable_log_queue(0)
@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+import logging
+
+import pytest
+
+from aidial_sdk.chat_completion.choice import Choice
+from aidial_sdk.chat_completion.chunks import BaseChunk
+from aidial_sdk.utils._channel import Channel
+from aidial_sdk.utils.json import create_json_codec, set_json_codec
+from aidial_sdk.utils.logging import (
+    DeploymentIdFilter,
+    log_debug,
+    log_info,
+    set_log_deployment,
+)
+
+
+class CountingChunk(BaseChunk):
+    calls: int = 0
+
+    def to_dict(self):
+        CountingChunk.calls += 1
+        return {}
+
+
+@pytest.mark.parametrize("level", [logging.WARNING, logging.DEBUG])
+def test_chunk_is_serialized_only_for_debug(caplog, level: int):
+    caplog.set_level(level, logger="aidial_sdk")
+    CountingChunk.calls = 0
+
+    async def run():
+        choice = Choice(Channel(), 0)
+        choice.send_chunk(CountingChunk())
+        await choice.asend_chunk(CountingChunk())
+
+    asyncio.run(run())
+
+    assert CountingChunk.calls == (2 if level == logging.DEBUG else 0)
+
+
+def test_deployment_id_is_record_attribute(caplog):
+    caplog.set_level(logging.DEBUG, logger="aidial_sdk")
+
+    def run():
+        set_log_deployment("test_app")
+        log_info("message %s", "argument")
+
+    contextvars.copy_context().run(run)
+    log_debug("outside")
+
+    inside, outside = caplog.records
+    assert inside.getMessage() == "message argument"
+    assert inside.deployment_id == "test_app"  # type: ignore
+    assert inside.funcName == "run"
+    assert outside.deployment_id is None  # type: ignore
+
+
+def test_deployment_id_filter():
+    record = logging.LogRecord("aidial_sdk", logging.INFO, "", 0, "", (), None)
+
+    def run():
+        set_log_deployment("test_app")
+        DeploymentIdFilter().filter(record)
+
+    contextvars.copy_context().run(run)
+    assert record.deployment_id == "test_app"  # type: ignore
+
+
+class NonAsciiChunk(BaseChunk):
+    def to_dict(self):
+        return {"content": "привет"}
+
+
+@pytest.mark.parametrize("codec_name", ["stdlib", "orjson"])
+def test_chunk_is_logged_with_json_codec(caplog, codec_name: str):
+    if codec_name == "orjson":
+        pytest.importorskip("orjson")
+    caplog.set_level(logging.DEBUG, logger="aidial_sdk")
+    codec = create_json_codec(codec_name)  # type: ignore
+
+    async def run():
+        set_json_codec(codec)
+        choice = Choice(Channel(), 0)
+        choice.send_chunk(NonAsciiChunk())
+
+    asyncio.run(run())
+
+    (record,) = caplog.records
+    assert record.getMessage() == "chunk: " + codec.dumps({"content": "привет"})
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.exceptions import RateLimitExceededError
+from aidial_sdk.limits import LoopLagLimiter
+from aidial_sdk.telemetry.loop_monitor import LoopMonitor
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.logging import deployment_id
+
+
+class BlockingApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            # CPU-bound work blocking the event loop
+            time.sleep(0.05)
+            choice.append_content("Test content")
+
+
+async def block_loop(times: int, duration: float) -> None:
+    for _ in range(times):
+        time.sleep(duration)
+        await asyncio.sleep(0.001)
+
+
+def test_lag_sampling():
+    async def run():
+        monitor = LoopMonitor(interval=0.01, window=2)
+        monitor.ensure_started()
+        await asyncio.sleep(0.05)
+
+        await block_loop(times=3, duration=0.05)
+        assert monitor.sustained_lag >= 0.02
+
+        await asyncio.sleep(0.1)
+        assert monitor.sustained_lag < 0.02
+        monitor.stop()
+
+    asyncio.run(run())
+
+    lag = metrics.histogram("aidial_sdk.event_loop.lag").value()
+    assert lag is not None and lag.max >= 0.02
+
+
+def test_slow_callback_attributed_to_deployment():
+    slow_callbacks = metrics.counter("aidial_sdk.event_loop.slow_callbacks")
+    attributes = {"deployment": "test_app"}
+    before = slow_callbacks.value(attributes)
+
+    monitor = LoopMonitor(slow_callback_duration=0.02)
+    app = DIALApp(loop_monitor=monitor).add_chat_completion(
+        "test_app", BlockingApplication()
+    )
+
+    response = TestClient(app).post(
+        "/openai/deployments/test_app/chat/completions",
+        json={"messages": [{"role": "user", "content": "Test"}]},
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    assert response.status_code == 200
+    assert slow_callbacks.value(attributes) == before + 1
+    monitor.stop()
+
+
+def test_slow_callback_detection_is_opt_in():
+    async def run():
+        monitor = LoopMonitor(interval=0.01)
+        monitor.ensure_started()
+        await asyncio.sleep(0.03)
+        assert monitor.lag >= 0.0
+        assert asyncio.Handle._run is original_run
+        monitor.stop()
+
+        monitor = LoopMonitor(slow_callback_duration=0.01)
+        monitor.ensure_started()
+        assert asyncio.Handle._run is not original_run
+
+        monitor.stop()
+        assert asyncio.Handle._run is original_run
+
+    original_run = asyncio.Handle._run
+    asyncio.run(run())
+
+
+def test_admission_rejected_under_sustained_lag():
+    async def run():
+        monitor = LoopMonitor(interval=0.01, window=2)
+        limiter = LoopLagLimiter(monitor, max_lag=0.02)
+
+        (await limiter.acquire()).release()
+
+        await block_loop(times=3, duration=0.05)
+        with pytest.raises(RateLimitExceededError) as exc_info:
+            await limiter.acquire()
+        assert exc_info.value.headers == {"Retry-After": "1"}
+
+        await asyncio.sleep(0.1)
+        (await limiter.acquire()).release()
+        monitor.stop()
+
+    rejected = metrics.counter("aidial_sdk.limits.rejected")
+    attributes = {"deployment": "test_app", "reason": "loop_lag"}
+    before = rejected.value(attributes)
+
+    token = deployment_id.set("test_app")
+    try:
+        asyncio.run(run())
+    finally:
+        deployment_id.reset(token)
+
+    assert rejected.value(attributes) == before + 1
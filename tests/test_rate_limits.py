@@ -0,0 +1,105 @@
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.limits import RateLimit, RateLimiter
+from aidial_sdk.limits.rate import _Buckets
+from aidial_sdk.telemetry.metrics import metrics
+
+
+class UsageApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            choice.append_content("Test content")
+        response.set_usage(prompt_tokens=8, completion_tokens=4)
+
+
+def post(client: TestClient, api_key: str = "TEST_API_KEY", stream=False):
+    return client.post(
+        "/openai/deployments/test_app/chat/completions",
+        json={
+            "messages": [{"role": "user", "content": "Test"}],
+            "stream": stream,
+        },
+        headers={"Api-Key": api_key},
+    )
+
+
+def create_client(limiter: RateLimiter) -> TestClient:
+    app = DIALApp().add_chat_completion(
+        "test_app", UsageApplication(), limiter=limiter
+    )
+    return TestClient(app)
+
+
+def test_request_rate_per_api_key():
+    limiter = RateLimiter(per_key=RateLimit(requests_per_minute=2))
+    client = create_client(limiter)
+
+    assert post(client, "key1").status_code == 200
+    assert post(client, "key1").status_code == 200
+
+    response = post(client, "key1")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+    assert response.json()["error"]["type"] == "rate_limit_error"
+
+    assert post(client, "key2").status_code == 200
+    assert limiter.tracked_keys == 2
+
+
+def test_token_rate_per_deployment():
+    rejected = metrics.counter("aidial_sdk.limits.rejected")
+    attributes = {"deployment": "test_app", "reason": "token_rate"}
+    before = rejected.value(attributes)
+
+    limiter = RateLimiter(deployment=RateLimit(tokens_per_minute=20))
+    client = create_client(limiter)
+
+    # The usage is charged after the response
+    assert post(client, "key1", stream=True).status_code == 200
+    assert post(client, "key2").status_code == 200
+
+    response = post(client, "key3")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "15"
+    assert rejected.value(attributes) == before + 1
+
+
+def test_bucket_refill():
+    buckets = _Buckets(RateLimit(requests_per_minute=60))
+
+    buckets.charge(1, now=0.0, requests=60)
+    assert buckets.wait_time(1, now=0.0) == (1.0, "request_rate")
+    assert buckets.wait_time(1, now=0.5) == (0.5, "request_rate")
+    assert buckets.wait_time(1, now=1.0) == (0.0, "")
+
+
+def test_idle_buckets_are_removed():
+    buckets = _Buckets(RateLimit(requests_per_minute=60))
+    buckets._swept_at = 0.0
+
+    buckets.charge(1, now=0.0, requests=1)
+    buckets.charge(2, now=30.0, requests=40)
+    buckets.charge(3, now=60.0, requests=1)
+
+    # The bucket of the key 1 is full again
+    assert len(buckets) == 2
+    assert buckets.wait_time(2, now=60.0) == (0.0, "")
+    assert buckets._keys[buckets._find(1)] == 0
+
+
+def test_buckets_table_growth():
+    buckets = _Buckets(RateLimit(requests_per_minute=1))
+
+    for key in range(1, 1001):
+        buckets.charge(key, now=0.0, requests=1)
+
+    assert len(buckets) == 1000
+    assert buckets.capacity == 2048
+    assert all(
+        buckets.wait_time(key, now=0.0)[1] == "request_rate"
+        for key in range(1, 1001)
+    )
@@ -0,0 +1,324 @@
+import asyncio
+import json
+from typing import List, Tuple
+
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import (
+    ChatCompletion,
+    MemoryResponseCache,
+    Request,
+    Response,
+    SqliteResponseCache,
+)
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils.merge_chunks import merge
+
+
+class CountingApplication(ChatCompletion):
+    calls: int
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        self.calls += 1
+        response.set_response_id("chatcmpl-1")
+        response.set_created(1)
+        with response.create_choice() as choice:
+            choice.append_content("Hello, ")
+            choice.append_content(f"call {self.calls}")
+        response.set_usage(10, 3)
+
+
+CHAT_PATH = "/openai/deployments/test_app/chat/completions"
+HEADERS = {"Api-Key": "TEST_API_KEY"}
+
+
+def deterministic_body(content: str = "Test", **kwargs) -> dict:
+    return {
+        "messages": [{"role": "user", "content": content}],
+        "temperature": 0,
+        **kwargs,
+    }
+
+
+def stream_events(text: str) -> List[dict]:
+    events = [line[len("data: ") :] for line in text.split("\n\n") if line]
+    assert events[-1] == "[DONE]"
+    return [json.loads(event) for event in events[:-1]]
+
+
+def create_client(cache) -> Tuple[TestClient, CountingApplication]:
+    impl = CountingApplication()
+    app = DIALApp().add_chat_completion("test_app", impl, cache=cache)
+    return TestClient(app), impl
+
+
+def test_deterministic_request_is_served_from_cache():
+    hits = metrics.counter("aidial_sdk.chat_completion.cache.hits")
+    misses = metrics.counter("aidial_sdk.chat_completion.cache.misses")
+    attributes = {"deployment": "test_app"}
+    hits_before = hits.value(attributes)
+    misses_before = misses.value(attributes)
+
+    client, impl = create_client(MemoryResponseCache(max_bytes=1 << 20))
+
+    first = client.post(CHAT_PATH, json=deterministic_body(), headers=HEADERS)
+    second = client.post(CHAT_PATH, json=deterministic_body(), headers=HEADERS)
+
+    assert impl.calls == 1
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.json()["choices"][0]["message"]["content"] == "Hello, call 1"
+    assert hits.value(attributes) - hits_before == 1
+    assert misses.value(attributes) - misses_before == 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_cache_hit_finishes_metrics(stream: bool):
+    attributes = {"deployment": "test_app", "stream": str(stream).lower()}
+    in_flight = metrics.up_down_counter("aidial_sdk.chat_completion.in_flight")
+    duration = metrics.histogram("aidial_sdk.chat_completion.duration")
+
+    def count() -> int:
+        data = duration.value(attributes)
+        return data.count if data is not None else 0
+
+    client, impl = create_client(MemoryResponseCache(max_bytes=1 << 20))
+    client.post(CHAT_PATH, json=deterministic_body(), headers=HEADERS)
+    before = count()
+
+    response = client.post(
+        CHAT_PATH, json=deterministic_body(stream=stream), headers=HEADERS
+    )
+
+    assert response.status_code == 200
+    assert impl.calls == 1
+    assert in_flight.value(attributes) == 0
+    assert count() == before + 1
+
+
+def test_streaming_request_replays_cached_response():
+    client, impl = create_client(MemoryResponseCache(max_bytes=1 << 20))
+
+    non_stream = client.post(
+        CHAT_PATH, json=deterministic_body(), headers=HEADERS
+    ).json()
+    stream = client.post(
+        CHAT_PATH, json=deterministic_body(stream=True), headers=HEADERS
+    )
+
+    assert impl.calls == 1
+    chunks = stream_events(stream.text)
+    assert [chunk["object"] for chunk in chunks] == ["chat.completion.chunk"]
+    assert chunks[0]["choices"][0]["delta"] == {
+        "role": "assistant",
+        "content": "Hello, call 1",
+    }
+    assert chunks[0]["choices"][0]["finish_reason"] == "stop"
+    assert chunks[-1]["usage"] == non_stream["usage"]
+
+
+def test_streamed_response_is_cached():
+    client, impl = create_client(MemoryResponseCache(max_bytes=1 << 20))
+
+    stream = client.post(
+        CHAT_PATH, json=deterministic_body(stream=True), headers=HEADERS
+    )
+    assert stream.status_code == 200
+
+    response = client.post(
+        CHAT_PATH, json=deterministic_body(), headers=HEADERS
+    ).json()
+
+    assert impl.calls == 1
+    assert response["object"] == "chat.completion"
+    assert response["choices"][0]["message"] == {
+        "role": "assistant",
+        "content": "Hello, call 1",
+    }
+    assert response["usage"]["total_tokens"] == 13
+
+
+def test_responses_are_cached_per_client():
+    client, impl = create_client(MemoryResponseCache(max_bytes=1 << 20))
+
+    client.post(CHAT_PATH, json=deterministic_body(), headers=HEADERS)
+    other = client.post(
+        CHAT_PATH,
+        json=deterministic_body(),
+        headers={"Api-Key": "OTHER_API_KEY"},
+    )
+    client.post(
+        CHAT_PATH,
+        json=deterministic_body(),
+        headers={**HEADERS, "Authorization": "Bearer token"},
+    )
+
+    assert impl.calls == 3
+    assert other.json()["choices"][0]["message"]["content"] == "Hello, call 2"
+
+
+class ToolCallApplication(ChatCompletion):
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        with response.create_single_choice() as choice:
+            choice.create_function_tool_call("call-1", "search", '{"q": 1}')
+            choice.create_function_tool_call("call-2", "fetch", "{}")
+            choice.add_attachment(type="text/plain", title="a", data="1")
+            with choice.create_stage("Stage") as stage:
+                stage.add_attachment(type="text/plain", title="b", data="2")
+
+
+def test_replayed_stream_keeps_indices():
+    app = DIALApp().add_chat_completion(
+        "test_app",
+        ToolCallApplication(),
+        cache=MemoryResponseCache(max_bytes=1 << 20),
+    )
+    client = TestClient(app)
+
+    streamed = client.post(
+        CHAT_PATH, json=deterministic_body(stream=True), headers=HEADERS
+    )
+    replayed = client.post(
+        CHAT_PATH, json=deterministic_body(stream=True), headers=HEADERS
+    )
+
+    original = merge(
+        *(
+            chunk["choices"][0]["delta"]
+            for chunk in stream_events(streamed.text)
+        )
+    )
+    (chunk,) = stream_events(replayed.text)
+    delta = chunk["choices"][0]["delta"]
+    assert [call["index"] for call in delta["tool_calls"]] == [0, 1]
+    assert delta["custom_content"]["attachments"][0]["index"] == 0
+    assert delta["custom_content"]["stages"][0]["index"] == 0
+    assert delta["custom_content"]["stages"][0]["attachments"][0]["index"] == 0
+    assert delta == original
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"messages": [{"role": "user", "content": "Test"}]},
+        {"messages": [{"role": "user", "content": "Test"}], "temperature": 1},
+    ],
+)
+def test_non_deterministic_request_is_not_cached(body):
+    client, impl = create_client(MemoryResponseCache(max_bytes=1 << 20))
+
+    client.post(CHAT_PATH, json=body, headers=HEADERS)
+    client.post(CHAT_PATH, json=body, headers=HEADERS)
+
+    assert impl.calls == 2
+
+
+def test_request_with_seed_is_cached():
+    client, impl = create_client(MemoryResponseCache(max_bytes=1 << 20))
+    body = {"messages": [{"role": "user", "content": "Test"}], "seed": 42}
+
+    client.post(CHAT_PATH, json=body, headers=HEADERS)
+    client.post(CHAT_PATH, json=body, headers=HEADERS)
+    client.post(CHAT_PATH, json={**body, "seed": 43}, headers=HEADERS)
+
+    assert impl.calls == 2
+
+
+def test_memory_cache_evicts_least_recently_used():
+    async def _test():
+        cache = MemoryResponseCache(max_bytes=30)
+        await cache.set("a", b"x" * 9)
+        await cache.set("b", b"x" * 9)
+        await cache.set("c", b"x" * 9)
+        assert await cache.get("a") is not None
+
+        await cache.set("d", b"x" * 9)
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") is not None
+        assert cache.size == 30
+
+        await cache.set("e", b"x" * 100)
+        assert await cache.get("e") is None
+
+    asyncio.run(_test())
+
+
+def test_memory_cache_expires_entries():
+    async def _test():
+        cache = MemoryResponseCache(max_bytes=100, ttl=0.05)
+        await cache.set("a", b"value")
+        assert await cache.get("a") == b"value"
+
+        await asyncio.sleep(0.1)
+        assert await cache.get("a") is None
+        assert len(cache) == 0
+
+    asyncio.run(_test())
+
+
+def test_sqlite_cache(tmp_path):
+    path = str(tmp_path / "responses.db")
+
+    async def _fill():
+        cache = SqliteResponseCache(path, max_bytes=30)
+        await cache.set("a", b"x" * 9)
+        await cache.set("b", b"x" * 9)
+        await cache.set("c", b"x" * 9)
+        assert await cache.get("a") == b"x" * 9
+        await cache.set("d", b"x" * 9)
+        cache.close()
+
+    async def _read():
+        cache = SqliteResponseCache(path, max_bytes=30)
+        assert cache.size == 30
+        assert await cache.get("b") is None
+        assert await cache.get("a") == b"x" * 9
+        assert await cache.get("d") == b"x" * 9
+        cache.close()
+
+    asyncio.run(_fill())
+    asyncio.run(_read())
+
+
+def test_sqlite_cache_limit_is_shared(tmp_path):
+    path = str(tmp_path / "responses.db")
+
+    async def _test():
+        first = SqliteResponseCache(path, max_bytes=30)
+        second = SqliteResponseCache(path, max_bytes=30)
+
+        await first.set("a", b"x" * 9)
+        await second.set("b", b"x" * 9)
+        assert await second.get("a") is not None
+        await first.set("c", b"x" * 9)
+        await second.set("d", b"x" * 9)
+
+        assert first.size == second.size == 30
+        assert await first.get("b") is None
+        assert await first.get("a") is not None
+        first.close()
+        second.close()
+
+    asyncio.run(_test())
+
+
+def test_sqlite_cache_serves_app(tmp_path):
+    cache = SqliteResponseCache(str(tmp_path / "responses.db"), 1 << 20)
+    client, impl = create_client(cache)
+
+    first = client.post(CHAT_PATH, json=deterministic_body(), headers=HEADERS)
+    second = client.post(CHAT_PATH, json=deterministic_body(), headers=HEADERS)
+
+    assert impl.calls == 1
+    assert second.json() == first.json()
+    cache.close()
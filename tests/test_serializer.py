@@ -0,0 +1,61 @@
+from typing import Any, Dict, Optional
+
+import pytest
+
+from aidial_sdk.chat_completion.chunks import (
+    BaseChunk,
+    ContentChunk,
+    ContentStageChunk,
+    EndChoiceChunk,
+    FunctionToolCallChunk,
+    StartChoiceChunk,
+)
+from aidial_sdk.chat_completion.enums import FinishReason
+from aidial_sdk.utils._serializer import ChunkSerializer
+from aidial_sdk.utils.streaming import format_chunk
+
+TEXTS = [
+    "",
+    "plain text",
+    'quotes " and \\ backslashes',
+    "new\nlines\tand\x00control\x1f chars",
+    "unicode: привет, 你好, emoji 😀",
+    "__aidial_sdk_text_placeholder__",
+]
+
+CHUNKS = [
+    *(ContentChunk(text, 0) for text in TEXTS),
+    *(ContentStageChunk(1, 2, text) for text in TEXTS),
+    *(FunctionToolCallChunk(0, 3, None, None, text) for text in TEXTS),
+    FunctionToolCallChunk(0, 0, "id", "name", "{}"),
+    FunctionToolCallChunk(0, 0, None, "name", None),
+    StartChoiceChunk(0),
+    EndChoiceChunk(FinishReason.STOP, 0),
+]
+
+
+def default_fields(model: Optional[str]):
+    def add(target: Dict[str, Any]) -> None:
+        target["id"] = "response-id"
+        if model:
+            target["model"] = model
+        target["created"] = 0
+        target["object"] = "chat.completion.chunk"
+
+    return add
+
+
+@pytest.mark.parametrize("model", [None, "model"])
+@pytest.mark.parametrize("chunk", CHUNKS)
+def test_serializer_matches_format_chunk(
+    chunk: BaseChunk, model: Optional[str]
+):
+    add_default_fields = default_fields(model)
+    serializer = ChunkSerializer(add_default_fields)
+
+    expected = chunk.to_dict()
+    add_default_fields(expected)
+
+    # The second call uses the cached template
+    for _ in range(2):
+        assert serializer.format(chunk) == format_chunk(expected)
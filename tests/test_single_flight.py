@@ -0,0 +1,178 @@
+import asyncio
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.embeddings import Embeddings
+from aidial_sdk.embeddings import Request as EmbeddingsRequest
+from aidial_sdk.embeddings import Response as EmbeddingsResponse
+from aidial_sdk.telemetry.metrics import metrics
+from aidial_sdk.utils._single_flight import SingleFlight
+
+
+class CountingApplication(ChatCompletion):
+    calls: int
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def chat_completion(
+        self, request: Request, response: Response
+    ) -> None:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        with response.create_single_choice() as choice:
+            choice.append_content(f"Call {self.calls}")
+
+
+class CountingEmbeddings(Embeddings):
+    calls: int
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def embeddings(
+        self, request: EmbeddingsRequest
+    ) -> EmbeddingsResponse:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return EmbeddingsResponse(
+            data=[{"embedding": [0.0], "index": 0}],
+            model="dummy",
+            usage={"prompt_tokens": 1, "total_tokens": 1},
+        )
+
+
+async def post_concurrently(
+    app: DIALApp, path: str, body: dict, headers: List[Dict[str, str]]
+) -> List[httpx.Response]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        return await asyncio.gather(
+            *(client.post(path, json=body, headers=h) for h in headers)
+        )
+
+
+CHAT_PATH = "/openai/deployments/test_app/chat/completions"
+CHAT_BODY = {"messages": [{"role": "user", "content": "Test"}]}
+
+
+def test_identical_requests_share_execution():
+    shared = metrics.counter("aidial_sdk.single_flight.shared")
+    before = shared.value({"deployment": "test_app"})
+
+    impl = CountingApplication()
+    app = DIALApp(single_flight=True).add_chat_completion("test_app", impl)
+
+    headers = [
+        {"Api-Key": "TEST_API_KEY", "traceparent": f"00-{i:032x}-{i:016x}-01"}
+        for i in range(1, 6)
+    ]
+    responses = asyncio.run(
+        post_concurrently(app, CHAT_PATH, CHAT_BODY, headers)
+    )
+
+    assert impl.calls == 1
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.text for r in responses}) == 1
+    assert shared.value({"deployment": "test_app"}) == before + 4
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        [{"Api-Key": "KEY_1"}, {"Api-Key": "KEY_2"}],
+        [
+            {"Api-Key": "KEY", "Authorization": "Bearer USER_1"},
+            {"Api-Key": "KEY", "Authorization": "Bearer USER_2"},
+        ],
+        [
+            {"Api-Key": "KEY", "X-Custom": "1"},
+            {"Api-Key": "KEY", "X-Custom": "2"},
+        ],
+    ],
+    ids=["api_key", "jwt", "header"],
+)
+def test_different_clients_are_not_shared(headers: List[Dict[str, str]]):
+    impl = CountingApplication()
+    app = DIALApp(single_flight=True).add_chat_completion("test_app", impl)
+
+    asyncio.run(post_concurrently(app, CHAT_PATH, CHAT_BODY, headers))
+
+    assert impl.calls == 2
+
+
+def test_streaming_requests_are_not_shared():
+    impl = CountingApplication()
+    app = DIALApp(single_flight=True).add_chat_completion("test_app", impl)
+
+    body = {**CHAT_BODY, "stream": True}
+    asyncio.run(
+        post_concurrently(app, CHAT_PATH, body, [{"Api-Key": "KEY"}] * 2)
+    )
+
+    assert impl.calls == 2
+
+
+def test_disabled_by_default():
+    impl = CountingApplication()
+    app = DIALApp().add_chat_completion("test_app", impl)
+
+    asyncio.run(
+        post_concurrently(app, CHAT_PATH, CHAT_BODY, [{"Api-Key": "KEY"}] * 2)
+    )
+
+    assert impl.calls == 2
+
+
+def test_embeddings_share_execution():
+    impl = CountingEmbeddings()
+    app = DIALApp(single_flight=True).add_embeddings("test_app", impl)
+
+    responses = asyncio.run(
+        post_concurrently(
+            app,
+            "/openai/deployments/test_app/embeddings",
+            {"input": "a"},
+            [{"Api-Key": "KEY"}] * 3,
+        )
+    )
+
+    assert impl.calls == 1
+    assert all(r.json()["data"][0]["embedding"] == [0.0] for r in responses)
+
+
+def test_execution_survives_cancelled_caller():
+    async def run():
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def execute() -> str:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "result"
+
+        first = asyncio.create_task(single_flight.run("key", execute))
+        second = asyncio.create_task(single_flight.run("key", execute))
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+        assert await second == "result"
+        assert calls == 1
+
+        # The execution is cancelled once all the callers are gone
+        third = asyncio.create_task(single_flight.run("key", execute))
+        await asyncio.sleep(0.01)
+        flight = single_flight._flights["key"]
+        third.cancel()
+        await asyncio.gather(flight.task, return_exceptions=True)
+        assert flight.task.cancelled()
+        assert single_flight._flights == {}
+
+    asyncio.run(run())
@@ -0,0 +1,101 @@
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.chat_completion import ChatCompletion, Request, Response
+from aidial_sdk.exceptions import InvalidRequestError
+from aidial_sdk.telemetry.metrics import MetricsRegistry, metrics
+from tests.applications.single_choice import SingleChoiceApplication
+
+PREFIX = "aidial_sdk.chat_completion."
+
+
+def test_histogram():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test", boundaries=(1, 2, 5))
+
+    for value in [0.5, 1, 1.5, 3, 10]:
+        histogram.record(value, {"key": "value"})
+
+    data = histogram.value({"key": "value"})
+    assert data is not None
+    assert data.counts == [2, 1, 1, 1]
+    assert data.count == 5
+    assert data.sum == 16
+    assert (data.min, data.max) == (0.5, 10)
+    assert data.quantile(0.5) == 2
+    assert data.quantile(1) == 10
+
+    assert histogram.value({"key": "other"}) is None
+
+    with pytest.raises(ValueError):
+        registry.counter("test")
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_chat_completion_metrics(stream: bool):
+    deployment = f"metrics_app_{stream}"
+    attributes = {"deployment": deployment, "stream": str(stream).lower()}
+
+    client = TestClient(
+        DIALApp().add_chat_completion(deployment, SingleChoiceApplication())
+    )
+
+    for _ in range(2):
+        response = client.post(
+            f"/openai/deployments/{deployment}/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": "Test"}],
+                "stream": stream,
+            },
+            headers={"Api-Key": "TEST_API_KEY"},
+        )
+        assert response.status_code == 200
+
+    def count(name: str) -> int:
+        data = metrics.histogram(PREFIX + name).value(attributes)
+        return data.count if data is not None else 0
+
+    assert count("request_parse_duration") == 2
+    assert count("time_to_first_chunk") == 2
+    assert count("time_to_first_content") == 2
+    assert count("duration") == 2
+    # start choice, content and end choice chunks (+ [DONE] in stream)
+    assert count("inter_chunk_gap") == 2 * (3 if stream else 2)
+
+    chunks = metrics.counter(PREFIX + "chunks").value(attributes)
+    assert chunks == 2 * (4 if stream else 3)
+
+    size = metrics.counter(PREFIX + "response_size").value(attributes)
+    assert size == 2 * len(response.content)
+
+    assert metrics.up_down_counter(PREFIX + "in_flight").value(attributes) == 0
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_in_flight_after_early_error(stream: bool):
+    deployment = f"failing_app_{stream}"
+    attributes = {"deployment": deployment, "stream": str(stream).lower()}
+
+    class FailingApplication(ChatCompletion):
+        async def chat_completion(
+            self, request: Request, response: Response
+        ) -> None:
+            raise InvalidRequestError("Invalid request")
+
+    client = TestClient(
+        DIALApp().add_chat_completion(deployment, FailingApplication())
+    )
+    response = client.post(
+        f"/openai/deployments/{deployment}/chat/completions",
+        json={
+            "messages": [{"role": "user", "content": "Test"}],
+            "stream": stream,
+        },
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    assert response.status_code == 400
+    in_flight = metrics.up_down_counter(PREFIX + "in_flight")
+    assert in_flight.value(attributes) == 0
+    assert metrics.histogram(PREFIX + "duration").value(attributes) is not None
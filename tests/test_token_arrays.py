@@ -0,0 +1,142 @@
+import json
+from typing import List, Union
+
+import fastapi
+import pytest
+from starlette.testclient import TestClient
+
+from aidial_sdk import DIALApp
+from aidial_sdk.embeddings import (
+    Embedding,
+    Embeddings,
+    Request,
+    Response,
+    TokenArray,
+)
+from aidial_sdk.embeddings.request import EmbeddingsRequest, TokenArrayRequest
+from aidial_sdk.pydantic_v1 import (
+    BaseModel,
+    SecretStr,
+    StrictInt,
+    StrictStr,
+    ValidationError,
+)
+
+
+class ListEmbeddingsRequest(BaseModel):
+    """The input validated element by element"""
+
+    input: Union[
+        StrictStr, List[StrictStr], List[StrictInt], List[List[StrictInt]]
+    ]
+
+
+def token_array_request(value) -> TokenArrayRequest:
+    return TokenArrayRequest(
+        input=value,
+        headers={},
+        original_request=fastapi.Request({"type": "http"}),
+        api_key_secret=SecretStr("dummy_key"),
+        deployment_id="",
+    )
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["text", ["a", "b"], [], [1, 2, 3], [[1, 2], [3], [2**40], []]],
+)
+def test_token_ids_are_parsed_into_lists(value):
+    request = EmbeddingsRequest(input=value)
+
+    assert request.input == value
+    assert type(request.input) is type(value)
+    assert json.loads(json.dumps(request.dict()))["input"] == value
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        5,
+        None,
+        [1, "a"],
+        [1, 2.0],
+        [True, 1],
+        [None],
+        [[1, 2], "a"],
+        [[1], [2.5]],
+        [[1], None],
+        [[1, "a", 3.0]],
+    ],
+)
+def test_errors_are_the_same_as_per_element_validation(value):
+    with pytest.raises(ValidationError) as expected:
+        ListEmbeddingsRequest(input=value)
+    with pytest.raises(ValidationError) as actual:
+        EmbeddingsRequest(input=value)
+
+    assert actual.value.errors() == expected.value.errors()
+
+
+def test_token_ids_are_parsed_into_arrays():
+    request = token_array_request([1, 2, 3])
+
+    assert isinstance(request.input, TokenArray)
+    assert request.input.tolist() == [1, 2, 3]
+    assert memoryview(request.input).format == "i"
+
+    request = token_array_request([[1, 2], [-4, 2**31 - 1], []])
+
+    assert request.input == [
+        TokenArray([1, 2]),
+        TokenArray([-4, 2**31 - 1]),
+        TokenArray(),
+    ]
+    assert request.json(include={"input"}) == (
+        '{"input": [[1, 2], [-4, 2147483647], []]}'
+    )
+
+
+@pytest.mark.parametrize("value", ["text", ["a", "b"], []])
+def test_texts_are_not_parsed_into_arrays(value):
+    assert token_array_request(value).input == value
+
+
+def test_token_ids_out_of_int32_range():
+    with pytest.raises(ValidationError) as e:
+        token_array_request([[1], [2, 2**31]])
+
+    assert e.value.errors()[-1] == {
+        "loc": ("input", 1, 1),
+        "msg": "token id is out of the int32 range",
+        "type": "value_error",
+    }
+
+
+@pytest.mark.parametrize("token_arrays", [False, True])
+def test_token_ids_reach_application(token_arrays: bool):
+    class TokenEmbeddings(Embeddings):
+        async def embeddings(self, request: Request) -> Response:
+            assert isinstance(request.input, list)
+            return Response(
+                data=[
+                    Embedding(embedding=[float(sum(tokens))], index=index)
+                    for index, tokens in enumerate(request.input)
+                    if isinstance(tokens, TokenArray) == token_arrays
+                ],
+                model="tokens",
+                usage={"prompt_tokens": 0, "total_tokens": 0},
+            )
+
+    app = DIALApp().add_embeddings(
+        "test_app", TokenEmbeddings(), token_arrays=token_arrays
+    )
+    response = TestClient(app).post(
+        "/openai/deployments/test_app/embeddings",
+        json={"input": [[1, 2], [3, 4]]},
+        headers={"Api-Key": "TEST_API_KEY"},
+    )
+
+    assert [item["embedding"] for item in response.json()["data"]] == [
+        [3.0],
+        [7.0],
+    ]